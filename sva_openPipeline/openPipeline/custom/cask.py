@@ -46,12 +46,31 @@ __version__ = "1.1.1"
 
 import os
 import re
+import json
+import time
+import fnmatch
+import hashlib
 import imath
 import ctypes
 import weakref
 import alembic
+import bisect
+import itertools
+import threading
+import contextlib
+from collections import OrderedDict, namedtuple
 from functools import wraps
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import imathnumpy
+except ImportError:
+    imathnumpy = None
+
 # maps cask objects to Alembic IObjects
 IOBJECTS = {
     "Camera": alembic.AbcGeom.ICamera,
@@ -281,6 +300,67 @@ POD_EXTENT = {
     imath.DoubleArray: (alembic.Util.POD.kFloat64POD, -1),
 }
 
+# Alembic POD to number of bytes per component
+POD_NUM_BYTES = {
+    alembic.Util.POD.kBooleanPOD: 1,
+    alembic.Util.POD.kUint8POD: 1,
+    alembic.Util.POD.kInt8POD: 1,
+    alembic.Util.POD.kUint16POD: 2,
+    alembic.Util.POD.kInt16POD: 2,
+    alembic.Util.POD.kUint32POD: 4,
+    alembic.Util.POD.kInt32POD: 4,
+    alembic.Util.POD.kUint64POD: 8,
+    alembic.Util.POD.kInt64POD: 8,
+    alembic.Util.POD.kFloat16POD: 2,
+    alembic.Util.POD.kFloat32POD: 4,
+    alembic.Util.POD.kFloat64POD: 8,
+    alembic.Util.POD.kStringPOD: 1,
+    alembic.Util.POD.kWstringPOD: 2,
+}
+
+# Alembic POD to NumPy dtype name
+POD_NUMPY_DTYPE = {
+    alembic.Util.POD.kBooleanPOD: "bool",
+    alembic.Util.POD.kUint8POD: "uint8",
+    alembic.Util.POD.kInt8POD: "int8",
+    alembic.Util.POD.kUint16POD: "uint16",
+    alembic.Util.POD.kInt16POD: "int16",
+    alembic.Util.POD.kUint32POD: "uint32",
+    alembic.Util.POD.kInt32POD: "int32",
+    alembic.Util.POD.kUint64POD: "uint64",
+    alembic.Util.POD.kInt64POD: "int64",
+    alembic.Util.POD.kFloat16POD: "float16",
+    alembic.Util.POD.kFloat32POD: "float32",
+    alembic.Util.POD.kFloat64POD: "float64",
+}
+
+# imath box classes, which numpy can not convert as sequences
+IMATH_BOXES = (
+    imath.Box2d, imath.Box2f, imath.Box2i, imath.Box2s,
+    imath.Box3d, imath.Box3f, imath.Box3i, imath.Box3s,
+)
+
+# default memory budget for decoded samples (bytes)
+SAMPLE_CACHE_BUDGET = 256 * 1024 * 1024
+
+# estimated size of a decoded sample of unknown layout (bytes)
+DEFAULT_SAMPLE_NBYTES = 64
+
+# file extension of archive index sidecars, appended to the archive path
+INDEX_EXT = ".idx"
+
+# bumped when the layout of persisted archive indices changes
+INDEX_VERSION = 1
+
+# maximum number of archives kept open by the archive pool
+POOL_MAX_OPEN = 16
+
+# property paths, relative to their object, whose animation changes topology
+TOPOLOGY_PROPERTIES = (".geom/.faceCounts", ".geom/.faceIndices", ".geom/nVertices")
+
+# prefix of the archive info keys in the top object's metadata
+ARCHIVE_INFO_PREFIX = "_ai_"
+
 _COMPOUND_PROPERTY_VALUE_ERROR_ = "Compound properties cannot have values"
 
 
@@ -326,6 +406,44 @@ def python_to_imath(value):
     return value
 
 
+def _numpy_items(value):
+    """Returns value in a form numpy.array can convert."""
+    if isinstance(value, IMATH_BOXES):
+        return [tuple(value.min()), tuple(value.max())]
+    if hasattr(value, "__len__") and not isinstance(value, basestring):
+        return [_numpy_items(value[i]) for i in range(len(value))]
+    return value
+
+
+def imath_to_numpy(value, dtype, extent=1, is_array=True):
+    """Returns an imath value or array as a contiguous NumPy array. Arrays
+    are shaped (n,) for an extent of 1 and (n, extent) otherwise. Memory is
+    shared with the imath array when the imathnumpy binding supports it,
+    otherwise the values are copied.
+
+    :param value: imath value or array, or a list of values
+    :param dtype: NumPy dtype
+    :param extent: number of components per element
+    :param is_array: value is an array of elements
+    """
+    if numpy is None:
+        raise ImportError("NumPy is required for NumPy views")
+    array = None
+    if imathnumpy is not None and type(value) in IMATH_ARRAYS_VALUES:
+        try:
+            array = imathnumpy.arrayToNumpy(value)
+        except (TypeError, ValueError, RuntimeError):
+            array = None
+    if array is None:
+        array = numpy.array(_numpy_items(value), dtype=dtype)
+    array = numpy.ascontiguousarray(array, dtype=dtype)
+    if is_array:
+        if extent > 1:
+            return array.reshape(len(value), extent)
+        return array.reshape(len(value))
+    return array
+
+
 def get_pod_extent(prop):
     """Returns POD, extent tuple for given Property."""
     if len(prop.values) <= 0:
@@ -374,6 +492,44 @@ def wrap(iobject, time_sampling_id=None):
     return Object(iobject)
 
 
+def object_type(metadata):
+    """Returns the cask class name matching an Alembic object's metadata,
+    without wrapping the object.
+
+    :param metadata: Alembic MetaData from an IObject or ObjectHeader.
+    """
+    for cls in Object.__subclasses__():
+        klass = IOBJECTS.get(cls.__name__)
+        if klass and klass.matches(metadata):
+            return cls.__name__
+    return Object.__name__
+
+
+def create_oarchive(filepath, metadata=None, userDescription="",
+                    asOgawa=True):
+    """Creates and returns a new Alembic OArchive.
+
+    :param filepath: Path of the archive file to write.
+    :param metadata: Archive MetaData.
+    :param userDescription: Description stored in the archive info.
+    :param asOgawa: Write an Ogawa archive (default True).
+    """
+    # support for Ogawa archives via CreateArchiveWithInfo
+    # came in Alembic 1.5.7
+    version = alembic.Abc.GetLibraryVersionShort()
+    m1, m2, m3 = (int(m) for m in version.split("."))
+    if m1 == 1 and m2 <= 5 and m3 < 7:
+        return alembic.Abc.OArchive(filepath, asOgawa=asOgawa)
+    if metadata is None:
+        metadata = alembic.AbcCoreAbstract.MetaData()
+    return alembic.Abc.CreateArchiveWithInfo(
+        filepath,
+        "cask %s" % __version__,
+        str(userDescription),
+        metadata, 1
+    )
+
+
 def is_valid(archive):
     """Returns True if the archive is a valid alembic archive.
     """
@@ -384,7 +540,7 @@ def is_valid(archive):
         return False
 
 
-def find(obj, name=".*", types=None):
+def find(obj, name=".*", types=None, limit=None):
     """Finds and returns a list of Objects with names matching
     a given regular expression. ::
 
@@ -393,49 +549,491 @@ def find(obj, name=".*", types=None):
 
     :param name: Regular expression to match object name
     :param types: Class type inclusion list
+    :param limit: Maximum number of results
     :return: Sorted list of Object results
     """
-    results = [r for r in find_iter(obj, name, types)]
+    results = [r for r in find_iter(obj, name, types, limit)]
     return sorted(results, key=lambda x: x.name)
 
 
-def find_iter(obj, name=".*", types=None):
+def find_iter(obj, name=".*", types=None, limit=None):
     """Generator that yields Objects with names matching
     a given regular expression.
 
     :param name: Regular expression to match object name
     :param types: Class type inclusion list
+    :param limit: Maximum number of results
     :yields: Object with name matching name regex
     """
-    if re.match(name, obj.name) and (types is None or obj.type() in types):
+    regex = re.compile(name)
+    if limit is not None and limit <= 0:
+        return
+    if regex.match(obj.name) and (types is None or obj.type() in types):
         yield obj
-    for child in obj.children.values():
-        for grandchild in find_iter(child, name, types):
-            yield grandchild
+        if limit is not None:
+            limit -= 1
+    for child in query(obj, name=regex, types=types, limit=limit):
+        yield child
+
+
+def _split_glob(path):
+    """Splits a path glob into its non-empty segments."""
+    return [segment for segment in path.split("/") if segment]
+
+
+def _glob_closure(pattern, states):
+    """Adds the positions reachable by letting "**" match zero segments."""
+    closure = set(states)
+    for pos in states:
+        while pos < len(pattern) and pattern[pos] == "**":
+            pos += 1
+            closure.add(pos)
+    return closure
+
+
+def _glob_advance(pattern, states, name):
+    """Returns the glob positions reached after matching one path segment.
+    An empty set means no descendant of the segment can match.
+    """
+    advanced = set()
+    for pos in states:
+        if pos >= len(pattern):
+            continue
+        if pattern[pos] == "**":
+            advanced.add(pos)
+        elif fnmatch.fnmatchcase(name, pattern[pos]):
+            advanced.add(pos + 1)
+    return _glob_closure(pattern, advanced)
+
+
+def _query_node(node):
+    """Returns the cask Object for a query node, wrapping it and its
+    unwrapped ancestors if needed. Wrapped nodes are added to their parent's
+    children without marking them as expanded, so the rest of the children
+    are still read lazily and reuse the wrappers already made.
+    """
+    if isinstance(node, Object):
+        return node
+    if node[2] is None:
+        parent = _query_node(node[1])
+        if parent._child_dict is None:
+            parent._child_dict = DeepDict(parent, Object)
+        obj = dict.get(parent._child_dict, node[0].getName())
+        if obj is None:
+            obj = wrap(node[0], time_sampling_id=parent.time_sampling_id)
+            obj._parent = parent
+            dict.__setitem__(parent._child_dict, obj.name, obj)
+        node[2] = obj
+    return node[2]
+
+
+def _query_children(node):
+    """Generator that yields (name, metadata or Object, child node factory)
+    tuples for the children of a query node. Already expanded cask Objects
+    are walked as is, otherwise only the child headers are read.
+    """
+    if isinstance(node, Object):
+        children = node._child_dict
+        if not node.iobject or (children is not None and children.visited):
+            for child in (children or {}).values():
+                yield child.name, child, lambda child=child: child
+            return
+    iobject = node.iobject if isinstance(node, Object) else node[0]
+    for i in range(iobject.getNumChildren()):
+        header = iobject.getChildHeader(i)
+        yield header.getName(), header.getMetaData(), \
+            lambda i=i: [iobject.getChild(i), node, None]
+
+
+def query(obj, path=None, name=None, types=None, limit=None):
+    """Generator that yields the Objects below obj that match all of the
+    given predicates, depth first. Predicates are tested on object headers
+    during the traversal: subtrees that can not match the path glob are not
+    visited, and objects that are rejected are never wrapped. ::
+
+        >>> list(query(a.top, "char:root/**/*Shape", types=["PolyMesh"]))
+        [<PolyMesh "char:bodyShape">, <PolyMesh "char:eyeShape">]
+
+    :param obj: Object to search below (not included in the results)
+    :param path: Path glob relative to obj, "*" matches within one level
+        and "**" matches any number of levels
+    :param name: Regular expression, or compiled pattern, to match object name
+    :param types: Class type inclusion list
+    :param limit: Stop after this many results
+    :yields: Objects matching all predicates
+    """
+    pattern = _split_glob(path) if path is not None else None
+    if isinstance(name, basestring):
+        name = re.compile(name)
+    if types is not None:
+        types = set(types)
+    if limit is not None and limit <= 0:
+        return
+
+    states = _glob_closure(pattern, [0]) if pattern is not None else None
+    stack = [(_query_children(obj), states)]
+    count = 0
+    while stack:
+        children, states = stack[-1]
+        try:
+            child_name, info, make_node = next(children)
+        except StopIteration:
+            stack.pop()
+            continue
+
+        child_states = None
+        if pattern is not None:
+            child_states = _glob_advance(pattern, states, child_name)
+            if not child_states:
+                continue
+            descend = any(pos < len(pattern) for pos in child_states)
+            matched = len(pattern) in child_states
+        else:
+            descend = matched = True
+
+        if matched and name is not None:
+            matched = name.match(child_name) is not None
+        if matched and types is not None:
+            if isinstance(info, Object):
+                matched = info.type() in types
+            else:
+                matched = object_type(info) in types
+        if not matched and not descend:
+            continue
+
+        node = make_node()
+        if matched:
+            yield _query_node(node)
+            count += 1
+            if limit is not None and count >= limit:
+                return
+        if descend:
+            stack.append((_query_children(node), child_states))
 
 
 def copy(item, name=None):
+    """Returns a copy-on-write copy of an object or property sub-tree.
+
+    The copy shares the source's Alembic IObjects, so anything the source
+    has not read yet is read lazily by the copy from the same archive, and
+    only the children, properties and values already loaded on the source,
+    which may hold edits, are copied. Property values are Samples views
+    sharing the source's decoded samples with their own edits, so writing
+    the copy streams samples straight from the source archive. ::
+
+        >>> variant = cask.copy(a.top.children["char:root"], "variant:root")
+
+    :param item: cask.Object or cask.Property to copy.
+    :param name: Name of the copy (default the source's name).
+    """
     import copy as _copy
     name = name or item.name
     new_item = item.__class__(name=name)
-    if item.metadata:
-        new_item.metadata = _copy.copy(item.metadata)
+    if item._metadata:
+        new_item.metadata = _copy.copy(item._metadata)
     if item._iobject:
         new_item._iobject = item._iobject
-    new_item.time_sampling_id = item.time_sampling_id
-    if type(item) in Object.__subclasses__():
-        for child in item.children.values():
-            new_item.children[child.name] = copy(child)
-        for prop in item.properties.values():
-            new_item.properties[prop.name] = copy(prop)
-    elif type(item) == Property:
-        if item.datatype:
-            new_item.datatype = item.datatype
-        for prop in item.properties.values():
-            new_item.properties[prop.name] = copy(prop)
+    if isinstance(item, Object):
+        new_item._tsid = item._tsid
+        new_item._schema = item._schema
+        new_item._animation_flags = item._animation_flags
+        # children wrapped by a query are copied even if the rest aren't read
+        children = item._child_dict
+        if children is not None and (children.visited or children):
+            new_item._child_dict = DeepDict(new_item, Object)
+            for child in item._child_dict.values():
+                new_item._child_dict[child.name] = copy(child)
+            new_item._child_dict.visited = item._child_dict.visited
+    else:
+        new_item.time_sampling_id = item.time_sampling_id
+        new_item._klass = item._klass
+        if item._datatype:
+            new_item.datatype = item._datatype
+        if isinstance(item._values, Samples):
+            new_item._values = item._values.view()
+        elif item._values:
+            new_item._values = list(item._values)
+    if item._prop_dict is not None and item._prop_dict.visited:
+        new_item._prop_dict = DeepDict(new_item, Property)
+        for prop in item._prop_dict.values():
+            new_item._prop_dict[prop.name] = copy(prop)
     return new_item
 
 
+def _release_tree(item):
+    """Releases the Alembic objects, samples and containers of an object or
+    property sub-tree. Walks only what has already been read, without
+    recursion, and doesn't update parent containers along the way.
+
+    :param item: cask.Object or cask.Property.
+    """
+    stack = [item]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Object) and node._child_dict:
+            stack.extend(node._child_dict.values())
+        if node._prop_dict:
+            stack.extend(node._prop_dict.values())
+        node._release()
+
+
+def _intern(name):
+    """Returns an interned name, so that objects and properties with the
+    same name share one string.
+    """
+    if type(name) is str:
+        return intern(name)
+    return name
+
+
+class AnimationFlags(namedtuple("AnimationFlags",
+                                "animated deforming topology visibility")):
+    """Animation flags of an object: any property animated, changing P
+    values, changing topology and animated visibility.
+    """
+    __slots__ = ()
+
+
+# flags of objects that have no animated properties
+STATIC = AnimationFlags(False, False, False, False)
+
+
+def animation_flags(iobject):
+    """Returns the AnimationFlags of an Alembic IObject, from one walk over
+    its properties.
+
+    :param iobject: Alembic IObject.
+    """
+    animated = deforming = topology = visibility = False
+    stack = [(iobject.getProperties(), "")]
+    while stack:
+        compound, prefix = stack.pop()
+        for i in range(compound.getNumProperties()):
+            iprop = compound.getProperty(i)
+            path = prefix + iprop.getName()
+            if iprop.isCompound():
+                stack.append((iprop, path + "/"))
+            elif not iprop.isConstant():
+                animated = True
+                if path == ".geom/P":
+                    deforming = True
+                elif path in TOPOLOGY_PROPERTIES:
+                    topology = True
+                elif path == "visible":
+                    visibility = True
+    if not animated:
+        return STATIC
+    return AnimationFlags(animated, deforming, topology, visibility)
+
+
+def animation_summary(iobject):
+    """Returns a dict of full object path to AnimationFlags for every
+    object below an Alembic IObject, from one traversal of the hierarchy.
+
+    :param iobject: Alembic IObject, usually the archive's top object.
+    """
+    summary = {}
+    stack = [iobject]
+    while stack:
+        parent = stack.pop()
+        for i in range(parent.getNumChildren()):
+            child = parent.getChild(i)
+            summary[child.getFullName()] = animation_flags(child)
+            stack.append(child)
+    return summary
+
+
+class FrameTable(object):
+    """Sample times of one TimeSampling, for a number of samples, and a memo
+    of time to nearest sample index lookups. One table is shared by every
+    property on the same time sampling, see frame_table.
+    """
+    __slots__ = ("times", "_indices", "_array")
+
+    def __init__(self, ts, num_samples):
+        """
+        :param ts: Alembic TimeSampling object.
+        :param num_samples: Number of samples.
+        """
+        self.times = [ts.getSampleTime(i) for i in range(num_samples)]
+        self._indices = {}
+        self._array = None
+
+    def __len__(self):
+        return len(self.times)
+
+    def index(self, time):
+        """Returns the index of the sample nearest to a time in seconds,
+        same as TimeSampling.getNearIndex.
+        """
+        index = self._indices.get(time)
+        if index is None:
+            times = self.times
+            hi = min(max(bisect.bisect_left(times, time), 1), len(times) - 1)
+            if hi <= 0:
+                index = 0
+            elif time - times[hi - 1] < times[hi] - time:
+                index = hi - 1
+            else:
+                index = hi
+            self._indices[time] = index
+        return index
+
+    def frame_index(self, frame, fps=24):
+        """Returns the index of the sample nearest to a frame."""
+        return self.index(frame / float(fps))
+
+    def indices(self, frames, fps=24):
+        """Returns the nearest sample indices for a sequence of frames, as
+        a NumPy array when NumPy is available.
+        """
+        if numpy is None:
+            return [self.frame_index(frame, fps) for frame in frames]
+        times = numpy.asarray(frames, dtype="float64") / float(fps)
+        if len(self.times) < 2:
+            return numpy.zeros(len(times), dtype="int64")
+        if self._array is None:
+            self._array = numpy.array(self.times, dtype="float64")
+        array = self._array
+        hi = numpy.searchsorted(array, times).clip(1, len(array) - 1)
+        lo = hi - 1
+        return numpy.where(times - array[lo] < array[hi] - times, lo, hi)
+
+
+def frame_table(ts, num_samples, tables=None):
+    """Returns the FrameTable of a TimeSampling and number of samples,
+    shared through a dict of tables keyed by the time sampling descriptor.
+
+    :param ts: Alembic TimeSampling object.
+    :param num_samples: Number of samples.
+    :param tables: Dict of tables to share the result through.
+    """
+    if tables is None:
+        return FrameTable(ts, num_samples)
+    tst = ts.getTimeSamplingType()
+    key = (tst.getNumSamplesPerCycle(), tst.getTimePerCycle(),
+           tuple(ts.getStoredTimes()), num_samples)
+    table = tables.get(key)
+    if table is None:
+        table = tables[key] = FrameTable(ts, num_samples)
+    return table
+
+
+def world_matrices(iobject, frames, fps=24, tables=None):
+    """Returns a dict of full object path to world space matrices for every
+    object below an Alembic IObject, as (frames, 4, 4) float64 NumPy
+    arrays. Matrices are evaluated top-down, each object reusing its
+    parent's result, with the same convention as Object.global_matrix.
+    Non-xform objects get the world matrix of their parent xform.
+
+    The arrays of static branches are read-only broadcast views, and
+    objects under the same xform share one array.
+
+    :param iobject: Alembic IObject, usually the archive's top object.
+    :param frames: Sequence of frame numbers.
+    :param fps: Frames per second (default 24).
+    :param tables: Dict of FrameTables to share, see frame_table.
+    """
+    if numpy is None:
+        raise ImportError("NumPy is required for world matrices")
+    frames = list(frames)
+    if tables is None:
+        tables = {}
+    identity = numpy.identity(4)[numpy.newaxis]
+    matrices = {}
+    stack = [(iobject, identity)]
+    while stack:
+        parent, parent_world = stack.pop()
+        for i in range(parent.getNumChildren()):
+            child = parent.getChild(i)
+            world = parent_world
+            if alembic.AbcGeom.IXform.matches(child.getMetaData()):
+                schema = alembic.AbcGeom.IXform(
+                    parent, child.getName()).getSchema()
+                if schema.isConstant():
+                    indices = [0]
+                else:
+                    indices = frame_table(
+                        schema.getTimeSampling(), schema.getNumSamples(),
+                        tables
+                    ).indices(frames, fps)
+                decoded = {}
+                local = numpy.empty((len(indices), 4, 4))
+                for f, index in enumerate(indices):
+                    if index not in decoded:
+                        decoded[index] = imath_to_numpy(
+                            schema.getValue(index).getMatrix(), "float64",
+                            is_array=False
+                        )
+                    local[f] = decoded[index]
+                world = numpy.matmul(local, parent_world)
+            matrices[child.getFullName()] = world
+            stack.append((child, world))
+    shape = (len(frames), 4, 4)
+    for path, world in matrices.items():
+        if world.shape != shape:
+            matrices[path] = numpy.broadcast_to(world, shape)
+    return matrices
+
+
+def sample_bytes(prop, value):
+    """Returns the raw bytes of a decoded property sample, for hashing.
+    Falls back to the value's repr for data NumPy can't represent.
+
+    :param prop: cask.Property the value was read from.
+    :param value: Decoded sample value.
+    """
+    dtype = POD_NUMPY_DTYPE.get(prop.pod())
+    if numpy is not None and dtype is not None:
+        return imath_to_numpy(
+            value, dtype, prop.extent(), prop.is_array()).tobytes()
+    elif prop.is_array():
+        return repr(list(value))
+    return repr(value)
+
+
+def content_hash(iobject):
+    """Returns a sha1 hex digest of the hierarchy, metadata, time sampling
+    and samples below an Alembic IObject. The archive info (application,
+    date written, ...) is left out, so two exports of the same content
+    hash the same even though their files differ.
+
+    :param iobject: Alembic IObject, usually the archive's top object.
+    """
+    sha1 = hashlib.sha1()
+    stack = [iobject]
+    while stack:
+        iobj = stack.pop()
+        sha1.update(iobj.getFullName())
+        metadata = iobj.getMetaData().serialize()
+        if iobj.getFullName() == "/":
+            # the archive info is stored in the top object's metadata
+            metadata = ";".join(entry for entry in metadata.split(";")
+                                if not entry.startswith(ARCHIVE_INFO_PREFIX))
+        sha1.update(metadata)
+        props = [(iobj.getProperties(), "")]
+        while props:
+            compound, prefix = props.pop()
+            for i in range(compound.getNumProperties()):
+                iprop = compound.getProperty(i)
+                path = prefix + iprop.getName()
+                sha1.update(path)
+                sha1.update(iprop.getMetaData().serialize())
+                if iprop.isCompound():
+                    props.append((iprop, path + "/"))
+                    continue
+                ts = iprop.getTimeSampling()
+                sha1.update(repr((ts.getTimeSamplingType().getTimePerCycle(),
+                                  tuple(ts.getStoredTimes()),
+                                  iprop.getNumSamples())))
+                prop = Property(iprop)
+                for value in prop.values.stream():
+                    sha1.update(sample_bytes(prop, value))
+        stack.extend(iobj.getChild(i)
+                     for i in reversed(range(iobj.getNumChildren())))
+    return sha1.hexdigest()
+
+
 def _deep_getitem(access_func, key):
     """Facilitates deep dict get item on DeepDict class.
     """
@@ -448,13 +1046,18 @@ def _deep_getitem(access_func, key):
 class DeepDict(dict):
     """Special dict subclass that allows deep dictionary access, renaming when
     setting items and reflective reparenting.
+
+    If attr is given, the dict is not yet stored on its parent, and sets
+    itself as that attribute of the parent when the first item is set.
     """
+    __slots__ = ("parent", "klass", "visited", "attr")
 
-    def __init__(self, parent, klass=None):
+    def __init__(self, parent, klass=None, attr=None):
         super(DeepDict, self).__init__()
         self.parent = parent
         self.klass = klass
         self.visited = False
+        self.attr = attr
 
     def __getitem__(self, item):
         if type(item) == str:
@@ -501,6 +1104,9 @@ class DeepDict(dict):
         item._name = name
         item._parent = obj
         self.visited = True
+        if self.attr:
+            setattr(self.parent, self.attr, self)
+            self.attr = None
         return super(DeepDict, self).__setitem__(name, item)
 
     def remove(self, key):
@@ -509,6 +1115,323 @@ class DeepDict(dict):
             self.pop(key)
 
 
+class Stats(object):
+    """Counters and cumulative timings of archive opens, hierarchy and
+    property expansion and sample reads and writes. Measurements are only
+    taken while a Stats is active, see instrumented, and otherwise cost one
+    list check per call site. ::
+
+        >>> with cask.instrumented() as stats:
+        ...     build_scene()
+        >>> stats.counters["object.getChild"]
+        18250
+        >>> stats.dump("/tmp/build_scene_stats.json")
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<Stats %s>" % self.counters
+
+    def add(self, name, count=1, seconds=None):
+        """Adds to a counter and its cumulative time.
+
+        :param name: Counter name.
+        :param count: Amount to add to the counter.
+        :param seconds: Time to add, or None.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + count
+            if seconds is not None:
+                self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def reset(self):
+        """Clears all counters and timings."""
+        with self._lock:
+            self.counters.clear()
+            self.timings.clear()
+
+    def as_dict(self):
+        """Returns a copy of the counters and timings as a dict."""
+        with self._lock:
+            return {"counters": dict(self.counters),
+                    "timings": dict(self.timings)}
+
+    def dump(self, filepath):
+        """Writes the counters and timings to a JSON file.
+
+        :param filepath: Path of the JSON file.
+        """
+        with open(filepath, "w") as f:
+            json.dump(self.as_dict(), f, indent=2, sort_keys=True)
+
+
+# Stats currently taking measurements
+_ACTIVE_STATS = []
+
+# process-wide Stats, see set_instrumentation
+STATS = Stats()
+
+
+def _record(name, count=1, start=None):
+    """Adds to a counter on every active Stats, with the time elapsed since
+    start when given. Call sites check _ACTIVE_STATS first.
+    """
+    seconds = time.time() - start if start is not None else None
+    for stats in _ACTIVE_STATS:
+        stats.add(name, count, seconds)
+
+
+@contextlib.contextmanager
+def instrumented(stats=None):
+    """Context manager that measures everything cask does inside it and
+    yields the Stats. Scopes can be nested, each gets its own measurements.
+
+    :param stats: Stats to add to (default a new Stats).
+    """
+    if stats is None:
+        stats = Stats()
+    _ACTIVE_STATS.append(stats)
+    try:
+        yield stats
+    finally:
+        _ACTIVE_STATS.remove(stats)
+
+
+def set_instrumentation(enabled):
+    """Turns the process-wide measurements on STATS on or off."""
+    if enabled and STATS not in _ACTIVE_STATS:
+        _ACTIVE_STATS.append(STATS)
+    elif not enabled and STATS in _ACTIVE_STATS:
+        _ACTIVE_STATS.remove(STATS)
+
+
+def _sample_nbytes(value, itemsize):
+    """Returns the estimated number of bytes used by a decoded sample."""
+    if isinstance(value, basestring):
+        return len(value)
+    try:
+        return max(len(value), 1) * itemsize
+    except TypeError:
+        return itemsize
+
+
+class SampleCache(object):
+    """LRU of decoded samples, bounded by an approximate memory budget in
+    bytes. A single cache is shared by every Samples sequence, so the budget
+    applies to all open archives at once.
+    """
+
+    def __init__(self, budget=SAMPLE_CACHE_BUDGET):
+        """
+        :param budget: Memory budget in bytes.
+        """
+        self.budget = budget
+        self.nbytes = 0
+        self._items = OrderedDict()
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<SampleCache %d/%d bytes>' % (self.nbytes, self.budget)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __pop(self, key):
+        value, nbytes = self._items.pop(key)
+        self.nbytes -= nbytes
+        indices = self._tokens.get(key[0])
+        if indices is not None:
+            indices.discard(key[1])
+            if not indices:
+                del self._tokens[key[0]]
+        return value
+
+    def __evict(self):
+        while self.nbytes > self.budget and self._items:
+            self.__pop(next(iter(self._items)))
+
+    def get(self, key, default=None):
+        """Returns a cached sample and marks it as most recently used.
+
+        :param key: (token, index) tuple.
+        :param default: Returned if the sample is not cached.
+        """
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None:
+                return default
+            self._items[key] = item
+            return item[0]
+
+    def put(self, key, value, nbytes):
+        """Caches a decoded sample, evicting least recently used samples
+        until the cache fits in its budget.
+
+        :param key: (token, index) tuple.
+        :param value: Decoded sample value.
+        :param nbytes: Estimated size of the value in bytes.
+        """
+        if nbytes > self.budget:
+            return
+        with self._lock:
+            if key in self._items:
+                self.__pop(key)
+            self._items[key] = (value, nbytes)
+            self._tokens.setdefault(key[0], set()).add(key[1])
+            self.nbytes += nbytes
+            self.__evict()
+
+    def discard(self, token):
+        """Drops all cached samples for a given Samples token."""
+        with self._lock:
+            for index in list(self._tokens.get(token, ())):
+                self.__pop((token, index))
+
+    def set_budget(self, budget):
+        """Sets the memory budget in bytes, evicting samples if needed."""
+        with self._lock:
+            self.budget = budget
+            self.__evict()
+
+    def clear(self):
+        """Drops all cached samples."""
+        with self._lock:
+            self._items.clear()
+            self._tokens.clear()
+            self.nbytes = 0
+
+
+# decoded samples shared by all archives
+SAMPLE_CACHE = SampleCache()
+
+# unique ids for Samples sequences, used as sample cache keys
+_SAMPLE_TOKENS = itertools.count()
+
+_MISSING = object()
+
+
+def set_sample_cache_budget(budget):
+    """Sets the memory budget, in bytes, for decoded samples."""
+    SAMPLE_CACHE.set_budget(budget)
+
+
+class Samples(object):
+    """Lazily-decoded sequence of samples. Behaves like a list of values,
+    but a sample is only decoded when it is indexed, and decoded samples live
+    in the shared SampleCache instead of on the sequence. ::
+
+        >>> p = a.top.children["cube1/cube1Shape"].properties[".geom/P"]
+        >>> p.values[10]
+        >>> p.values[10:12]
+
+    Values set or appended on the sequence are kept as edits and take
+    precedence over the archive samples.
+    """
+
+    def __init__(self, reader, num_samples, itemsize=DEFAULT_SAMPLE_NBYTES,
+                 cache=None):
+        """
+        :param reader: Callable returning the decoded sample for an index.
+        :param num_samples: Number of samples stored in the archive.
+        :param itemsize: Estimated bytes per element, for the memory budget.
+        :param cache: SampleCache instance (default SAMPLE_CACHE).
+        """
+        self._reader = reader
+        self._length = num_samples
+        self._itemsize = itemsize
+        self._cache = cache if cache is not None else SAMPLE_CACHE
+        self._token = next(_SAMPLE_TOKENS)
+        self._edits = {}
+        # views share their source's cached samples and leave them alone
+        self._is_view = False
+
+    def __repr__(self):
+        return '<Samples %d>' % len(self)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        for index in xrange(len(self)):
+            yield self[index]
+
+    def __index(self, index):
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("Sample index out of range: %s" % index)
+        return index
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(len(self)))]
+        index = self.__index(index)
+        if index in self._edits:
+            return self._edits[index]
+        return self.__decode(index)
+
+    def __setitem__(self, index, value):
+        self._edits[self.__index(index)] = value
+
+    def __decode(self, index, cache=True):
+        key = (self._token, index)
+        value = self._cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        start = time.time() if _ACTIVE_STATS else None
+        try:
+            value = self._reader(index)
+        except RuntimeError, err:
+            print "Bad value on sample:", index, err
+            return str(err)
+        nbytes = _sample_nbytes(value, self._itemsize)
+        if start is not None:
+            _record("samples.read", 1, start)
+            _record("samples.bytes", nbytes)
+        if cache:
+            self._cache.put(key, value, nbytes)
+        return value
+
+    def stream(self):
+        """Generator that yields every value in order without adding the
+        decoded samples to the sample cache, for one-pass reads like writing.
+        """
+        for index in xrange(len(self)):
+            if index in self._edits:
+                yield self._edits[index]
+            else:
+                yield self.__decode(index, cache=False)
+
+    def append(self, value):
+        """Appends a value after the last sample."""
+        self._edits[self._length] = value
+        self._length += 1
+
+    def view(self):
+        """Returns a new sequence over the same archive samples, sharing
+        the decoded samples in the cache. Edits are copied, and later
+        edits on either sequence don't show on the other.
+        """
+        view = Samples(self._reader, self._length, self._itemsize, self._cache)
+        view._token = self._token
+        view._edits = dict(self._edits)
+        view._is_view = True
+        return view
+
+    def release(self):
+        """Drops this sequence's decoded samples from the sample cache.
+        Does nothing on a view, the samples belong to the sequence it was
+        made from.
+        """
+        if not self._is_view:
+            self._cache.discard(self._token)
+
+
 class Archive(object):
     """Archive I/O Object"""
 
@@ -528,6 +1451,9 @@ class Archive(object):
         self._iobject = None
         self._oobject = None
         self._top = None
+        self._summary = None
+        self._frame_tables = {}
+        self._bounds_indices = {}
 
         # time sampling attributes
         self.time_sampling_id = 0
@@ -547,7 +1473,10 @@ class Archive(object):
     def __get_iobject(self):
         if self._iobject is None:
             if self.filepath and os.path.exists(self.filepath):
+                start = time.time() if _ACTIVE_STATS else None
                 self._iobject = alembic.Abc.IArchive(self.filepath)
+                if start is not None:
+                    _record("archive.open", 1, start)
         return self._iobject
 
     def __set_iobject(self, iobject):
@@ -593,6 +1522,9 @@ class Archive(object):
         self.iobject = None
         self.oobject = None
         self.top = None
+        self._summary = None
+        self._frame_tables = {}
+        self._bounds_indices = {}
         self.__get_iobject()
         self.__time_sampling_objects = []
         self.time_sampling_id = max(len(self.timesamplings) - 1, 0)
@@ -646,39 +1578,38 @@ class Archive(object):
             self.__start_time = self.__end_time = None
         return self.timesamplings.index(ts)
 
-    def time_range(self):
-        """Returns a tuple of the global start and end time in seconds.
+    def frame_table(self, ts, num_samples):
+        """Returns the FrameTable for a TimeSampling object and number of
+        samples, built once and shared by every property on it.
 
-        ** Depends on the X.samples property being set on the Top node,
-        which is currently being written by Maya only. **
+        :param ts: Alembic TimeSampling object.
+        :param num_samples: Number of samples.
         """
-        top_props = self.top.properties
-        g_start_frame, g_end_time = (None, None)
+        return frame_table(ts, num_samples, self._frame_tables)
 
+    def time_range(self):
+        """Returns a tuple of the global start and end time in seconds,
+        from the sample times of the last time sampling.
+        """
         if self.__start_time is not None and self.__end_time is not None:
             return (self.__start_time, self.__end_time)
 
-        num_stored_times = 1
-
+        start_time = end_time = None
         for index, ts in enumerate(self.timesamplings):
             tst = ts.getTimeSamplingType()
-            if tst.isCyclic() or tst.isUniform():
-                tpc = tst.getNumSamplesPerCycle()
-                self.__start_time = ts.getStoredTimes()[0]
-                self.__end_time = self.__start_time +\
-                    (((self.iobject.getMaxNumSamplesForTimeSamplingIndex(index) / tpc) - 1)\
-                    / float(self.fps))
-            elif tst.isAcyclic():
-                num_times = ts.getNumStoredTimes()
-                num_stored_times = num_times
-                self.__start_time = ts.getSampleTime(0)
-                self.__end_time = ts.getSampleTime(num_times-1)
+            if tst.isAcyclic():
+                num_samples = ts.getNumStoredTimes()
+            else:
+                num_samples = \
+                    self.iobject.getMaxNumSamplesForTimeSamplingIndex(index)
+            times = self.frame_table(ts, max(num_samples, 1)).times
+            start_time, end_time = times[0], times[-1]
 
         if self.__start_time is None:
-            self.__start_time = 0.0
+            self.__start_time = start_time or 0.0
 
         if self.__end_time is None:
-            self.__end_time = 0.0
+            self.__end_time = end_time or 0.0
 
         return (self.__start_time, self.__end_time)
 
@@ -712,27 +1643,85 @@ class Archive(object):
         """Returns a tuple of the global start and end times in frames."""
         return (self.start_frame(), self.end_frame())
 
+    def world_matrices(self, frames=None):
+        """Returns a dict of object path to world space matrices for every
+        object in the archive, as (frames, 4, 4) NumPy arrays. See
+        cask.world_matrices. ::
+
+            >>> a.world_matrices(range(1001, 1101))["/cube1"].shape
+            (100, 4, 4)
+
+        :param frames: Sequence of frame numbers (default frame range).
+        """
+        if frames is None:
+            start, end = self.frame_range()
+            frames = range(int(start), int(end) + 1)
+        return world_matrices(self.iobject.getTop(), frames, self.fps,
+                              self._frame_tables)
+
+    def bounds_index(self, frames=None, world=True, union=True):
+        """Returns a BoundsIndex over the bounds of every object in the
+        archive, built once per set of arguments and cached on the archive.
+
+        :param frames: Sequence of frame numbers (default frame range).
+        :param world: Transform bounds to world space (default True).
+        :param union: One box per object over all frames (default True).
+        """
+        if frames is None:
+            start, end = self.frame_range()
+            frames = range(int(start), int(end) + 1)
+        key = (tuple(frames), world, union)
+        index = self._bounds_indices.get(key)
+        if index is None:
+            index = self._bounds_indices[key] = BoundsIndex.build(
+                self.iobject.getTop(), frames, self.fps, world, union,
+                self._frame_tables
+            )
+        return index
+
+    def content_hash(self):
+        """Returns the sha1 hex digest of this archive's content, see
+        cask.content_hash.
+        """
+        return content_hash(self.iobject.getTop())
+
+    def summary(self):
+        """Returns a dict of object path to AnimationFlags for every object
+        in the archive. Computed in one traversal and cached on the archive.
+        ::
+
+            >>> a.summary()["/cube1/cube1Shape"]
+            AnimationFlags(animated=True, deforming=True, topology=False, visibility=False)
+        """
+        if self._summary is None:
+            if self.iobject:
+                self._summary = animation_summary(self.iobject.getTop())
+            else:
+                self._summary = {}
+        return self._summary
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def close(self):
-        """Closes this archive and makes it immutable."""
-        def close_tree(obj):
-            """recursive close"""
-            for child in obj.children.values():
-                close_tree(child)
-                del child
-            obj.close()
-            del obj
-
-        for child in self.top.children.values():
-            close_tree(child)
-            del child
+        """Closes this archive and makes it immutable. The hierarchy read so
+        far is released in one pass, and the file is closed once nothing
+        else holds on to its objects. ::
 
+            >>> with cask.Archive("/tmp/in.abc") as a:
+            ...     a.frame_range()
+        """
+        if self._top is not None:
+            _release_tree(self._top)
+            self._top = None
         self._iobject = None
         self._oobject = None
-        self._top._iobject = None
-        self._top._oobject = None
-        self._top._parent = None
-        self._top._child_dict.clear()
-        self._top._prop_dict.clear()
+        self._summary = None
+        self._frame_tables = {}
+        self._bounds_indices = {}
 
     def __write(self):
         """Recursively calls save() on object hierarchy. Normally, you will
@@ -741,17 +1730,17 @@ class Archive(object):
         if not self.oobject:
             raise ValueError("No output filepath specified")
         self.top.save()
-        def save_tree(obj):
-            """recursive save"""
+        # objects are closed once their sub-tree is saved, freeing samples
+        # as the write goes instead of all at the end
+        stack = [(child, False) for child in self.top.children.values()]
+        while stack:
+            obj, saved = stack.pop()
+            if saved:
+                obj.close()
+                continue
             obj.save()
-            for child in obj.children.values():
-                save_tree(child)
-                child.close()
-                del child
-            obj.close()
-            del obj
-        for child in self.top.children.values():
-            save_tree(child)
+            stack.append((obj, True))
+            stack.extend((child, False) for child in obj.children.values())
         self.top.close()
 
     # TODO: non-destructive saving (changes are lost)
@@ -769,34 +1758,33 @@ class Archive(object):
             self.time_sampling_id = 1
         # create the oarchive
         if not self.oobject:
-            # support for Ogawa archives via CreateArchiveWithInfo
-            # came in Alembic 1.5.7
-            m1, m2, m3 = (int(m) for m in self.using_version().split("."))
-            if m1 == 1 and m2 <= 5 and m3 < 7:
-                self.oobject = alembic.Abc.OArchive(filepath, asOgawa=asOgawa)
+            if self.top.iobject:
+                md = self.top.iobject.getMetaData()
             else:
-                if self.top.iobject:
-                    md = self.top.iobject.getMetaData()
-                else:
-                    md = alembic.AbcCoreAbstract.MetaData()
-                for k, v in self.top.metadata.items():
-                    md.set(k, v)
-                self.oobject = alembic.Abc.CreateArchiveWithInfo(
-                    filepath,
-                    "cask %s" % __version__,
-                    str(userDescription),
-                    md, 1
-                )
+                md = alembic.AbcCoreAbstract.MetaData()
+            for k, v in self.top.metadata.items():
+                md.set(k, v)
+            self.oobject = create_oarchive(filepath, md, userDescription,
+                                           asOgawa)
             self.top.oobject = self.oobject.getTop()
         # set timesampling objects on the oarchive
         for i, time_sample in smps:
             self.oobject.addTimeSampling(time_sample)
+        start = time.time() if _ACTIVE_STATS else None
         self.__write()
         self.close()
+        if start is not None:
+            _record("archive.write", 1, start)
 
 
 class Property(object):
     """Property I/O Object."""
+    __slots__ = (
+        "_parent", "_name", "_metadata", "_datatype", "_iobject", "_oobject",
+        "_klass", "_values", "_prop_dict", "_frame_table", "time_sampling_id",
+        "__weakref__",
+    )
+
     def __init__(self, iproperty=None, time_sampling_id=0, name=None, klass=None):
         """
         :param iproperty: Alembic IProperty class object.
@@ -805,18 +1793,18 @@ class Property(object):
         :param klass: OProperty class used for writing
         """
         super(Property, self).__init__()
-        self.id = id(self)
 
-        # init some private variables
+        # init some private variables, containers are created when used
         self._parent = None
-        self._name = name
-        self._metadata = {}
+        self._name = _intern(name)
+        self._metadata = None
         self._datatype = None
         self._iobject = iproperty
         self._oobject = None
         self._klass = klass
-        self._values = []
-        self._prop_dict = DeepDict(self, Property)
+        self._values = None
+        self._prop_dict = None
+        self._frame_table = None
         self.time_sampling_id = time_sampling_id
 
         # if we have an iproperty, get some values from it
@@ -826,6 +1814,11 @@ class Property(object):
     def __repr__(self):
         return '<Property "%s">' % self.name
 
+    @property
+    def id(self):
+        """Unique id of this property."""
+        return id(self)
+
     def get_item(self, item):
         """Used for deep dict access"""
         return self.properties[item]
@@ -911,7 +1904,7 @@ class Property(object):
 
     def __set_name(self, name):
         old = self._name
-        self._name = name
+        self._name = _intern(name)
         if self._parent and hasattr(self._parent, "_prop_dict"):
             if old and old in self.parent.properties.keys():
                 self._parent.properties.remove(old)
@@ -921,6 +1914,8 @@ class Property(object):
                     doc="Gets and sets the property name.")
 
     def __get_metadata(self):
+        if self._metadata is None:
+            self._metadata = {}
         if not self._metadata and self.iobject:
             meta = self.iobject.getMetaData()
             for field in meta.serialize().split(';'):
@@ -1009,22 +2004,31 @@ class Property(object):
             self.iobject = iproperty
             self.name = iproperty.getName()
         if iproperty.isCompound():
-            for i in range(self.iobject.getNumProperties()):
+            start = time.time() if _ACTIVE_STATS else None
+            num_properties = self.iobject.getNumProperties()
+            for i in range(num_properties):
                 self.add_property(Property(
                         iproperty = iproperty.getProperty(i),
                         time_sampling_id = self.time_sampling_id
                     )
                  )
+            if start is not None:
+                _record("property.getProperty", num_properties, start)
 
     @property
     def properties(self):
-        """Child properties accessor."""
+        """Child properties accessor. Properties without sub-properties get
+        a new, detached dict on each access, so internal checks look at
+        _prop_dict directly.
+        """
+        if self._prop_dict is None:
+            return DeepDict(self, Property, "_prop_dict")
         return self._prop_dict
 
     def is_leaf(self):
         """Returns True if this property is a leaf node, i.e. it has no sub-properties.
         """
-        return len(self.properties) == 0
+        return not self._prop_dict
 
     def is_compound(self):
         """Returns True if this property contains sub-properties.
@@ -1034,7 +2038,7 @@ class Property(object):
         """
         if self.iobject:
             return self.iobject.isCompound()
-        return len(self.properties) > 0
+        return bool(self._prop_dict)
 
     def __get_sample_index(self, time=None, frame=None):
         """Converts time in secs or frame number to sample index.
@@ -1043,33 +2047,58 @@ class Property(object):
         :param frame: frame number.
         :return: sample index.
         """
-        if len(self.properties) > 0:
+        if self._prop_dict:
             raise TypeError(_COMPOUND_PROPERTY_VALUE_ERROR_)
+        if time is not None:
+            return self.__get_frame_table().index(float(time))
+        elif frame is not None:
+            return self.__get_frame_table().frame_index(
+                frame, self.archive().fps)
+        else:
+            return 0
+
+    def __get_frame_table(self):
+        """Returns the FrameTable of this property's time sampling. Tables
+        of read properties are kept, written properties are still growing.
+        """
+        if self._frame_table is not None:
+            return self._frame_table
         if self.iobject:
             ts = self.iobject.getTimeSampling()
-            numSamples = self.iobject.getNumSamples()
+            num_samples = self.iobject.getNumSamples()
         else:
             ts = self.object().schema.getTimeSampling()
-            numSamples = self.object().schema.getNumSamples()
-        if time is not None:
-            return ts.getNearIndex(float(time), numSamples)
-        elif frame is not None:
-            return ts.getNearIndex((frame / float(self.archive().fps)),
-                numSamples)
+            num_samples = self.object().schema.getNumSamples()
+        archive = self.archive()
+        if archive is None:
+            table = frame_table(ts, num_samples)
         else:
-            return 0
+            table = archive.frame_table(ts, num_samples)
+        if self.iobject:
+            self._frame_table = table
+        return table
+
+    def _itemsize(self):
+        """Returns the estimated number of bytes per value element."""
+        try:
+            return POD_NUM_BYTES.get(self.pod(), 8) * max(self.extent(), 1)
+        except AttributeError:
+            return DEFAULT_SAMPLE_NBYTES
 
     @property
     def values(self):
-        """Returns dictionary of values stored on this property.
+        """Returns the sequence of values stored on this property. Values
+        stored in the archive are decoded lazily, see Samples.
         """
-        if not self.is_compound() and not self._values and self.iobject:
-            for i in range(len(self.iobject.samples)):
-                try:
-                    self._values.insert(i, self.iobject.samples[i])
-                except RuntimeError, err:
-                    print "Bad value on sample:", i, err
-                    self._values.insert(i, str(err))
+        if not self.is_compound() and not self._values and self.iobject \
+                and not isinstance(self._values, Samples):
+            self._values = Samples(
+                self.iobject.getValue,
+                self.iobject.getNumSamples(),
+                itemsize=self._itemsize()
+            )
+        elif self._values is None:
+            self._values = []
         return self._values
 
     def get_value(self, index=None, time=None, frame=None):
@@ -1092,9 +2121,67 @@ class Property(object):
         try:
             return self.values[index]
         except (KeyError, IndexError):
-            val = self.iobject.getValue(index)
-            self.values[index] = val
-            return val
+            if not self.iobject:
+                raise
+            return self.iobject.getValue(index)
+
+    def get_values(self, start=None, end=None):
+        """Returns a list of the values for the sample index range
+        [start, end). Only the samples inside the window are decoded.
+
+        :param start: first sample index (default 0)
+        :param end: sample index to stop before (default last + 1)
+        """
+        if self.is_compound():
+            raise TypeError(_COMPOUND_PROPERTY_VALUE_ERROR_)
+        return list(self.values[start:end])
+
+    def as_numpy(self, index=None, time=None, frame=None, frames=None):
+        """Returns the value of this property as a contiguous NumPy array,
+        shaped (n, extent) for array properties, e.g. (points, 3) for P.
+        Given a list of frames, returns the values stacked into one
+        (frames, n, extent) array. ::
+
+            >>> p = a.top.children["cube1/cube1Shape"].properties[".geom/P"]
+            >>> p.as_numpy(frame=1001).shape
+            (8, 3)
+            >>> p.as_numpy(frames=range(1001, 1101)).shape
+            (100, 8, 3)
+
+        Provide one of the following args. If none are provided, it will
+        return the 0th value.
+
+        :param index: sample index
+        :param time: time in seconds
+        :param frame: frame number (assumes 24fps, to change set on archive)
+        :param frames: sequence of frame numbers to stack
+        """
+        if numpy is None:
+            raise ImportError("NumPy is required for Property.as_numpy")
+        if self.is_compound():
+            raise TypeError(_COMPOUND_PROPERTY_VALUE_ERROR_)
+        dtype = POD_NUMPY_DTYPE.get(self.pod())
+        if dtype is None:
+            raise TypeError("No NumPy dtype for %s values" % self.name)
+        if frames is not None:
+            frames = list(frames)
+            if not frames:
+                return numpy.empty((0,), dtype=dtype)
+            indices = self.__get_frame_table().indices(
+                frames, self.archive().fps)
+            first = self.as_numpy(index=indices[0])
+            stack = numpy.empty((len(frames),) + first.shape, dtype=dtype)
+            stack[0] = first
+            for i, frame in enumerate(frames[1:], 1):
+                array = self.as_numpy(index=indices[i])
+                if array.shape != first.shape:
+                    raise ValueError(
+                        "Can not stack %s, its shape changes at frame %s"
+                        % (self.name, frame))
+                stack[i] = array
+            return stack
+        value = self.get_value(index=index, time=time, frame=frame)
+        return imath_to_numpy(value, dtype, self.extent(), self.is_array())
 
     def set_value(self, value, index=None, time=None, frame=None):
         """Sets a value on the property at a given index.
@@ -1110,7 +2197,7 @@ class Property(object):
             raise TypeError(_COMPOUND_PROPERTY_VALUE_ERROR_)
         value = _delist(value)
         if index == None and time == None and frame == None:
-            index = len(self._values)
+            index = len(self._values or ())
         elif index is None:
             index = self.__get_sample_index(time, frame)
         if index < len(self.values):
@@ -1120,24 +2207,30 @@ class Property(object):
 
     def clear_properties(self):
         """Clears the properties container."""
-        self._prop_dict = DeepDict(self, Property)
+        self._prop_dict = None
 
     def clear_values(self):
         """Clears the values container."""
-        self._values = []
+        if isinstance(self._values, Samples):
+            self._values.release()
+        self._values = None
 
     def close(self):
         """Closes this property by removing references to internal OProperty.
         """
         if self.parent and self.name in self.parent.properties:
             del self.parent.properties[self.name]
+        _release_tree(self)
+
+    def _release(self):
+        """Drops this property's Alembic objects, values and containers."""
         self._iobject = None
         self._oobject = None
         self._klass = None
         self._parent = None
-        self._values = []
-        for prop in self.properties.values():
-            prop.close()
+        self._frame_table = None
+        self.clear_values()
+        self.clear_properties()
 
     def save(self):
         """Walks sub-tree and creates corresponding alembic OProperty classes,
@@ -1146,14 +2239,22 @@ class Property(object):
         if self.oobject and not self.is_compound():
             if self.name in (".selfBnds", ".childBnds"):
                 self.oobject.getMetaData().set("interpretation", "box")
-            for value in self.values:
+            values = self.values
+            if isinstance(values, Samples):
+                values = values.stream()
+            start = time.time() if _ACTIVE_STATS else None
+            count = 0
+            for value in values:
                 try:
                     value = python_to_imath(value)
                     self.oobject.setValue(value)
+                    count += 1
                 except Exception, err:
                     print "Error setting value on %s: %s %s\n%s" \
                         % (self.name, value, self._klass, err)
                 del value
+            if start is not None:
+                _record("samples.write", count, start)
         else:
             for prop in self.properties.values():
                 up = False
@@ -1183,7 +2284,13 @@ class Property(object):
 
 class Object(object):
     """Base I/O Object class."""
+    __slots__ = (
+        "_name", "_metadata", "_isamples", "_osamples", "_iobject",
+        "_oobject", "_klass", "_schema", "_parent", "_animation_flags", "_tsid",
+        "_prop_dict", "_child_dict", "__weakref__",
+    )
     _sample_class = None
+
     def __init__(self, iobject=None, schema=None,
                  time_sampling_id=None, name=None):
         """
@@ -1192,22 +2299,21 @@ class Object(object):
         :param time_sampling_id: The ID of the TimeSampling object
         """
         super(Object, self).__init__()
-        self.id = id(self)
 
-        # init some private variables
-        self._name = name
-        self._metadata = {}
-        self._isamples = []
-        self._osamples = []
+        # init some private variables, containers are created when used
+        self._name = _intern(name)
+        self._metadata = None
+        self._isamples = None
+        self._osamples = None
         self._iobject = iobject
         self._oobject = None
         self._klass = None
         self._schema = schema
         self._parent = None
-        self._is_animated = None
+        self._animation_flags = None
         self._tsid = time_sampling_id
-        self._prop_dict = DeepDict(self, Property)
-        self._child_dict = DeepDict(self, Object)
+        self._prop_dict = None
+        self._child_dict = None
 
         # init some stuff
         self.clear_all()
@@ -1216,6 +2322,11 @@ class Object(object):
     def __repr__(self):
         return '<%s "%s">' % (self.__class__.__name__, self.name)
 
+    @property
+    def id(self):
+        """Unique id of this object."""
+        return id(self)
+
     def get_item(self, item):
         """Used for deep dict access"""
         return self.children[item]
@@ -1316,8 +2427,8 @@ class Object(object):
 
     def __set_name(self, name):
         old = self._name
-        self._name = name
-        if self.parent and hasattr(self._parent, "_child_dict"):
+        self._name = _intern(name)
+        if self.parent and getattr(self._parent, "_child_dict", None):
             if old and old in self._parent._child_dict.keys():
                 self._parent._child_dict.remove(old)
                 self._parent._child_dict[name] = self
@@ -1337,6 +2448,8 @@ class Object(object):
                                 doc="Time sampling ID.")
 
     def __get_metadata(self):
+        if self._metadata is None:
+            self._metadata = {}
         if not self._metadata and self.iobject:
             meta = self.iobject.getMetaData()
             for field in meta.serialize().split(';'):
@@ -1382,41 +2495,60 @@ class Object(object):
     def __read_object(self):
         """reads object, sets name"""
         if self.iobject and type(self) != Top:
-            self.name = self.iobject.getName()
+            self._name = _intern(self.iobject.getName())
 
     @property
     def children(self):
         """Returns children sub-tree accessor. """
+        if self._child_dict is None:
+            if self.iobject and self.iobject.getNumChildren() == 0:
+                return DeepDict(self, Object, "_child_dict")
+            self._child_dict = DeepDict(self, Object)
         if not self._child_dict.visited and self.iobject:
-            for i in range(self.iobject.getNumChildren()):
+            start = time.time() if _ACTIVE_STATS else None
+            num_children = self.iobject.getNumChildren()
+            for i in range(num_children):
+                # children wrapped by a query are kept as they are
+                if self.iobject.getChildHeader(i).getName() in self._child_dict:
+                    continue
                 child = wrap(
                     iobject = self.iobject.getChild(i),
                     time_sampling_id = self.time_sampling_id
                 )
                 self._child_dict[child.name] = child
+            self._child_dict.visited = True
+            if start is not None:
+                _record("object.getChild", num_children, start)
         return self._child_dict
 
     @property
     def properties(self):
         """Properties accessor."""
+        if self._prop_dict is None:
+            if not self.iobject:
+                return DeepDict(self, Property, "_prop_dict")
+            self._prop_dict = DeepDict(self, Property)
         if not self._prop_dict.visited and self.iobject:
+            start = time.time() if _ACTIVE_STATS else None
             props = self.iobject.getProperties()
-            for i in range(len(props.propertyheaders)):
+            num_properties = len(props.propertyheaders)
+            for i in range(num_properties):
                 prop = Property(
                     iproperty = props.getProperty(i),
                     time_sampling_id = self.time_sampling_id
                 )
                 self._prop_dict[prop.name] = prop
+            if start is not None:
+                _record("object.getProperty", num_properties, start)
         return self._prop_dict
 
     @property
     def samples(self):
-        """Returns samples from the Alembic IObject."""
-        if self.iobject and len(self._isamples) == 0:
-            num_samples = self.schema.getNumSamples()
+        """Returns samples from the Alembic IObject, decoded lazily."""
+        if self.iobject and not isinstance(self._isamples, Samples):
             schema = self.schema
-            self._isamples = [schema.getValue(i) for i in range(num_samples)]
-        return self._isamples
+            self._isamples = Samples(schema.getValue, schema.getNumSamples())
+        return self._isamples if self._isamples is not None else []
 
     def set_sample(self, sample, index=None):
         """Sets an Alembic sample object on this object.
@@ -1428,6 +2560,8 @@ class Object(object):
         :param sample: Alembic sample object.
         :param index: Index of the sample to set, or None.
         """
+        if self._osamples is None:
+            self._osamples = []
         if index is None:
             index = len(self._osamples)
         assert type(sample) == self._sample_class,\
@@ -1440,32 +2574,30 @@ class Object(object):
     def is_leaf(self):
         """Returns True if this object is a leaf node, i.e. it has no children.
         """
+        if self._child_dict is None and self.iobject:
+            # read objects don't need their children wrapped to answer
+            return self.iobject.getNumChildren() == 0
         return len(self.children) == 0
 
+    def animation_flags(self):
+        """Returns the AnimationFlags of this object, computed once from the
+        Alembic IObject and cached.
+        """
+        if self._animation_flags is None:
+            if not self.iobject:
+                return STATIC
+            self._animation_flags = animation_flags(self.iobject)
+        return self._animation_flags
+
     def is_animated(self):
         """Returns True if any properties are not constant.
         """
-        self._is_animated = False
-        def _is_animated(prop):
-            """recursive check"""
-            if not prop.is_compound() and not prop.iobject.isConstant():
-                self._is_animated = True
-            for child in prop.properties.values():
-                _is_animated(child)
-        for prop in self.properties.values():
-            _is_animated(prop)
-        return self._is_animated
+        return self.animation_flags().animated
 
     def is_deforming(self):
         """Returns True if the object has changing P values.
         """
-        try:
-            prop = self.properties[".geom/P"]
-            if prop:
-                return not prop.iobject.isConstant()
-            return False
-        except KeyError:
-            return False
+        return self.animation_flags().deforming
 
     def start_frame(self):
         """Returns start frame.
@@ -1507,16 +2639,18 @@ class Object(object):
 
     def clear_properties(self):
         """Clears the internal properties container."""
-        self._prop_dict = DeepDict(self, Property)
+        self._prop_dict = None
 
     def clear_samples(self):
         """Clears the internal samples container."""
-        self._isamples = []
-        self._osamples = []
+        if isinstance(self._isamples, Samples):
+            self._isamples.release()
+        self._isamples = None
+        self._osamples = None
 
     def clear_children(self):
         """Clears the internal children container."""
-        self._child_dict = DeepDict(self, Object)
+        self._child_dict = None
 
     def clear_all(self):
         self.clear_properties()
@@ -1528,15 +2662,16 @@ class Object(object):
         """
         if self.parent and self.parent.type() != 'Archive':
             del self.parent.children[self.name]
+        _release_tree(self)
+
+    def _release(self):
+        """Drops this object's Alembic objects, samples and containers."""
         self._iobject = None
         self._oobject = None
         self._klass = None
         self._parent = None
         self._schema = None
         self.clear_all()
-        for prop in self.properties.values():
-            prop.close()
-            del prop
 
     def save(self):
         """Walks child and property sub-trees creating OObjects as necessary.
@@ -1551,7 +2686,7 @@ class Object(object):
         # OCameras have no getSchema method, properties written explicitly
         if self.type() == 'Camera' and self.iobject:
             return
-        for sample in self._osamples:
+        for sample in self._osamples or []:
             try:
                 if self.type() == 'Light' \
                    and type(sample) == alembic.AbcGeom.CameraSample:
@@ -1567,6 +2702,7 @@ class Object(object):
 
 class Top(Object):
     """Alembic Top Object."""
+    __slots__ = ()
     def __init__(self, archive, iobject=None):
         super(Top, self).__init__(iobject)
         self._parent = weakref.proxy(archive)
@@ -1598,6 +2734,7 @@ class Top(Object):
 
 class Xform(Object):
     """Xform I/O Object subclass."""
+    __slots__ = ()
     _sample_class = alembic.AbcGeom.XformSample
     def __init__(self, *args, **kwargs):
         super(Xform, self).__init__(*args, **kwargs)
@@ -1625,6 +2762,7 @@ class Xform(Object):
 
 class PolyMesh(Object):
     """PolyMesh I/O Object subclass."""
+    __slots__ = ()
     _sample_class = alembic.AbcGeom.OPolyMeshSchemaSample
     def __init__(self, *args, **kwargs):
         super(PolyMesh, self).__init__(*args, **kwargs)
@@ -1632,6 +2770,7 @@ class PolyMesh(Object):
 
 class SubD(Object):
     """SubD I/O Object subclass."""
+    __slots__ = ()
     _sample_class = alembic.AbcGeom.OSubDSchemaSample
     def __init__(self, *args, **kwargs):
         super(SubD, self).__init__(*args, **kwargs)
@@ -1639,6 +2778,7 @@ class SubD(Object):
 
 class FaceSet(Object):
     """FaceSet I/O Object subclass."""
+    __slots__ = ()
     _sample_class = alembic.AbcGeom.OFaceSetSchemaSample
     def __init__(self, *args, **kwargs):
         super(FaceSet, self).__init__(*args, **kwargs)
@@ -1646,6 +2786,7 @@ class FaceSet(Object):
 
 class Curve(Object):
     """Curve I/O Object subclass."""
+    __slots__ = ()
     _sample_class = alembic.AbcGeom.OCurvesSchemaSample
     def __init__(self, *args, **kwargs):
         super(Curve, self).__init__(*args, **kwargs)
@@ -1653,6 +2794,7 @@ class Curve(Object):
 
 class Camera(Object):
     """Camera I/O Object subclass."""
+    __slots__ = ()
     _sample_class = alembic.AbcGeom.CameraSample
     def __init__(self, *args, **kwargs):
         super(Camera, self).__init__(*args, **kwargs)
@@ -1663,6 +2805,7 @@ class Camera(Object):
 
 class NuPatch(Object):
     """NuPath I/O Object subclass."""
+    __slots__ = ()
     _sample_class = alembic.AbcGeom.ONuPatchSchemaSample
     def __init__(self, *args, **kwargs):
         super(NuPatch, self).__init__(*args, **kwargs)
@@ -1670,12 +2813,14 @@ class NuPatch(Object):
 
 class Material(Object):
     """Material I/O Object subclass."""
+    __slots__ = ()
     def __init__(self, *args, **kwargs):
         super(Material, self).__init__(*args, **kwargs)
 
 
 class Light(Object):
     """Light I/O Object subclass."""
+    __slots__ = ()
     _sample_class = alembic.AbcGeom.CameraSample
     def __init__(self, *args, **kwargs):
         super(Light, self).__init__(*args, **kwargs)
@@ -1683,5 +2828,842 @@ class Light(Object):
 
 class Points(Object):
     """Points I/O Object subclass."""
+    __slots__ = ()
     def __init__(self, *args, **kwargs):
         super(Points, self).__init__(*args, **kwargs)
+
+
+def file_key(filepath):
+    """Returns a (size, mtime) tuple used to validate cached file data."""
+    stat = os.stat(filepath)
+    return (stat.st_size, stat.st_mtime)
+
+
+def _iprops_animated(iprops):
+    """Returns True if any property under a compound IProperty is not
+    constant. Stops at the first animated property.
+    """
+    stack = [iprops]
+    while stack:
+        compound = stack.pop()
+        for i in range(compound.getNumProperties()):
+            iprop = compound.getProperty(i)
+            if iprop.isCompound():
+                stack.append(iprop)
+            elif not iprop.isConstant():
+                return True
+    return False
+
+
+class ArchiveIndex(object):
+    """Flat index of an archive's object hierarchy, built once by walking
+    the archive and persisted as a sidecar file next to it. Holds the path,
+    type, parent, animated flag and first visibility value of every object,
+    plus the archive's root namespace, so hierarchy queries don't need to
+    open the archive. ::
+
+        >>> index = get_index("/shots/a/cache/char_cache_v001.abc")
+        >>> index.children("/")
+        ['/char:root']
+        >>> index.type("/char:root/char:body/char:bodyShape")
+        'PolyMesh'
+
+    Paths are Alembic full names, the hierarchy root is "/".
+    """
+
+    def __init__(self, filepath, key=None):
+        """
+        :param filepath: Path to the indexed Alembic archive.
+        :param key: (size, mtime) of the archive when it was indexed.
+        """
+        self.filepath = filepath
+        self.key = key
+        self.namespace = None
+        self.paths = []
+        self.types = []
+        self.parents = []
+        self.animated = []
+        self.visibility = []
+        self._positions = {}
+        self._children = None
+
+    def __repr__(self):
+        return '<ArchiveIndex "%s">' % self.filepath
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __contains__(self, path):
+        return path in self._positions
+
+    def add(self, path, type_name, parent=-1, animated=False, visibility=None):
+        """Adds an object entry and returns its position in the index.
+
+        :param path: Full path of the object.
+        :param type_name: cask class name of the object.
+        :param parent: Position of the parent entry, -1 for root objects.
+        :param animated: True if any of the object's properties are animated.
+        :param visibility: First value of the "visible" property, or None.
+        """
+        position = len(self.paths)
+        self.paths.append(path)
+        self.types.append(type_name)
+        self.parents.append(parent)
+        self.animated.append(animated)
+        self.visibility.append(visibility)
+        self._positions[path] = position
+        self._children = None
+        return position
+
+    def __position(self, path):
+        try:
+            return self._positions[path]
+        except KeyError:
+            raise KeyError("Object not in index: %s" % path)
+
+    def name(self, path):
+        """Returns the object name for a path."""
+        return path.rsplit("/", 1)[-1]
+
+    def type(self, path):
+        """Returns the cask class name of an object."""
+        return self.types[self.__position(path)]
+
+    def parent(self, path):
+        """Returns the parent path of an object, "/" for root objects."""
+        parent = self.parents[self.__position(path)]
+        return self.paths[parent] if parent >= 0 else "/"
+
+    def is_animated(self, path):
+        """Returns True if the object has animated properties."""
+        return self.animated[self.__position(path)]
+
+    def get_visibility(self, path):
+        """Returns the first visibility value of an object, or None if it
+        has no "visible" property.
+        """
+        return self.visibility[self.__position(path)]
+
+    def children(self, path="/"):
+        """Returns the paths of the direct children of an object."""
+        if self._children is None:
+            self._children = {}
+            for position, parent in enumerate(self.parents):
+                self._children.setdefault(parent, []).append(position)
+        parent = -1 if path == "/" else self.__position(path)
+        return [self.paths[p] for p in self._children.get(parent, [])]
+
+    def descendants(self, path="/"):
+        """Returns the paths of all objects below an object, depth first."""
+        results = []
+        stack = list(reversed(self.children(path)))
+        while stack:
+            child = stack.pop()
+            results.append(child)
+            stack.extend(reversed(self.children(child)))
+        return results
+
+    @classmethod
+    def build(cls, archive):
+        """Walks an archive and returns a new index for it.
+
+        :param archive: cask.Archive to index.
+        """
+        index = cls(archive.filepath, file_key(archive.filepath))
+        stack = [(archive.iobject.getTop(), -1)]
+        while stack:
+            iobject, parent = stack.pop()
+            children = []
+            for i in range(iobject.getNumChildren()):
+                child = iobject.getChild(i)
+                iprops = child.getProperties()
+                visibility = None
+                names = [h.getName() for h in iprops.propertyheaders]
+                if "visible" in names:
+                    visibility = int(iprops.getProperty("visible").getValue(0))
+                position = index.add(
+                    child.getFullName(),
+                    object_type(child.getMetaData()),
+                    parent,
+                    _iprops_animated(iprops),
+                    visibility
+                )
+                if parent == -1 and index.namespace is None \
+                        and ":" in child.getName():
+                    index.namespace = child.getName().split(":")[0]
+                children.append((child, position))
+            stack.extend(reversed(children))
+        return index
+
+    def sidecar(self):
+        """Returns the path of the sidecar file for this index."""
+        return self.filepath + INDEX_EXT
+
+    def save(self):
+        """Writes this index to its sidecar file. Returns False if the
+        sidecar could not be written, e.g. on read-only storage.
+        """
+        data = {
+            "version": INDEX_VERSION,
+            "key": list(self.key),
+            "namespace": self.namespace,
+            "paths": self.paths,
+            "types": self.types,
+            "parents": self.parents,
+            "animated": self.animated,
+            "visibility": self.visibility,
+        }
+        tmp_path = self.sidecar() + ".tmp"
+        try:
+            with open(tmp_path, "w") as fp:
+                json.dump(data, fp, separators=(",", ":"))
+            if os.path.exists(self.sidecar()):
+                os.remove(self.sidecar())
+            os.rename(tmp_path, self.sidecar())
+        except (IOError, OSError):
+            return False
+        return True
+
+    @classmethod
+    def load(cls, filepath, key=None):
+        """Reads the index sidecar of an archive. Returns None if there is
+        no sidecar, or if it is stale or unreadable.
+
+        :param filepath: Path to the Alembic archive.
+        :param key: Expected (size, mtime) of the archive.
+        """
+        try:
+            with open(filepath + INDEX_EXT) as fp:
+                data = json.load(fp)
+        except (IOError, OSError, ValueError):
+            return None
+        if data.get("version") != INDEX_VERSION:
+            return None
+        if key is not None and tuple(data.get("key", ())) != tuple(key):
+            return None
+        index = cls(filepath, tuple(data["key"]))
+        index.namespace = data["namespace"]
+        for position, path in enumerate(data["paths"]):
+            index.add(
+                str(path),
+                str(data["types"][position]),
+                data["parents"][position],
+                data["animated"][position],
+                data["visibility"][position]
+            )
+        return index
+
+
+# archive indices loaded in this session, by archive path
+_INDICES = {}
+
+
+def get_index(filepath, rebuild=False, save=True):
+    """Returns the ArchiveIndex for an archive file. The index is read from
+    the sidecar next to the file when the file's size and mtime still match,
+    otherwise it is rebuilt from the archive and saved.
+
+    :param filepath: Path to an Alembic archive.
+    :param rebuild: Ignore existing indices and rebuild from the archive.
+    :param save: Save a rebuilt index as the sidecar (default True). Tools
+        that only read a tree pass False so they don't write into it.
+    """
+    filepath = os.path.abspath(filepath)
+    key = file_key(filepath)
+    index = _INDICES.get(filepath)
+    if rebuild or index is None or index.key != key:
+        index = None if rebuild else ArchiveIndex.load(filepath, key)
+        if index is None:
+            with pinned_archive(filepath) as archive:
+                index = ArchiveIndex.build(archive)
+            if save:
+                index.save()
+        _INDICES[filepath] = index
+    return index
+
+
+# a box that contains nothing and overlaps nothing
+EMPTY_BOX = (float("inf"),) * 3 + (float("-inf"),) * 3
+
+# unit cube corners, for transforming boxes
+_BOX_CORNERS = [(i & 1, (i >> 1) & 1, (i >> 2) & 1) for i in range(8)]
+
+
+def _bounds_iproperty(iobject):
+    """Returns the .selfBnds property of an IObject's schema, its
+    .childBnds if it has none, or None.
+    """
+    iprops = iobject.getProperties()
+    for i in range(iprops.getNumProperties()):
+        schema = iprops.getProperty(i)
+        if not schema.isCompound():
+            continue
+        names = [h.getName() for h in schema.propertyheaders]
+        for name in (".selfBnds", ".childBnds"):
+            if name in names:
+                return schema.getProperty(name)
+    return None
+
+
+def _transform_boxes(boxes, matrices):
+    """Returns (frames, 6) boxes transformed by (frames, 4, 4) matrices,
+    as the boxes around their transformed corners.
+    """
+    empty = ~(boxes[:, :3] <= boxes[:, 3:]).all(axis=1)
+    lo, hi = boxes[:, numpy.newaxis, :3], boxes[:, numpy.newaxis, 3:]
+    corners = numpy.ones((len(boxes), 8, 4))
+    corners[:, :, :3] = numpy.where(
+        numpy.array(_BOX_CORNERS, dtype=bool)[numpy.newaxis], hi, lo)
+    corners[empty] = 0.0
+    corners = numpy.matmul(corners, matrices)[:, :, :3]
+    result = numpy.concatenate([corners.min(axis=1), corners.max(axis=1)],
+                               axis=1)
+    result[empty] = EMPTY_BOX
+    return result
+
+
+def frustum_planes(matrix):
+    """Returns the six (a, b, c, d) planes of a view frustum as a (6, 4)
+    NumPy array, from a world to clip space matrix in Imath's row vector
+    convention (clip = point * matrix). Points inside the frustum have
+    a * x + b * y + c * z + d >= 0 for every plane.
+
+    :param matrix: imath.M44d or (4, 4) array, e.g. world inverse * projection.
+    """
+    if not isinstance(matrix, numpy.ndarray):
+        matrix = imath_to_numpy(matrix, "float64", is_array=False)
+    matrix = numpy.asarray(matrix, dtype="float64").reshape(4, 4)
+    w = matrix[:, 3]
+    planes = numpy.array([
+        w + matrix[:, 0], w - matrix[:, 0],
+        w + matrix[:, 1], w - matrix[:, 1],
+        w + matrix[:, 2], w - matrix[:, 2],
+    ])
+    return planes / numpy.linalg.norm(planes[:, :3], axis=1)[:, numpy.newaxis]
+
+
+def _box_overlaps(lo, hi, box):
+    return lo[0] <= box[3] and hi[0] >= box[0] and \
+        lo[1] <= box[4] and hi[1] >= box[1] and \
+        lo[2] <= box[5] and hi[2] >= box[2]
+
+
+def _box_in_frustum(lo, hi, planes):
+    for plane in planes:
+        # distance of the corner furthest along the plane normal
+        distance = plane[3]
+        for axis in range(3):
+            if plane[axis] > 0:
+                distance += plane[axis] * hi[axis]
+            elif plane[axis] < 0:
+                distance += plane[axis] * lo[axis]
+        if distance < 0:
+            return False
+    return True
+
+
+class BoundsIndex(object):
+    """Bounding volume hierarchy over the bounds of every object in an
+    archive, read from the .selfBnds or .childBnds properties, for box and
+    frustum queries. Bounds are either one box per object covering a
+    frame range, or one box per object and frame. ::
+
+        >>> bounds = a.bounds_index(range(1001, 1101))
+        >>> bounds.query_box((-1, -1, -1), (1, 1, 1))
+        ['/char:root/char:body/char:bodyShape']
+        >>> bounds.query_frustum(cask.frustum_planes(view_projection))
+
+    Trees are built on the first query of each frame.
+    """
+
+    # maximum number of objects in a leaf node
+    LEAF_SIZE = 4
+
+    def __init__(self, paths, boxes, frames=None):
+        """
+        :param paths: Object paths.
+        :param boxes: (objects, 6) array of min and max corners, or
+                      (frames, objects, 6) for per frame bounds.
+        :param frames: Frame numbers of per frame bounds.
+        """
+        self.paths = paths
+        self.boxes = boxes
+        self.frames = list(frames) if frames is not None else None
+        self._positions = dict((frame, i) for i, frame in
+                               enumerate(self.frames or []))
+        self._trees = {}
+
+    def __repr__(self):
+        return "<BoundsIndex %d>" % len(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    @classmethod
+    def build(cls, iobject, frames, fps=24, world=True, union=True,
+              tables=None):
+        """Reads the bounds of every object below an IObject and returns a
+        new index.
+
+        :param iobject: Alembic IObject, usually the archive's top object.
+        :param frames: Sequence of frame numbers.
+        :param fps: Frames per second (default 24).
+        :param world: Transform bounds to world space (default True).
+        :param union: One box per object over all frames (default True).
+        :param tables: Dict of FrameTables to share, see frame_table.
+        """
+        if numpy is None:
+            raise ImportError("NumPy is required for bounds indices")
+        frames = list(frames)
+        if tables is None:
+            tables = {}
+        matrices = world_matrices(iobject, frames, fps, tables) \
+            if world else {}
+        paths = []
+        boxes = []
+        stack = [iobject]
+        while stack:
+            parent = stack.pop()
+            for i in range(parent.getNumChildren()):
+                child = parent.getChild(i)
+                stack.append(child)
+                iprop = _bounds_iproperty(child)
+                if iprop is None:
+                    continue
+                indices = frame_table(
+                    iprop.getTimeSampling(), iprop.getNumSamples(), tables
+                ).indices(frames, fps)
+                decoded = {}
+                frame_boxes = numpy.empty((len(frames), 6))
+                for f, index in enumerate(indices):
+                    if index not in decoded:
+                        decoded[index] = imath_to_numpy(
+                            iprop.getValue(index), "float64", is_array=False
+                        ).reshape(6)
+                    frame_boxes[f] = decoded[index]
+                path = child.getFullName()
+                if world and path in matrices:
+                    frame_boxes = _transform_boxes(frame_boxes, matrices[path])
+                paths.append(path)
+                boxes.append(frame_boxes)
+        boxes = numpy.array(boxes).reshape(len(paths), len(frames), 6)
+        if union:
+            boxes = numpy.concatenate([boxes[:, :, :3].min(axis=1),
+                                       boxes[:, :, 3:].max(axis=1)], axis=1)
+            return cls(paths, boxes)
+        return cls(paths, boxes.transpose(1, 0, 2), frames)
+
+    def __boxes(self, frame):
+        if self.frames is None:
+            return self.boxes
+        if frame is None:
+            raise ValueError("Per frame bounds need a frame to query")
+        if frame not in self._positions:
+            raise KeyError("Frame %s is not one of the %d frames in the "
+                           "bounds index" % (frame, len(self.frames)))
+        return self.boxes[self._positions[frame]]
+
+    def __tree(self, frame):
+        """Returns the (nodes, order, boxes) tree for a frame, building it
+        the first time. Nodes are (min, max, left, right, start, end), with
+        leaf objects at order[start:end].
+        """
+        key = frame if self.frames is not None else None
+        tree = self._trees.get(key)
+        if tree is not None:
+            return tree
+        boxes = self.__boxes(frame)
+        empty = ~(boxes[:, :3] <= boxes[:, 3:]).all(axis=1)
+        centers = numpy.where(empty[:, numpy.newaxis], 0.0, boxes)
+        centers = (centers[:, :3] + centers[:, 3:]) * 0.5
+        order = numpy.arange(len(boxes))
+        nodes = []
+
+        def build(start, end):
+            indices = order[start:end]
+            node = len(nodes)
+            nodes.append(None)
+            lo = tuple(boxes[indices, :3].min(axis=0))
+            hi = tuple(boxes[indices, 3:].max(axis=0))
+            if end - start <= self.LEAF_SIZE:
+                nodes[node] = (lo, hi, -1, -1, start, end)
+                return node
+            points = centers[indices]
+            axis = (points.max(axis=0) - points.min(axis=0)).argmax()
+            order[start:end] = indices[
+                numpy.argsort(points[:, axis], kind="mergesort")]
+            middle = (start + end) // 2
+            left = build(start, middle)
+            right = build(middle, end)
+            nodes[node] = (lo, hi, left, right, start, end)
+            return node
+
+        if len(boxes):
+            build(0, len(boxes))
+        tree = self._trees[key] = (nodes, order.tolist(), boxes.tolist())
+        return tree
+
+    def __query(self, test, frame):
+        nodes, order, boxes = self.__tree(frame)
+        hits = []
+        stack = [0] if nodes else []
+        while stack:
+            lo, hi, left, right, start, end = nodes[stack.pop()]
+            if not test(lo, hi):
+                continue
+            if left < 0:
+                for i in order[start:end]:
+                    box = boxes[i]
+                    if test(box[:3], box[3:]):
+                        hits.append(i)
+            else:
+                stack.append(right)
+                stack.append(left)
+        return [self.paths[i] for i in sorted(hits)]
+
+    def query_box(self, box_min, box_max, frame=None):
+        """Returns the paths of the objects whose bounds overlap a box.
+
+        :param box_min: (x, y, z) min corner.
+        :param box_max: (x, y, z) max corner.
+        :param frame: Frame to query, for per frame bounds. Raises KeyError
+            if the index has no bounds for it.
+        """
+        box = tuple(box_min) + tuple(box_max)
+        return self.__query(lambda lo, hi: _box_overlaps(lo, hi, box), frame)
+
+    def query_frustum(self, planes, frame=None):
+        """Returns the paths of the objects whose bounds are at least
+        partly inside a frustum.
+
+        :param planes: (a, b, c, d) planes, see frustum_planes.
+        :param frame: Frame to query, for per frame bounds.
+        """
+        planes = [tuple(plane) for plane in numpy.asarray(planes).tolist()]
+        return self.__query(lambda lo, hi: _box_in_frustum(lo, hi, planes),
+                            frame)
+
+
+class ArchivePool(object):
+    """LRU pool of open archives shared by everything in the process, keyed
+    by file path and validated against the file's size and mtime. Reading
+    the same file twice returns the same Archive, along with whatever part
+    of its hierarchy has already been expanded. ::
+
+        >>> a = open_archive("/shots/a/cache/char_cache_v001.abc")
+        >>> a is open_archive("/shots/a/cache/char_cache_v001.abc")
+        True
+
+    Archives that aren't in use are closed when they are evicted or
+    invalidated. Callers that hold on to an archive while they work pin it,
+    so it is only closed once the last of them is done with it. ::
+
+        >>> with pinned_archive("/shots/a/cache/char_cache_v001.abc") as a:
+        ...     a.frame_range()
+
+    Archives from get or open_archive aren't pinned. They are fine for a
+    quick look up but may be closed by the next get from another thread.
+    Pooled archives should never be closed by callers.
+    """
+
+    def __init__(self, max_open=POOL_MAX_OPEN):
+        """
+        :param max_open: Maximum number of archives kept open, at least
+            one so the archive just opened stays open.
+        """
+        self.max_open = max(int(max_open), 1)
+        self._archives = OrderedDict()
+        # pin counts by id of the archive
+        self._pins = {}
+        # pinned archives that left the pool, closed when they are unpinned
+        self._detached = {}
+        self._lock = threading.RLock()
+
+    def __repr__(self):
+        return '<ArchivePool %d/%d>' % (len(self), self.max_open)
+
+    def __len__(self):
+        return len(self._archives)
+
+    def __contains__(self, filepath):
+        return os.path.abspath(filepath) in self._archives
+
+    def __close(self, archive):
+        if self._pins.get(id(archive)):
+            self._detached[id(archive)] = archive
+        else:
+            archive.close()
+
+    def __release(self, filepath):
+        key, archive = self._archives.pop(filepath)
+        self.__close(archive)
+
+    def __evict(self):
+        """Closes the least recently used archives that aren't pinned until
+        at most max_open are left. The most recently used one always stays,
+        and the pool grows past max_open while more archives are pinned.
+        """
+        excess = len(self._archives) - self.max_open
+        for filepath in list(self._archives)[:-1]:
+            if excess <= 0:
+                break
+            if not self._pins.get(id(self._archives[filepath][1])):
+                self.__release(filepath)
+                excess -= 1
+
+    def get(self, filepath):
+        """Returns the pooled Archive for a file, opening it if it is not in
+        the pool or has changed on disk since it was opened.
+
+        :param filepath: Path to an Alembic archive.
+        """
+        filepath = os.path.abspath(filepath)
+        key = file_key(filepath)
+        with self._lock:
+            entry = self._archives.pop(filepath, None)
+            if entry is not None and entry[0] != key:
+                self.__close(entry[1])
+                entry = None
+            if entry is None:
+                entry = (key, Archive(filepath))
+            self._archives[filepath] = entry
+            self.__evict()
+            return entry[1]
+
+    def pin(self, filepath):
+        """Returns the pooled Archive for a file, see get, and keeps it open
+        until it is passed to unpin as many times as it was pinned.
+
+        :param filepath: Path to an Alembic archive.
+        """
+        with self._lock:
+            archive = self.get(filepath)
+            self._pins[id(archive)] = self._pins.get(id(archive), 0) + 1
+            return archive
+
+    def unpin(self, archive):
+        """Releases an archive returned by pin, closing it if it left the
+        pool while it was pinned.
+
+        :param archive: Archive returned by pin.
+        """
+        with self._lock:
+            count = self._pins.pop(id(archive)) - 1
+            if count:
+                self._pins[id(archive)] = count
+            elif self._detached.pop(id(archive), None) is not None:
+                archive.close()
+            else:
+                self.__evict()
+
+    @contextlib.contextmanager
+    def pinned(self, filepath):
+        """Context that pins the pooled Archive for a file, see pin.
+
+        :param filepath: Path to an Alembic archive.
+        """
+        archive = self.pin(filepath)
+        try:
+            yield archive
+        finally:
+            self.unpin(archive)
+
+    def invalidate(self, filepath=None):
+        """Removes an archive from the pool, or all of them, closing them
+        once they aren't pinned.
+
+        :param filepath: Path to an Alembic archive, None for all.
+        """
+        with self._lock:
+            if filepath is None:
+                filepaths = list(self._archives)
+            else:
+                filepaths = [os.path.abspath(filepath)]
+            for path in filepaths:
+                if path in self._archives:
+                    self.__release(path)
+
+    def set_max_open(self, max_open):
+        """Sets the maximum number of open archives, closing the least
+        recently used ones if needed. Values below one are raised to one.
+        """
+        with self._lock:
+            self.max_open = max(int(max_open), 1)
+            self.__evict()
+
+
+# archives shared by the whole process
+POOL = ArchivePool()
+
+
+def open_archive(filepath):
+    """Returns a shared, pooled Archive for a file, see ArchivePool."""
+    return POOL.get(filepath)
+
+
+def pinned_archive(filepath):
+    """Context that keeps a pooled Archive open while it is used, see
+    ArchivePool.pinned.
+    """
+    return POOL.pinned(filepath)
+
+
+def invalidate(filepath=None):
+    """Closes a pooled archive, or all of them, see ArchivePool."""
+    POOL.invalidate(filepath)
+
+
+class Writer(object):
+    """Streaming archive writer. The hierarchy is declared up front, then
+    samples are written one frame at a time. Each sample is handed to
+    Alembic as soon as it is set and nothing is kept in memory, so peak
+    memory stays flat however long the shot is. ::
+
+        >>> with cask.Writer("/tmp/out.abc", start_frame=1001) as w:
+        ...     w.add_object("/cube", "Xform")
+        ...     w.add_object("/cube/cubeShape", "PolyMesh")
+        ...     w.add_property("/cube/cubeShape", ".arbGeomParams/id", 7)
+        ...     for frame in range(1001, 1101):
+        ...         w.write_frame(
+        ...             samples={"/cube": xform_sample(frame),
+        ...                      "/cube/cubeShape": mesh_sample(frame)},
+        ...             values={("/cube/cubeShape", ".arbGeomParams/id"): 7}
+        ...         )
+
+    Animated objects and properties need a sample on every frame, objects
+    and properties given a single sample on the first frame are static.
+    """
+
+    def __init__(self, filepath, fps=24, start_frame=1, step=1,
+                 userDescription="", asOgawa=True):
+        """
+        :param filepath: Path of the archive file to write.
+        :param fps: Frames per second (default 24).
+        :param start_frame: First frame written.
+        :param step: Frame step between samples (default 1).
+        :param userDescription: Description stored in the archive info.
+        :param asOgawa: Write an Ogawa archive (default True).
+        """
+        self.filepath = filepath
+        self.fps = fps
+        self.start_frame = start_frame
+        self.step = step
+        self.num_frames = 0
+        self._oarchive = create_oarchive(filepath, None, userDescription,
+                                         asOgawa)
+        self.time_sampling_id = self._oarchive.addTimeSampling(
+            alembic.AbcCoreAbstract.TimeSampling(
+                step / float(fps), start_frame / float(fps)
+            )
+        )
+        self._oobjects = {"/": self._oarchive.getTop()}
+        self._types = {"/": "Top"}
+        self._oprops = {}
+
+    def __repr__(self):
+        return '<%s "%s">' % (self.__class__.__name__, self.filepath)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __oobject(self, path):
+        if self._oarchive is None:
+            raise ValueError("Writer is closed: %s" % self.filepath)
+        try:
+            return self._oobjects[path]
+        except KeyError:
+            raise KeyError("Object not declared: %s" % path)
+
+    def frame(self):
+        """Returns the frame the next write_frame call writes."""
+        return self.start_frame + self.num_frames * self.step
+
+    def add_object(self, path, type_name="Xform", metadata=None):
+        """Declares an object. Its parent must already be declared.
+
+        :param path: Full path of the object, e.g. "/cube/cubeShape".
+        :param type_name: cask class name, e.g. "Xform" or "PolyMesh".
+        :param metadata: Optional dict of metadata.
+        """
+        parent, name = path.rsplit("/", 1)
+        klass = OOBJECTS.get(type_name)
+        if klass is None:
+            raise TypeError("OObject class not found for: %s" % type_name)
+        meta = alembic.AbcCoreAbstract.MetaData()
+        for k, v in (metadata or {}).items():
+            meta.set(k, v)
+        self._oobjects[path] = klass(
+            self.__oobject(parent or "/"), name, meta, self.time_sampling_id
+        )
+        self._types[path] = type_name
+
+    def add_property(self, path, name, value, array=None, metadata=None):
+        """Declares a property on an object. The property's data type is
+        taken from an example value, as with Property.set_value.
+
+        :param path: Full path of the object.
+        :param name: Property name, prefix with ".arbGeomParams/" or
+            ".userProperties/" to add to the schema's compound properties.
+        :param value: Example value.
+        :param array: Write as an array property (default from value).
+        :param metadata: Optional dict of metadata.
+        """
+        oobject = self.__oobject(path)
+        compound, _, prop_name = name.rpartition("/")
+        if compound == ".arbGeomParams":
+            parent = oobject.getSchema().getArbGeomParams()
+        elif compound == ".userProperties":
+            parent = oobject.getSchema().getUserProperties()
+        elif not compound:
+            parent = oobject.getProperties()
+        else:
+            raise ValueError("Unsupported compound property: %s" % compound)
+        prop = Property(name=prop_name)
+        prop.set_value(value)
+        if array is None:
+            array = prop.is_array()
+        klass = alembic.Abc.OArrayProperty if array \
+            else alembic.Abc.OScalarProperty
+        meta = alembic.AbcCoreAbstract.MetaData()
+        for k, v in (metadata or {}).items():
+            meta.set(k, v)
+        self._oprops[(path, name)] = klass(
+            parent, prop_name, prop.datatype, meta, self.time_sampling_id
+        )
+
+    def write_frame(self, samples=None, values=None):
+        """Writes one frame and flushes it to the archive.
+
+        :param samples: Dict of object paths to Alembic schema samples.
+        :param values: Dict of (object path, property name) to values.
+        """
+        start = time.time() if _ACTIVE_STATS else None
+        for path, sample in (samples or {}).items():
+            schema = self.__oobject(path).getSchema()
+            if self._types[path] == "Light" \
+               and type(sample) == alembic.AbcGeom.CameraSample:
+                schema.setCameraSample(sample)
+            else:
+                schema.set(sample)
+        for key, value in (values or {}).items():
+            try:
+                oprop = self._oprops[key]
+            except KeyError:
+                raise KeyError("Property not declared: %s %s" % key)
+            oprop.setValue(python_to_imath(value))
+        self.num_frames += 1
+        if start is not None:
+            _record("samples.write", len(samples or ()) + len(values or ()),
+                    start)
+
+    def close(self):
+        """Releases all Alembic objects, which finishes writing the file."""
+        self._oprops.clear()
+        self._oobjects.clear()
+        self._oarchive = None
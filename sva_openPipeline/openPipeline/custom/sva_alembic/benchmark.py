@@ -0,0 +1,378 @@
+"""
+Benchmarks for the cask read and write paths. Builds a synthetic archive of
+a configurable size, times the common cask operations on it and writes the
+results to a JSON file, optionally comparing them against a stored baseline
+so changes to cask.py can be checked for regressions. Besides timings, it
+measures how much the process's resident memory grows when the whole
+hierarchy and every property of the archive are expanded.
+
+From the custom scripts directory:
+
+    python -m sva_alembic.benchmark -n 500 -d 4 -f 100 -p 2000 -o results.json
+    python -m sva_alembic.benchmark -n 500 -d 4 -f 100 -p 2000 -b results.json
+
+The memory benchmark only needs cask.Archive, so it can also be run with an
+older cask.py on an archive built by a newer one, by copying this file into
+a checkout of the older scripts directory:
+
+    python -m sva_alembic.benchmark -n 20000 -d 4 -f 1 -p 30 -k /tmp/big.abc -s expand_memory
+    python -m sva_alembic.benchmark -a /tmp/big.abc -s expand_memory
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import alembic
+import imath
+
+import cask
+
+# default archive size
+OBJECTS = 200
+DEPTH = 4
+FRAMES = 48
+POINTS = 1000
+
+# a benchmark is reported as a regression when it is this much slower than the baseline
+THRESHOLD = 0.1
+
+# benchmarks in the order they run
+BENCHMARKS = ['expand_memory', 'open', 'traverse', 'find', 'values', 'get_value', 'global_matrix', 'write_to_file']
+
+# benchmarks measured in megabytes instead of seconds
+MEMORY_BENCHMARKS = ['expand_memory']
+
+
+def _positions(num_points, frame):
+    """
+        returns a V3fArray of points moved along y with the frame
+    """
+    points = imath.V3fArray(num_points)
+    for i in range(num_points):
+        points[i] = imath.V3f(i % 100, frame * 0.1, i // 100)
+    return points
+
+
+def _int_array(values):
+    array = imath.IntArray(len(values))
+    for i, value in enumerate(values):
+        array[i] = value
+    return array
+
+
+def build_archive(path, objects=OBJECTS, depth=DEPTH, frames=FRAMES, points=POINTS):
+    """
+        writes a synthetic archive: chains of depth animated transforms, each
+        ending in a deforming mesh, until there are objects transforms and meshes
+
+        args:
+        path = alembic file to write
+        objects = number of objects
+        depth = number of transforms above each mesh
+        frames = number of frames
+        points = number of points per mesh
+
+        return:
+        meshes = the full paths of the meshes
+    """
+    num_triangles = points // 3
+    counts = _int_array([3] * num_triangles)
+    indices = _int_array(range(num_triangles * 3))
+    chains = max(objects // (depth + 1), 1)
+
+    meshes = []
+    with cask.Writer(path, start_frame=1) as writer:
+        xforms = []
+        for chain in range(chains):
+            parent = ''
+            for level in range(depth):
+                parent = '{}/grp{}_{}'.format(parent, chain, level)
+                writer.add_object(parent, 'Xform')
+                xforms.append(parent)
+            mesh = '{}/mesh{}Shape'.format(parent, chain)
+            writer.add_object(mesh, 'PolyMesh')
+            meshes.append(mesh)
+
+        for frame in range(1, frames + 1):
+            samples = {}
+            for xform in xforms:
+                sample = alembic.AbcGeom.XformSample()
+                sample.setTranslation(imath.V3d(frame * 0.01, 0, 0))
+                samples[xform] = sample
+            positions = _positions(points, frame)
+            for mesh in meshes:
+                samples[mesh] = alembic.AbcGeom.OPolyMeshSchemaSample(positions, indices, counts)
+            writer.write_frame(samples)
+    return meshes
+
+
+def _walk(obj):
+    count = 0
+    stack = [obj]
+    while stack:
+        children = stack.pop().children.values()
+        count += len(children)
+        stack.extend(children)
+    return count
+
+
+def _rss():
+    """
+        returns the resident memory of the process in bytes
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError):
+        pass
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss
+    except ImportError:
+        # peak memory in kilobytes, good enough when nothing was freed yet
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _expand(obj):
+    """
+        expands every object and property below obj
+    """
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        props = list(obj.properties.values())
+        while props:
+            prop = props.pop()
+            if prop.is_compound():
+                props.extend(prop.properties.values())
+        stack.extend(obj.children.values())
+
+
+def _fresh(path):
+    """
+        returns a new archive for path with nothing cached
+    """
+    cask.invalidate()
+    cask.SAMPLE_CACHE.clear()
+    return cask.Archive(path)
+
+
+def run(path, meshes, repeat=3, tmp_dir=None, names=None):
+    """
+        times every benchmark on an archive, keeping the fastest of repeat runs
+
+        args:
+        path = alembic file built by build_archive
+        meshes = mesh paths in the archive
+        repeat = number of runs of each benchmark
+        tmp_dir = directory for files written by the benchmarks
+        names = benchmarks to run, defaults to all of them
+
+        return:
+        results = dict of benchmark name to seconds, or megabytes for
+                  MEMORY_BENCHMARKS
+    """
+    tmp_dir = tmp_dir or tempfile.gettempdir()
+    out_path = os.path.join(tmp_dir, 'cask_benchmark_out.abc')
+
+    def bench_expand_memory():
+        # close() rather than with, older versions of cask have no __enter__
+        archive = cask.Archive(path)
+        try:
+            gc.collect()
+            start = _rss()
+            _expand(archive.top)
+            gc.collect()
+            return (_rss() - start) / (1024.0 * 1024.0)
+        finally:
+            archive.close()
+
+    def bench_open():
+        cask.invalidate()
+        cask.SAMPLE_CACHE.clear()
+        start = time.time()
+        archive = cask.Archive(path)
+        archive.top
+        return time.time() - start
+
+    def bench_traverse():
+        archive = _fresh(path)
+        start = time.time()
+        _walk(archive.top)
+        return time.time() - start
+
+    def bench_find():
+        archive = _fresh(path)
+        start = time.time()
+        cask.find(archive.top, name='mesh.*Shape')
+        return time.time() - start
+
+    def bench_values():
+        archive = _fresh(path)
+        props = [archive.top.children[mesh[1:]].properties['.geom/P'] for mesh in meshes]
+        start = time.time()
+        for prop in props:
+            list(prop.values)
+        return time.time() - start
+
+    def bench_get_value():
+        archive = _fresh(path)
+        start_frame, end_frame = archive.frame_range()
+        props = [archive.top.children[mesh[1:]].properties['.geom/P'] for mesh in meshes]
+        start = time.time()
+        for prop in props:
+            for frame in range(int(start_frame), int(end_frame) + 1):
+                prop.get_value(frame=frame)
+        return time.time() - start
+
+    def bench_global_matrix():
+        archive = _fresh(path)
+        objs = [archive.top.children[mesh[1:]] for mesh in meshes]
+        num_samples = len(objs[0].parent.samples) if objs else 0
+        start = time.time()
+        for obj in objs:
+            for index in range(num_samples):
+                obj.global_matrix(index)
+        return time.time() - start
+
+    def bench_write_to_file():
+        archive = _fresh(path)
+        start = time.time()
+        archive.write_to_file(out_path)
+        elapsed = time.time() - start
+        archive = None
+        os.remove(out_path)
+        return elapsed
+
+    benchmarks = {
+        'expand_memory': bench_expand_memory,
+        'open': bench_open,
+        'traverse': bench_traverse,
+        'find': bench_find,
+        'values': bench_values,
+        'get_value': bench_get_value,
+        'global_matrix': bench_global_matrix,
+        'write_to_file': bench_write_to_file,
+    }
+    results = {}
+    for name in BENCHMARKS:
+        if names and name not in names:
+            continue
+        # memory is measured once, before the allocator holds on to freed blocks
+        runs = 1 if name in MEMORY_BENCHMARKS else repeat
+        results[name] = min(benchmarks[name]() for i in range(runs))
+    cask.invalidate()
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """
+        compares results against baseline results
+
+        args:
+        results = dict of benchmark name to seconds
+        baseline = dict of benchmark name to seconds
+        threshold = relative slowdown reported as a regression
+
+        return:
+        rows = a list of (name, baseline seconds, seconds, ratio, regressed) for
+               the benchmarks in both
+    """
+    rows = []
+    for name in BENCHMARKS:
+        if name in results and name in baseline and baseline[name]:
+            ratio = results[name] / baseline[name]
+            rows.append((name, baseline[name], results[name], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def format_results(results, rows=None):
+    """
+        returns the results, and their comparison if given, as text
+    """
+    def unit(name):
+        return 'MB' if name in MEMORY_BENCHMARKS else 's'
+
+    if not rows:
+        return '\n'.join('{:<15}{:>10.4f}{:<2}'.format(name, results[name], unit(name))
+                         for name in BENCHMARKS if name in results)
+    lines = ['{:<15}{:>12}{:>12}{:>8}'.format('benchmark', 'baseline', 'current', 'ratio')]
+    for name, base, current, ratio, regressed in rows:
+        lines.append('{:<15}{:>10.4f}{:<2}{:>10.4f}{:<2}{:>7.2f}x{}'.format(
+            name, base, unit(name), current, unit(name), ratio, '  REGRESSION' if regressed else ''))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark cask read and write paths.')
+    parser.add_argument('-n', '--objects', type=int, default=OBJECTS, help='number of objects')
+    parser.add_argument('-d', '--depth', type=int, default=DEPTH, help='transforms above each mesh')
+    parser.add_argument('-f', '--frames', type=int, default=FRAMES, help='number of frames')
+    parser.add_argument('-p', '--points', type=int, default=POINTS, help='points per mesh')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='runs per benchmark, the fastest is kept')
+    parser.add_argument('-o', '--output', default=None, help='JSON file to write the results to')
+    parser.add_argument('-b', '--baseline', default=None, help='JSON results to compare against')
+    parser.add_argument('-t', '--threshold', type=float, default=THRESHOLD,
+                        help='relative slowdown reported as a regression')
+    parser.add_argument('-a', '--archive', default=None, help='benchmark an existing archive instead of building one')
+    parser.add_argument('-k', '--keep', default=None, help='also copy the built archive to this path')
+    parser.add_argument('-s', '--select', action='append', choices=BENCHMARKS,
+                        help='benchmark to run, repeatable, defaults to all')
+    args = parser.parse_args(argv)
+
+    config = {
+        'objects': args.objects,
+        'depth': args.depth,
+        'frames': args.frames,
+        'points': args.points,
+        'repeat': args.repeat,
+    }
+    if args.archive:
+        config = {'archive': os.path.abspath(args.archive), 'repeat': args.repeat}
+    tmp_dir = tempfile.mkdtemp(prefix='cask_benchmark')
+    try:
+        if args.archive:
+            path = args.archive
+            archive = cask.Archive(path)
+            try:
+                meshes = [obj.path() for obj in cask.find(archive.top, types=['PolyMesh'])]
+            finally:
+                archive.close()
+        else:
+            path = os.path.join(tmp_dir, 'cask_benchmark.abc')
+            meshes = build_archive(path, args.objects, args.depth, args.frames, args.points)
+            if args.keep:
+                shutil.copyfile(path, args.keep)
+        results = run(path, meshes, args.repeat, tmp_dir, args.select)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    rows = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != config:
+            sys.stderr.write('Warning: baseline was run with {}\n'.format(baseline.get('config')))
+        rows = compare(results, baseline['results'], args.threshold)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'config': config,
+                'cask_version': cask.__version__,
+                'python': sys.version.split()[0],
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+
+    sys.stdout.write(format_results(results, rows) + '\n')
+    return 1 if rows and any(row[4] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
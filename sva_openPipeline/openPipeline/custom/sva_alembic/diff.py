@@ -0,0 +1,320 @@
+"""
+Compares two Alembic caches, usually two versions of the same cache, and
+reports what actually changed between them: added and removed objects,
+topology changes and the frames where points or transforms moved by more
+than a tolerance.
+
+Every property sample is reduced to an md5 digest first, so properties
+whose samples all match are skipped without comparing values, and two
+byte-identical files are reported as identical without being opened.
+
+From the custom scripts directory:
+
+    python -m sva_alembic.diff char_cache_v001.abc char_cache_v002.abc -t 0.001
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from collections import OrderedDict
+
+import cask
+
+# default tolerance for point and matrix deltas, in scene units
+TOLERANCE = 1e-5
+
+# size of the chunks read when hashing whole files
+CHUNK_SIZE = 1024 * 1024
+
+# number of files whose sample digests are kept, least recently used
+# files are dropped first
+HASH_CACHE_FILES = 8
+
+# per-sample digests by file, each a (file key, dict of (object path,
+# property path) to digests), dropped as a whole when the file changes
+_HASHES = OrderedDict()
+
+
+def file_hash(path):
+    """
+        returns the md5 hex digest of a file's contents
+    """
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        chunk = f.read(CHUNK_SIZE)
+        while chunk:
+            md5.update(chunk)
+            chunk = f.read(CHUNK_SIZE)
+    return md5.hexdigest()
+
+
+def same_file(path_a, path_b):
+    """
+        returns True if both files have the same contents
+    """
+    if os.path.getsize(path_a) != os.path.getsize(path_b):
+        return False
+    return file_hash(path_a) == file_hash(path_b)
+
+
+def sample_digest(prop, value):
+    """
+        returns the md5 digest of one decoded property sample
+
+        args:
+        prop = cask.Property the value was read from
+        value = the decoded sample value
+    """
+    return hashlib.md5(cask.sample_bytes(prop, value)).digest()
+
+
+def sample_hashes(filepath, obj_path, prop_path, prop):
+    """
+        returns a list with the digest of every sample of a property, a
+        single digest for constant properties. Digests of the last
+        HASH_CACHE_FILES files are cached until the file changes.
+
+        args:
+        filepath = path of the archive the property belongs to
+        obj_path = full path of the property's object
+        prop_path = path of the property below its object, e.g. .geom/P
+        prop = cask.Property to hash
+    """
+    file_key = cask.file_key(filepath)
+    cached = _HASHES.pop(filepath, None)
+    if cached is None or cached[0] != file_key:
+        cached = (file_key, {})
+    _HASHES[filepath] = cached
+    while len(_HASHES) > HASH_CACHE_FILES:
+        _HASHES.popitem(last=False)
+    digests = cached[1]
+    key = (obj_path, prop_path)
+    if key in digests:
+        return digests[key]
+
+    if prop.iobject.isConstant():
+        hashes = [sample_digest(prop, prop.iobject.getValue(0))] if prop.iobject.getNumSamples() else []
+    else:
+        hashes = [sample_digest(prop, value) for value in prop.values.stream()]
+    digests[key] = hashes
+    return hashes
+
+
+def same_samples(hashes_a, hashes_b):
+    """
+        returns True if two lists of sample digests describe the same samples,
+        a single digest matching any number of equal ones
+    """
+    if len(hashes_a) == 1 or len(hashes_b) == 1:
+        return set(hashes_a) == set(hashes_b)
+    return hashes_a == hashes_b
+
+
+def leaf_properties(obj):
+    """
+        returns a dict of property path to cask.Property for every
+        non-compound property of an object
+    """
+    props = {}
+    stack = [(obj.properties, '')]
+    while stack:
+        container, prefix = stack.pop()
+        for name, prop in container.items():
+            path = prefix + name
+            if prop.is_compound():
+                stack.append((prop.properties, path + '/'))
+            else:
+                props[path] = prop
+    return props
+
+
+def _sample_index(archive, prop, frame):
+    table = archive.frame_table(prop.iobject.getTimeSampling(), prop.iobject.getNumSamples())
+    return table.frame_index(frame, archive.fps)
+
+
+def point_deltas(archive_a, archive_b, prop_a, prop_b, hashes_a, hashes_b, frames, tolerance):
+    """
+        returns a list of (frame, max delta) for the frames where any point
+        moved by more than the tolerance, or None if the point count changes
+
+        args:
+        archive_a, archive_b = the archives of both properties
+        prop_a, prop_b = the .geom/P properties to compare
+        hashes_a, hashes_b = their sample digests, see sample_hashes
+        frames = frames to compare
+        tolerance = largest point delta that still counts as unchanged
+    """
+    deltas = []
+    for frame in frames:
+        index_a = _sample_index(archive_a, prop_a, frame)
+        index_b = _sample_index(archive_b, prop_b, frame)
+        if hashes_a and hashes_b and \
+                hashes_a[min(index_a, len(hashes_a) - 1)] == hashes_b[min(index_b, len(hashes_b) - 1)]:
+            continue
+        points_a = prop_a.as_numpy(index=index_a)
+        points_b = prop_b.as_numpy(index=index_b)
+        if points_a.shape != points_b.shape:
+            return None
+        delta = float(abs(points_a - points_b).max()) if points_a.size else 0.0
+        if delta > tolerance:
+            deltas.append((frame, delta))
+    return deltas
+
+
+def transform_deltas(matrices_a, matrices_b, frames, tolerance):
+    """
+        returns a list of (frame, max delta) for the frames where a world
+        matrix changed by more than the tolerance
+
+        args:
+        matrices_a, matrices_b = (frames, 4, 4) world matrices to compare
+        frames = the frames the matrices were evaluated at
+        tolerance = largest matrix element delta that still counts as unchanged
+    """
+    delta = abs(matrices_a - matrices_b).max(axis=(1, 2))
+    return [(frames[i], float(delta[i])) for i in (delta > tolerance).nonzero()[0]]
+
+
+def diff(path_a, path_b, tolerance=TOLERANCE, frames=None):
+    """
+        compares two alembic files
+
+        args:
+        path_a = path to the old alembic file
+        path_b = path to the new alembic file
+        tolerance = largest point or matrix delta that still counts as unchanged
+        frames = frames to compare, defaults to the union of both frame ranges
+
+        return:
+        result = a dict with
+            identical = True if nothing changed
+            added = paths of objects only in path_b
+            removed = paths of objects only in path_a
+            topology = paths of objects whose type, face lists or point counts changed
+            points = dict of object path to a list of (frame, max point delta)
+            transforms = dict of object path to a list of (frame, max world matrix delta)
+            properties = dict of object path to paths of other changed properties
+    """
+    result = {
+        'identical': True,
+        'added': [],
+        'removed': [],
+        'topology': [],
+        'points': {},
+        'transforms': {},
+        'properties': {},
+    }
+    path_a = os.path.abspath(path_a)
+    path_b = os.path.abspath(path_b)
+    if same_file(path_a, path_b):
+        return result
+
+    index_a = cask.get_index(path_a)
+    index_b = cask.get_index(path_b)
+    paths_a = set(index_a)
+    paths_b = set(index_b)
+    result['added'] = sorted(paths_b - paths_a)
+    result['removed'] = sorted(paths_a - paths_b)
+
+    with cask.pinned_archive(path_a) as archive_a, cask.pinned_archive(path_b) as archive_b:
+        if frames is None:
+            start = min(archive_a.start_frame(), archive_b.start_frame())
+            end = max(archive_a.end_frame(), archive_b.end_frame())
+            frames = range(int(start), int(end) + 1)
+        frames = list(frames)
+
+        xforms = []
+        for path in index_a.descendants():
+            if path not in paths_b:
+                continue
+            if index_a.type(path) != index_b.type(path):
+                result['topology'].append(path)
+                continue
+            props_a = leaf_properties(archive_a.top.children[path[1:]])
+            props_b = leaf_properties(archive_b.top.children[path[1:]])
+            changed = []
+            for prop_path in sorted(set(props_a) | set(props_b)):
+                if prop_path not in props_a or prop_path not in props_b:
+                    changed.append(prop_path)
+                    continue
+                hashes_a = sample_hashes(path_a, path, prop_path, props_a[prop_path])
+                hashes_b = sample_hashes(path_b, path, prop_path, props_b[prop_path])
+                if same_samples(hashes_a, hashes_b):
+                    continue
+                if prop_path in cask.TOPOLOGY_PROPERTIES:
+                    if path not in result['topology']:
+                        result['topology'].append(path)
+                elif prop_path == '.geom/P':
+                    deltas = point_deltas(archive_a, archive_b, props_a[prop_path], props_b[prop_path],
+                                          hashes_a, hashes_b, frames, tolerance)
+                    if deltas is None:
+                        if path not in result['topology']:
+                            result['topology'].append(path)
+                    elif deltas:
+                        result['points'][path] = deltas
+                elif prop_path.startswith('.xform/'):
+                    if path not in xforms:
+                        xforms.append(path)
+                else:
+                    changed.append(prop_path)
+            if changed:
+                result['properties'][path] = changed
+
+        # world matrices are only evaluated when some transform samples changed
+        if xforms:
+            matrices_a = archive_a.world_matrices(frames)
+            matrices_b = archive_b.world_matrices(frames)
+            for path in index_a.descendants():
+                if path in paths_b and index_a.type(path) == 'Xform':
+                    deltas = transform_deltas(matrices_a[path], matrices_b[path], frames, tolerance)
+                    if deltas:
+                        result['transforms'][path] = deltas
+
+    result['identical'] = not any(result[key] for key in
+                                  ('added', 'removed', 'topology', 'points', 'transforms', 'properties'))
+    return result
+
+
+def format_result(result):
+    """
+        returns a diff result as readable text, one line per change
+    """
+    if result['identical']:
+        return 'No changes'
+    lines = []
+    for path in result['added']:
+        lines.append('+ {}'.format(path))
+    for path in result['removed']:
+        lines.append('- {}'.format(path))
+    for path in result['topology']:
+        lines.append('topology   {}'.format(path))
+    for key in ('points', 'transforms'):
+        for path, deltas in sorted(result[key].items()):
+            lines.append('{:<10} {}  {} frames ({}-{}), max delta {:.6g}'.format(
+                key, path, len(deltas), deltas[0][0], deltas[-1][0], max(d for f, d in deltas)))
+    for path, props in sorted(result['properties'].items()):
+        lines.append('properties {}  {}'.format(path, ', '.join(props)))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two Alembic caches.')
+    parser.add_argument('old', help='old .abc file')
+    parser.add_argument('new', help='new .abc file')
+    parser.add_argument('-t', '--tolerance', type=float, default=TOLERANCE,
+                        help='largest point or matrix delta that still counts as unchanged')
+    parser.add_argument('--json', action='store_true', help='write JSON instead of text')
+    args = parser.parse_args(argv)
+
+    result = diff(args.old, args.new, tolerance=args.tolerance)
+    if args.json:
+        sys.stdout.write(json.dumps(result, indent=2, sort_keys=True) + '\n')
+    else:
+        sys.stdout.write(format_result(result) + '\n')
+    return 0 if result['identical'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
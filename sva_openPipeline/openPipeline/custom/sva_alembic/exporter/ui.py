@@ -203,8 +203,8 @@ class Show():
         for bake_set in self.bake_sets:
             if bake_set.is_enabled():
                 frame_range = self.get_range(bake_set)
-                job = utils.get_abc_job(bake_set, frame_range)
-                utils.export_abc(job)
+                job, cache_file = utils.get_abc_job(bake_set, frame_range)
+                utils.export_abc(job, cache_file)
 
         cmds.confirmDialog(title='Cached!', message='Caching complete!', button=[
             'Awesome!'])
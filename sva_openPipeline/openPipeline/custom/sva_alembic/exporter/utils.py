@@ -5,6 +5,7 @@ import os
 import traceback
 
 import sva_alembic.utils
+import sva_tools.blobstore
 import bakeset
 reload(bakeset)
 
@@ -43,10 +44,13 @@ def get_cache_file(namespace, cache_path):
         if file.endswith('.abc'):
             cache_files.append(file)
 
-    # build filename
-    version = str(len(cache_files)+1).zfill(3)
-    filename = (namespace + '_cache_v' + version + ".abc")
-    cache_file = os.path.join(cache_path, filename)
+    # build filename, skipping versions that already exist, which may be
+    # links to stored caches and must never be exported over
+    version = len(cache_files) + 1
+    cache_file = os.path.join(cache_path, namespace + '_cache_v' + str(version).zfill(3) + ".abc")
+    while os.path.exists(cache_file):
+        version += 1
+        cache_file = os.path.join(cache_path, namespace + '_cache_v' + str(version).zfill(3) + ".abc")
 
     return cache_file
 
@@ -74,10 +78,30 @@ def get_abc_job(bake_set, frame_range):
 
     job = ("-frameRange " + str(frame_range[0]) + " " + str(frame_range[1]) + " -step " + str(
         step) + " -wuvs -uvWrite -worldSpace -writeVisibility -dataFormat ogawa " + root_cmd + " -file \\\"" + cache_file.replace('\\', '/') + "\\\"")
-    return job
+    return job, cache_file
 
 
-def export_abc(job):
+def get_store_dir():
+    """
+        returns the blob store directory shared by all of the shot's caches
+    """
+    # cache/alembic/<scene> -> cache/.store, outside of the dirs the importer lists
+    cache_dir = sva_alembic.utils.get_cache_dir()
+    return os.path.join(os.path.dirname(os.path.dirname(cache_dir)), sva_tools.blobstore.STORE_DIR)
+
+
+def export_abc(job, cache_file=None):
+    """
+        runs an alembic export job
+
+        args:
+        job = AbcExport job string, see get_abc_job
+        cache_file = file written by the job, linked to the blob store when given
+    """
+    if cache_file and os.path.exists(cache_file):
+        # versions may be links to a stored cache, exporting over one would change them all
+        cmds.warning('{} already exists, not exporting over it'.format(cache_file))
+        return
     if not cmds.pluginInfo('AbcExport.mll', q=True, loaded=True):
         cmds.loadPlugin('AbcExport.mll')
     try:
@@ -85,3 +109,10 @@ def export_abc(job):
         mel.eval(cmd)
     except:
         print(traceback.format_exc())
+        return
+    if cache_file and os.path.isfile(cache_file):
+        try:
+            sva_tools.blobstore.checkin(cache_file, get_store_dir())
+        except (IOError, OSError), err:
+            # the export itself is fine, it just takes up its own disk space
+            cmds.warning('Could not add {} to the cache store: {}'.format(cache_file, err))
@@ -0,0 +1,220 @@
+"""
+Extracts a frame range and/or a subset of the hierarchy of an Alembic cache
+into a new archive, without going back to Maya.
+
+Objects and properties are copied as they are, with their metadata and time
+sampling. Only the samples inside the frame range are written, streamed one
+sample at a time from the source, so memory use doesn't grow with the
+length of the cache. Ancestors of the selected roots are kept, so world
+transforms stay the same, but their other children are left out.
+
+From the custom scripts directory:
+
+    python -m sva_alembic.extract shot_cache_v004.abc fx_cache.abc -s 1040 -e 1080 -r "/char:root/**/*body*"
+"""
+import argparse
+import sys
+
+import alembic
+
+import cask
+
+# tolerance when testing sample times against the frame range, in seconds
+TIME_EPSILON = 1e-6
+
+
+def select_objects(archive, roots=None):
+    """
+        returns the set of object paths to extract: the objects matching the
+        roots, everything below them and their ancestors
+
+        args:
+        archive = cask.Archive to extract from
+        roots = list of object paths or path globs, see cask.query,
+                defaults to everything
+    """
+    # the source tree is only read, its index isn't saved next to it
+    index = cask.get_index(archive.filepath, save=False)
+    if not roots:
+        return set(index.descendants())
+    selected = set()
+    for root in roots:
+        for obj in cask.query(archive.top, path=root.strip('/')):
+            path = obj.path()
+            selected.add(path)
+            selected.update(index.descendants(path))
+            parent = index.parent(path)
+            while parent != '/':
+                selected.add(parent)
+                parent = index.parent(parent)
+    return selected
+
+
+def sample_range(iprop, start_time, end_time, tables):
+    """
+        returns the (first, last) sample indices of a property to extract
+
+        args:
+        iprop = alembic IProperty
+        start_time, end_time = time range in seconds, or None for all of it
+        tables = dict of cask.FrameTables to share, see cask.frame_table
+    """
+    num_samples = iprop.getNumSamples()
+    if num_samples <= 1 or iprop.isConstant():
+        return (0, min(num_samples, 1) - 1)
+    table = cask.frame_table(iprop.getTimeSampling(), num_samples, tables)
+    first = 0 if start_time is None else table.index(start_time)
+    last = num_samples - 1 if end_time is None else table.index(end_time)
+    if start_time is not None and table.times[first] < start_time - TIME_EPSILON:
+        first = min(first + 1, last)
+    if end_time is not None and table.times[last] > end_time + TIME_EPSILON:
+        last = max(last - 1, first)
+    return (first, last)
+
+
+def time_sampling(iprop, first, last):
+    """
+        returns the time sampling of a property's samples [first, last],
+        starting at the first extracted sample. For cyclic time sampling the
+        first sample is moved back to the start of its cycle.
+
+        return:
+        (ts, first) = TimeSampling object and the first sample index to write
+    """
+    ts = iprop.getTimeSampling()
+    if first == 0 and last == iprop.getNumSamples() - 1:
+        return ts, first
+    tst = ts.getTimeSamplingType()
+    if tst.isUniform():
+        return alembic.AbcCoreAbstract.TimeSampling(tst.getTimePerCycle(), ts.getSampleTime(first)), first
+    if tst.isCyclic():
+        cycle = tst.getNumSamplesPerCycle()
+        first -= first % cycle
+        times = [ts.getSampleTime(first + i) for i in range(cycle)]
+        return alembic.AbcCoreAbstract.TimeSampling(tst, times), first
+    times = [ts.getSampleTime(i) for i in range(first, last + 1)]
+    return alembic.AbcCoreAbstract.TimeSampling(tst, times), first
+
+
+class Extractor():
+    """
+        streams the selected objects and samples of one archive into another
+    """
+
+    def __init__(self, src, dst, start=None, end=None, roots=None, fps=24):
+        """
+            args:
+            src = path to the alembic file to extract from
+            dst = path to the alembic file to write
+            start, end = frame range to extract, defaults to all frames
+            roots = list of object paths or globs, defaults to everything
+            fps = frames per second
+        """
+        self.src = src
+        self.dst = dst
+        self.fps = fps
+        self.start_time = None if start is None else start / float(fps)
+        self.end_time = None if end is None else end / float(fps)
+        self.roots = roots
+        self.tables = {}
+        self.time_samplings = {}
+        self.num_objects = 0
+        self.num_samples = 0
+        self.oarchive = None
+
+    def run(self):
+        """
+            writes the new archive
+
+            return:
+            num_objects = number of objects written
+        """
+        with cask.Archive(self.src, fps=self.fps) as archive:
+            try:
+                selected = select_objects(archive, self.roots)
+                description = 'Extracted from {}'.format(self.src)
+                self.oarchive = cask.create_oarchive(self.dst, archive.iobject.getTop().getMetaData(), description)
+                stack = [(archive.iobject.getTop(), self.oarchive.getTop())]
+                while stack:
+                    iparent, oparent = stack.pop()
+                    for i in range(iparent.getNumChildren()):
+                        ichild = iparent.getChild(i)
+                        if ichild.getFullName() not in selected:
+                            continue
+                        ochild = alembic.Abc.OObject(oparent, ichild.getName(), ichild.getMetaData())
+                        self.copy_properties(ichild.getProperties(), ochild.getProperties())
+                        self.num_objects += 1
+                        stack.append((ichild, ochild))
+            finally:
+                # the archive is finished once every oobject is released
+                self.oarchive = None
+        return self.num_objects
+
+    def time_sampling_id(self, ts):
+        """
+            returns the id of a time sampling in the new archive, adding it once
+        """
+        tst = ts.getTimeSamplingType()
+        key = (tst.getNumSamplesPerCycle(), tst.getTimePerCycle(), tuple(ts.getStoredTimes()))
+        if key not in self.time_samplings:
+            self.time_samplings[key] = self.oarchive.addTimeSampling(ts)
+        return self.time_samplings[key]
+
+    def copy_properties(self, icompound, ocompound):
+        """
+            copies the properties below a compound property, writing only the
+            samples inside the frame range
+        """
+        stack = [(icompound, ocompound)]
+        while stack:
+            iparent, oparent = stack.pop()
+            for i in range(iparent.getNumProperties()):
+                iprop = iparent.getProperty(i)
+                if iprop.isCompound():
+                    oprop = alembic.Abc.OCompoundProperty(oparent, iprop.getName(), iprop.getMetaData())
+                    stack.append((iprop, oprop))
+                    continue
+                first, last = sample_range(iprop, self.start_time, self.end_time, self.tables)
+                ts, first = time_sampling(iprop, first, last)
+                klass = alembic.Abc.OArrayProperty if iprop.isArray() else alembic.Abc.OScalarProperty
+                oprop = klass(oparent, iprop.getName(), iprop.getDataType(), iprop.getMetaData(),
+                              self.time_sampling_id(ts))
+                for index in range(first, last + 1):
+                    oprop.setValue(iprop.getValue(index))
+                    self.num_samples += 1
+
+
+def extract(src, dst, start=None, end=None, roots=None, fps=24):
+    """
+        writes a frame range and/or a subset of an alembic file to a new file
+
+        args:
+        src = path to the alembic file to extract from
+        dst = path to the alembic file to write
+        start, end = frame range to extract, defaults to all frames
+        roots = list of object paths or globs, defaults to everything
+        fps = frames per second
+
+        return:
+        num_objects = number of objects written
+    """
+    return Extractor(src, dst, start, end, roots, fps).run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Extract a frame range or part of the hierarchy of an Alembic cache.')
+    parser.add_argument('src', help='.abc file to extract from')
+    parser.add_argument('dst', help='.abc file to write')
+    parser.add_argument('-s', '--start', type=float, default=None, help='first frame')
+    parser.add_argument('-e', '--end', type=float, default=None, help='last frame')
+    parser.add_argument('-r', '--root', action='append', dest='roots', help='object path or glob to keep, repeatable')
+    parser.add_argument('--fps', type=float, default=24, help='frames per second')
+    args = parser.parse_args(argv)
+
+    num_objects = extract(args.src, args.dst, args.start, args.end, args.roots, args.fps)
+    sys.stdout.write('Wrote {} objects to {}\n'.format(num_objects, args.dst))
+    return 0 if num_objects else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""
+Flat, memory-mapped geometry caches for tools that read the same frames
+over and over, like scrubbing in review. An Alembic cache is converted once
+into one binary file holding the points of every mesh and the world matrix
+of every transform for every frame, plus a JSON index of where each block
+lives. Reading a frame is then a NumPy view into the mapped file, with no
+Alembic decode and no copy.
+
+    >>> import sva_alembic.geocache as geocache
+    >>> geo = geocache.GeoCache(geocache.convert('char_cache_v003.abc'))
+    >>> geo.points('/char:root/char:body/char:bodyShape', 1050).shape
+    (18250, 3)
+    >>> geo.matrix('/char:root/char:body', 1050).shape
+    (4, 4)
+
+From the custom scripts directory:
+
+    python -m sva_alembic.geocache char_cache_v003.abc -o char_cache_v003.geo
+"""
+import argparse
+import json
+import os
+import sys
+
+import cask
+import numpy
+
+# version of the index layout, bump when it changes
+VERSION = 1
+
+# extension of the binary file, the index is the same path plus INDEX_EXT
+GEO_EXT = '.geo'
+INDEX_EXT = '.json'
+
+# byte alignment of each object's first block
+ALIGNMENT = 16
+
+# dtypes of stored points and matrices
+POINTS_DTYPE = 'float32'
+MATRIX_DTYPE = 'float64'
+
+
+def geo_path(abc):
+    """
+        returns the default geocache path for an alembic file
+    """
+    return os.path.splitext(abc)[0] + GEO_EXT
+
+
+def _pad(f):
+    """
+        pads the file to the next aligned offset and returns the offset
+    """
+    offset = f.tell()
+    padding = -offset % ALIGNMENT
+    if padding:
+        f.write('\0' * padding)
+    return offset + padding
+
+
+def _write_points(f, archive, prop, frames):
+    """
+        writes the points of one .geom/P property for every frame
+
+        return:
+        entry = index entry, see GeoCache
+    """
+    iprop = prop.iobject
+    offset = _pad(f)
+    if iprop.isConstant() or iprop.getNumSamples() <= 1:
+        points = prop.as_numpy(index=0).astype(POINTS_DTYPE)
+        f.write(points.tobytes())
+        return {'offset': offset, 'shape': [1] + list(points.shape), 'static': True}
+
+    table = archive.frame_table(iprop.getTimeSampling(), iprop.getNumSamples())
+    offsets = []
+    counts = []
+    for index in table.indices(frames, archive.fps):
+        points = prop.as_numpy(index=int(index)).astype(POINTS_DTYPE)
+        offsets.append(f.tell())
+        counts.append(len(points))
+        f.write(points.tobytes())
+    if len(set(counts)) == 1:
+        return {'offset': offset, 'shape': [len(frames), counts[0], 3], 'static': False}
+    # the point count changes, frames are found through their own offsets
+    return {'offsets': offsets, 'counts': counts, 'static': False}
+
+
+def _write_matrix(f, matrices):
+    """
+        writes the (frames, 4, 4) world matrices of one transform
+
+        return:
+        entry = index entry, see GeoCache
+    """
+    offset = _pad(f)
+    # constant transforms come back from cask as broadcast views
+    static = matrices.strides[0] == 0
+    if static:
+        matrices = matrices[:1]
+    f.write(numpy.ascontiguousarray(matrices, dtype=MATRIX_DTYPE).tobytes())
+    return {'offset': offset, 'shape': list(matrices.shape), 'static': static}
+
+
+def convert(abc, path=None, frames=None):
+    """
+        writes the geocache of an alembic file
+
+        args:
+        abc = path to the alembic file
+        path = path of the geocache to write, defaults to geo_path(abc)
+        frames = frames to store, defaults to the archive's frame range
+
+        return:
+        path = path of the written geocache
+    """
+    path = path or geo_path(abc)
+    with cask.pinned_archive(abc) as archive:
+        if frames is None:
+            start, end = archive.frame_range()
+            frames = range(int(start), int(end) + 1)
+        frames = list(frames)
+        index = cask.get_index(abc)
+
+        objects = {}
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            # points are streamed one object and frame at a time
+            for obj_path in index.descendants():
+                obj = archive.top.children[obj_path[1:]]
+                if '.geom' not in obj.properties:
+                    continue
+                if 'P' not in obj.properties['.geom'].properties:
+                    continue
+                objects.setdefault(obj_path, {})['points'] = \
+                    _write_points(f, archive, obj.properties['.geom/P'], frames)
+
+            for obj_path, matrices in sorted(archive.world_matrices(frames).items()):
+                if index.type(obj_path) == 'Xform':
+                    objects.setdefault(obj_path, {})['matrix'] = _write_matrix(f, matrices)
+
+    index_data = {
+        'version': VERSION,
+        'source': os.path.abspath(abc),
+        'key': list(cask.file_key(abc)),
+        'fps': archive.fps,
+        'frames': frames,
+        'objects': objects,
+    }
+    with open(tmp + INDEX_EXT, 'w') as f:
+        json.dump(index_data, f)
+
+    # replace an existing cache only once both files are complete
+    for ext in ('', INDEX_EXT):
+        if os.path.exists(path + ext):
+            os.remove(path + ext)
+        os.rename(tmp + ext, path + ext)
+    return path
+
+
+class GeoCache():
+    """
+        memory-mapped reader for a geocache written by convert
+
+        The index holds one entry per object and kind ('points' or 'matrix'):
+            offset, shape = a contiguous (frames, ...) block, (1, ...) when static
+            offsets, counts = per frame blocks, for points whose count changes
+    """
+
+    def __init__(self, path):
+        """
+            args:
+            path = path to the geocache file
+        """
+        self.path = path
+        with open(path + INDEX_EXT) as f:
+            self.index = json.load(f)
+        if self.index.get('version') != VERSION:
+            raise ValueError('Unsupported geocache version: {}'.format(path))
+        self.frames = self.index['frames']
+        self._positions = dict((frame, i) for i, frame in enumerate(self.frames))
+        # numpy can't map an empty file, which is what an archive with no
+        # meshes or transforms converts to
+        self._map = None
+        if os.path.getsize(path):
+            self._map = numpy.memmap(path, dtype='uint8', mode='r')
+
+    def __repr__(self):
+        return '<GeoCache "{}">'.format(self.path)
+
+    def paths(self):
+        """
+            returns the paths of all objects in the cache
+        """
+        return sorted(self.index['objects'])
+
+    def is_stale(self):
+        """
+            returns True if the source alembic file changed since the conversion
+        """
+        source = self.index['source']
+        return not os.path.isfile(source) or list(cask.file_key(source)) != self.index['key']
+
+    def frame_index(self, frame):
+        """
+            returns the position of a frame in the cache, or of the nearest
+            stored frame
+        """
+        if frame in self._positions:
+            return self._positions[frame]
+        if not self.frames:
+            raise KeyError('No frames in {}'.format(self.path))
+        return min(range(len(self.frames)), key=lambda i: abs(self.frames[i] - frame))
+
+    def __entry(self, path, kind):
+        try:
+            return self.index['objects'][path][kind]
+        except KeyError:
+            raise KeyError('No {} for {} in {}'.format(kind, path, self.path))
+
+    def __view(self, offset, dtype, shape):
+        if self._map is None:
+            # only empty blocks point into an empty file
+            view = numpy.zeros(shape, dtype=dtype)
+            view.flags.writeable = False
+            return view
+        return numpy.ndarray(shape, dtype=dtype, buffer=self._map, offset=offset)
+
+    def __get(self, path, kind, dtype, frame):
+        entry = self.__entry(path, kind)
+        if 'offsets' in entry:
+            if frame is None:
+                raise ValueError('{} changes point count, read it one frame at a time'.format(path))
+            i = self.frame_index(frame)
+            return self.__view(entry['offsets'][i], dtype, (entry['counts'][i], 3))
+        block = self.__view(entry['offset'], dtype, tuple(entry['shape']))
+        if frame is None:
+            return block
+        return block[0 if entry['static'] else self.frame_index(frame)]
+
+    def points(self, path, frame=None):
+        """
+            returns a read-only view of an object's points
+
+            args:
+            path = full object path
+            frame = frame to read, or None for a (frames, points, 3) view of
+                    all frames, (1, points, 3) for static points
+        """
+        return self.__get(path, 'points', POINTS_DTYPE, frame)
+
+    def matrix(self, path, frame=None):
+        """
+            returns a read-only view of a transform's world matrix
+
+            args:
+            path = full object path
+            frame = frame to read, or None for a (frames, 4, 4) view of all
+                    frames, (1, 4, 4) for static transforms
+        """
+        return self.__get(path, 'matrix', MATRIX_DTYPE, frame)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert an Alembic cache to a memory-mapped geocache.')
+    parser.add_argument('abc', help='.abc file to convert')
+    parser.add_argument('-o', '--output', default=None, help='geocache file to write')
+    args = parser.parse_args(argv)
+
+    path = convert(args.abc, args.output)
+    sys.stdout.write('Wrote {}\n'.format(path))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,48 +1,104 @@
 import maya.cmds as cmds
 import maya.mel as mel
+import maya.utils
 import os
+import traceback
+from functools import partial
+from multiprocessing.pool import ThreadPool
 
 import sva_alembic.utils
+import sva_tools.library
+import catalog
 import utils
 
+# number of threads prefetching caches in the background
+PREFETCH_THREADS = 8
 
-class Cache():
+# name of the undo chunk load_caches runs in
+LOAD_CHUNK = 'load_caches'
+
+_POOL = None
+
+
+class Cache(object):
     def __init__(self, path, refs, assets):
+        """
+            args:
+            path = the cache directory
+            refs = the scene's reftable.RefTable, shared by every cache
+            assets = dict of library assets to their asset types
+        """
         self.path = path
         self.refs = refs
         self.assets = assets
         self.asset_name = self.path.split(os.sep)[-1].split('_')[0]
         self.namespace = self.get_namespace()
 
+        # optionVars can only be read on the main thread, so read them up front
         self.proj_context = sva_alembic.utils.get_op_proj_info()
+        self.master_ext = cmds.optionVar(q='op_masterFormat')
 
-        self.category = ''
-        self.scene = ''
-        self.abcs = []
+        self.category = self.get_category()
+        self.scene = self.get_scene()
 
-        self.status = ''  # unloaded, current, old
+        self.status = ''  # unloaded, current, old or '' until resolved
         self.mode = None  # reference, attach
         self.loaded_abc = None
-        self.shds = []
         self.loaded_shd = None
         self.abc_node = None
-        self.latest_abc = None
         self.ref_node = None
+        self.resolved = False
+
+        # filled in on first use or by prefetch
+        self._abcs = None
+        self._shds = None
 
         self.gui = None
 
-        self.refresh()
+    @property
+    def abcs(self):
+        if self._abcs is None:
+            self._abcs = self.get_abcs()
+        return self._abcs
 
-    def refresh(self):
-        self.category = self.get_category()
-        self.scene = self.get_scene()
-        self.abcs = self.get_abcs()
-        self.latest_abc = self.get_latest_abc()
-        self.shds = self.get_shds()
+    @property
+    def shds(self):
+        if self._shds is None:
+            self._shds = self.get_shds()
+        return self._shds
 
-        self.get_loaded_abc()
+    @property
+    def latest_abc(self):
+        return self.get_latest_abc()
 
+    def refresh(self):
+        self._abcs = self.get_abcs()
+        self._shds = self.get_shds()
+        save_indexes([self])
+        self.resolve()
+
+    def prefetch(self):
+        """
+            reads the cache's versions and shds from disk, safe to run on any thread
+
+            return:
+            self, so it can be passed on to a callback
+        """
+        try:
+            self.abcs
+            self.shds
+        except Exception:
+            # left for the main thread, which reports it when it reads them again
+            pass
+        return self
+
+    def resolve(self):
+        """
+            finds what's loaded in the scene and the cache's status, on the main thread
+        """
+        self.get_loaded_abc()
         self.status = self.get_status()
+        self.resolved = True
 
     def get_category(self):
         category = self.path.split(os.sep)[-1]
@@ -53,7 +109,8 @@ class Cache():
         return scene
 
     def get_abcs(self):
-        caches = [os.path.join(self.path, x) for x in os.listdir(self.path) if x.endswith('.abc')]
+        shot_catalog = catalog.get_catalog(catalog.cache_root(self.path))
+        caches = shot_catalog.abcs(self.path)
         return caches
 
     def get_namespace(self):
@@ -69,13 +126,13 @@ class Cache():
 
         components = self.get_components()
         shd_components = [c for c in components if 'SHD' in os.path.basename(c)]
-        master_ext = cmds.optionVar(q='op_masterFormat')
+        library = sva_tools.library.get_library(self.proj_context['lib_path'])
         for shd in shd_components:
-            publishes = [f for f in os.listdir(shd) if f.endswith('.{master}'.format(master=master_ext))]
+            publishes = library.masters(shd, self.master_ext)
             if publishes:
                 shds.append({
                     'name': os.path.basename(shd),
-                    'path': os.path.join(shd, publishes[0]),
+                    'path': publishes[0],
                 })
         return shds
 
@@ -84,13 +141,8 @@ class Cache():
         if self.path.split(os.sep)[-2] == 'asset':
             if self.asset_name in self.assets:
                 category = self.assets[self.asset_name]
-                component_path = os.path.join(
-                    self.proj_context['lib_path'].replace('/', os.sep),
-                    category,
-                    self.asset_name,
-                    'components',
-                )
-                components = [os.path.join(component_path, d) for d in os.listdir(component_path) if os.path.isdir(os.path.join(component_path, d))]
+                library = sva_tools.library.get_library(self.proj_context['lib_path'])
+                components = library.components(category, self.asset_name)
         return components
 
     def get_loaded_abc(self):
@@ -135,78 +187,146 @@ class Cache():
         return status
 
     def load(self, mode, shd, version):
+        bad_objs = self.apply_load(self.plan_load(mode, shd, version))
+        if bad_objs:
+            show_bad_objects({self.namespace: bad_objs})
+
+    def plan_load(self, mode, shd, version):
+        """
+            works out how to load a version of the cache, without changing the scene
+
+            args:
+            mode = reference or attach
+            shd = name of the shd to attach to, for attach
+            version = version of the cache to load
+
+            return:
+            plan = a dict with
+                mode = reference or attach
+                abc = the .abc file to load
+                remove = True if the cache has to be removed first, to change modes
+                ref = 'create' to make a new reference, 'swap' to load the file
+                      into the existing reference or None to leave it
+                shd = the shd dict to reference, for attach
+                geo = names of the objects in the cache to connect, for attach
+                namespace = the cache's root namespace, for attach
+        """
+        if not self.resolved:
+            self.resolve()
         cache = [v for v in self.abcs if version in v]
         if not cache:
             raise Exception('Could not find a {version} in caches.'.format(version=version))
 
+        # if the mode changes, whatever is loaded gets removed first
+        remove = bool(self.mode and mode != self.mode)
+        loaded_shd = None if remove else self.loaded_shd
+        plan = {
+            'mode': mode,
+            'abc': cache[0],
+            'remove': remove,
+            'ref': None,
+            'shd': None,
+            'geo': None,
+            'namespace': None,
+        }
+
         if mode == 'attach':
-            # if the current mode is ref, get rid of the ref first
-            if self.mode and mode != self.mode:
-                self.remove()
+            # see if the shade is loaded
+            if not loaded_shd or loaded_shd['name'] != shd:
+                shds = [s for s in self.shds if s['name'] == shd]
+                if not shds:
+                    raise Exception('Could not find the {shd} shd for {namespace}.'.format(shd=shd, namespace=self.namespace))
+                plan['shd'] = shds[0]
+                # if there is a loaded shade, just switch the ref path
+                plan['ref'] = 'swap' if loaded_shd else 'create'
+            # the objects to connect come from the cache's index, not the scene
+            plan['geo'] = utils.objs_from_abc(plan['abc'], 1)
+            plan['namespace'] = utils.namespace_from_abc(plan['abc'])
+            if not plan['namespace']:
+                raise Exception('{abc} has no root namespace to attach with.'.format(abc=plan['abc']))
 
-            # delete the existing abc node
-            if self.abc_node:
-                if cmds.objExists(self.abc_node):
-                    cmds.delete(self.abc_node)
+        if mode == 'reference':
+            plan['ref'] = 'swap' if not remove and self.mode == mode and self.ref_node else 'create'
 
-            # see if the shade is loaded
-            if not self.loaded_shd or self.loaded_shd['name'] != shd:
-                for current_shd in self.shds:
-                    if current_shd['name'] == shd:
-                        # reference it
-                        # TODO add check to make sure namespace isnt taken
-
-                        # if we don't have a loaded shade, make a new reference
-                        if not self.loaded_shd:
-                            cmds.file(current_shd['path'], r=True, namespace=self.namespace)
-                        # if there is a loaded shade, just switch the ref path
-                        else:
-                            # cmd = 'cmds.file({}, lr={})'.format(current_shd['path'], self.refs[self.namespace]['ref_node'])
-                            # print cmd
-                            cmds.file(unloadReference=self.refs[self.namespace]['ref_node'])
-                            cmds.file(current_shd['path'].replace('\\', '/'), lr=self.refs[self.namespace]['ref_node'])
-                        self.loaded_shd = current_shd
-                        self.refs = utils.get_refs()
+        return plan
+
+    def apply_load(self, plan):
+        """
+            loads the cache as planned by plan_load
+
+            return:
+            bad_objs = objects in the cache that aren't in the shd, for attach
+        """
+        bad_objs = []
+        if plan['remove']:
+            self.remove()
+
+        # delete the existing abc node
+        if self.abc_node:
+            if cmds.objExists(self.abc_node):
+                cmds.delete(self.abc_node)
+                self.abc_node = None
+
+        if plan['mode'] == 'attach':
+            if plan['ref'] == 'create':
+                # reference it
+                # TODO add check to make sure namespace isnt taken
+                with self.refs.editing():
+                    ref = cmds.file(plan['shd']['path'], r=True, namespace=self.namespace)
+                self.refs.add(ref)
+            elif plan['ref'] == 'swap':
+                ref_node = self.refs[self.namespace]['ref_node']
+                with self.refs.editing():
+                    cmds.file(unloadReference=ref_node)
+                    cmds.file(plan['shd']['path'].replace('\\', '/'), lr=ref_node)
+                self.refs.update(ref_node)
+            if plan['shd']:
+                self.loaded_shd = plan['shd']
 
             # attach to shd!
-            self.attach(cache[0])
+            bad_objs = self.attach(plan['abc'], plan['geo'], plan['namespace'])
             self.mode = 'attach'
 
-        if mode == 'reference':
-            # if the current mode is attach, get rid of the shd first
-            if self.mode and mode != self.mode:
-                self.remove()
-
-            # delete the existing abc node
-            if self.abc_node:
-                if cmds.objExists(self.abc_node):
-                    cmds.delete(self.abc_node)
-                    self.abc_node = None
-
-            if self.mode == mode and self.ref_node:
-                cmds.file(cache[0], lr=self.ref_node)
+        if plan['mode'] == 'reference':
+            if plan['ref'] == 'swap':
+                with self.refs.editing():
+                    cmds.file(plan['abc'], lr=self.ref_node)
+                self.refs.update(self.ref_node)
             else:
-                cmds.file(cache[0], r=True, namespace=self.namespace)
-                self.refs = utils.get_refs()  # update the reference list
+                with self.refs.editing():
+                    ref = cmds.file(plan['abc'], r=True, namespace=self.namespace)
+                self.refs.add(ref)  # update the reference list
 
             if self.namespace in self.refs:
                 self.ref_node = self.refs[self.namespace]['ref_node']
 
-            self.loaded_abc = cache[0]
+            self.loaded_abc = plan['abc']
             self.mode = 'reference'
 
         # refresh the status
         self.status = self.get_status()
-
-    def attach(self, cache):
+        return bad_objs
+
+    def attach(self, cache, alembic_geo=None, alembic_root_namespace=None):
+        """
+            args:
+            cache = the .abc file to attach to the shd
+            alembic_geo = names of the objects in the cache, read from it when not given
+            alembic_root_namespace = the cache's root namespace, read from it when not given
+
+            return:
+            bad_objs = objects in the cache that aren't in the shd, see show_bad_objects
+        """
         # attach
         cache = str(cache)
         all_objs = cmds.ls(self.namespace+':*', r=1, dag=1, long=1)
         all_abcs_old = cmds.ls(type='AlembicNode')
-        alembic_geo = utils.objs_from_abc(cache, 1)
+        if alembic_geo is None:
+            alembic_geo = utils.objs_from_abc(cache, 1)
 
         # temporarily switch the namespace while attaching to match alembic geo
-        alembic_root_namespace = utils.namespace_from_abc(cache)
+        if alembic_root_namespace is None:
+            alembic_root_namespace = utils.namespace_from_abc(cache)
         # cmds.namespace(force=True, moveNamespace=(self.namespace, alembic_root_namespace))
         cmds.file(self.refs[self.namespace]['path'], e=1, namespace=alembic_root_namespace)
 
@@ -224,48 +344,6 @@ class Cache():
                     if exclusion not in geo:
                         bad_objs.append(geo)
 
-        # warn user about cache object mismatches
-        if len(bad_objs):
-            problems = 1
-            border_space = 10
-            control_space = 5
-
-            bad_string = '\n'.join(bad_objs)
-            bad_obj_win = 'bcImp_badObjWin'
-            bad_obj_win = cmds.window(t='{} - Bad cache objects!'.format(self.namespace), rtf=1)
-
-            bad_obj_form = cmds.formLayout(nd=100)
-            heading = cmds.text(
-                w=400, l='The following geometry is in the cache, but not in the SHD asset:')
-            bad_scroll = cmds.textScrollList()
-            for obj in bad_objs:
-                cmds.textScrollList(bad_scroll, e=1, append=obj)
-            footing = cmds.text(
-                l='You should probably publish the SHD asset.')
-            yes_btn = cmds.button(
-                l='Ok!', c='import maya.cmds as cmds; cmds.deleteUI("{}")'.format(bad_obj_win))
-
-            cmds.formLayout(bad_obj_form, e=1,
-                            attachForm=(
-                                (heading, 'top', border_space),
-                                (heading, 'left', border_space),
-                                (heading, 'right', border_space),
-                                (bad_scroll, 'left', border_space),
-                                (bad_scroll, 'right', border_space),
-                                (footing, 'left', border_space),
-                                (footing, 'right', border_space),
-                                (yes_btn, 'left', border_space),
-                                (yes_btn, 'right', border_space),
-                                (yes_btn, 'bottom', border_space),
-                            ),
-                            attachControl=(
-                                (bad_scroll, 'top', control_space, heading),
-                                (bad_scroll, 'bottom', control_space, footing),
-                                (footing, 'bottom', control_space, yes_btn),
-                            ))
-
-            cmds.showWindow(bad_obj_win)
-
         # connect the alembic to the shade file!
         alembic_cmd = 'AbcImport -mode "import" -connect "{}" "{}";'.format(
             ' '.join(roots), cache.replace('\\', '/'))
@@ -293,18 +371,219 @@ class Cache():
 
         self.abc_node = alembic_node
         self.loaded_abc = cache
+        return bad_objs
 
     def remove(self):
         if self.abc_node:
             if cmds.objExists(self.abc_node):
                 cmds.delete(self.abc_node)
         if self.namespace in self.refs:
-            cmds.file(self.refs[self.namespace]['path'], removeReference=True, mergeNamespaceWithRoot=True)
+            with self.refs.editing():
+                cmds.file(self.refs[self.namespace]['path'], removeReference=True, mergeNamespaceWithRoot=True)
+            self.refs.remove(self.namespace)
             utils.remove_namespace(self.namespace)
 
         self.status = 'unloaded'
+        self.forget_loaded()
+
+    def forget_loaded(self):
+        """
+            clears what the cache knows is loaded, see resolve to read it again
+        """
         self.mode = None
         self.loaded_abc = None
         self.loaded_shd = None
         self.abc_node = None
         self.ref_node = None
+
+
+def show_bad_objects(bad_objs):
+    """
+        warns the user about cache objects that aren't in the shd they were
+        attached to, in one window for every cache
+
+        args:
+        bad_objs = dict of cache namespace to the names of its bad objects
+    """
+    border_space = 10
+    control_space = 5
+
+    namespaces = sorted(bad_objs)
+    bad_obj_win = cmds.window(t='{} - Bad cache objects!'.format(', '.join(namespaces)), rtf=1)
+
+    bad_obj_form = cmds.formLayout(nd=100)
+    heading = cmds.text(
+        w=400, l='The following geometry is in the cache, but not in the SHD asset:')
+    bad_scroll = cmds.textScrollList()
+    for namespace in namespaces:
+        for obj in bad_objs[namespace]:
+            label = obj if len(namespaces) == 1 else '{}: {}'.format(namespace, obj)
+            cmds.textScrollList(bad_scroll, e=1, append=label)
+    footing = cmds.text(
+        l='You should probably publish the SHD asset.')
+    yes_btn = cmds.button(
+        l='Ok!', c='import maya.cmds as cmds; cmds.deleteUI("{}")'.format(bad_obj_win))
+
+    cmds.formLayout(bad_obj_form, e=1,
+                    attachForm=(
+                        (heading, 'top', border_space),
+                        (heading, 'left', border_space),
+                        (heading, 'right', border_space),
+                        (bad_scroll, 'left', border_space),
+                        (bad_scroll, 'right', border_space),
+                        (footing, 'left', border_space),
+                        (footing, 'right', border_space),
+                        (yes_btn, 'left', border_space),
+                        (yes_btn, 'right', border_space),
+                        (yes_btn, 'bottom', border_space),
+                    ),
+                    attachControl=(
+                        (bad_scroll, 'top', control_space, heading),
+                        (bad_scroll, 'bottom', control_space, footing),
+                        (footing, 'bottom', control_space, yes_btn),
+                    ))
+
+    cmds.showWindow(bad_obj_win)
+
+
+def _rollback(caches):
+    """
+        undoes the load_caches chunk and reads what's loaded in the scene again
+
+        args:
+        caches = the caches the chunk loaded, or started to
+    """
+    # an empty chunk isn't recorded, don't undo whatever came before it
+    if cmds.undoInfo(q=True, undoName=True) == LOAD_CHUNK:
+        cmds.undo()
+    if caches:
+        caches[0].refs.dirty = True
+    for cache in caches:
+        cache.forget_loaded()
+        cache.resolve()
+
+
+def _prefetched(callback, cache):
+    """
+        resolves a prefetched cache and passes it on to callback, on the main thread
+    """
+    if not cache.resolved:
+        cache.resolve()
+    if callback:
+        callback(cache)
+
+
+def save_indexes(caches):
+    """
+        saves the shot catalogs and libraries the caches were read from
+    """
+    for root in set(catalog.cache_root(c.path) for c in caches):
+        catalog.get_catalog(root).save()
+    for lib_path in set(c.proj_context['lib_path'] for c in caches):
+        sva_tools.library.get_library(lib_path).save()
+
+
+def prefetch(caches, callback=None):
+    """
+        prefetches caches on a pool of background threads and resolves each one
+        on the main thread as it arrives. The catalogs and libraries they were
+        read from are saved once, after the last one.
+
+        args:
+        caches = Cache objects to prefetch
+        callback = function called on the main thread with each resolved cache
+    """
+    global _POOL
+    caches = list(caches)
+    if not caches:
+        return
+    if _POOL is None:
+        _POOL = ThreadPool(PREFETCH_THREADS)
+
+    # only touched on the main thread
+    pending = [len(caches)]
+
+    def prefetched(cache):
+        try:
+            _prefetched(callback, cache)
+        finally:
+            pending[0] -= 1
+            if not pending[0]:
+                save_indexes(caches)
+
+    for cache in caches:
+        _POOL.apply_async(cache.prefetch, callback=partial(maya.utils.executeDeferred, prefetched))
+
+
+def load_caches(items, progress=None):
+    """
+        loads many caches in one go. Every load is planned before the scene is
+        touched, so a bad version, shd or cache, or two caches with the same
+        namespace, are found up front and skipped, then the plans are applied
+        in one pass without updating any UI.
+
+        The pass is one undo chunk. If a cache fails to load, the chunk is
+        undone, so none of the caches are loaded, and every cache that was
+        loaded is reported as rolled back. Cancelling from progress keeps the
+        caches loaded so far. Cache objects missing from their shds are
+        reported in one window at the end.
+
+        args:
+        items = list of (cache, mode, shd, version) to load, see Cache.load
+        progress = function called with (done, total, cache) before each cache
+                   is loaded, returning True stops the load
+
+        return:
+        errors = list of (cache, exception) for the caches that didn't load
+    """
+    plans = []
+    errors = []
+    namespaces = set()
+    for cache, mode, shd, version in items:
+        try:
+            if cache.namespace in namespaces:
+                raise Exception('{namespace} is already being loaded.'.format(namespace=cache.namespace))
+            plans.append((cache, cache.plan_load(mode, shd, version)))
+            namespaces.add(cache.namespace)
+        except Exception as err:
+            errors.append((cache, err))
+
+    # the batch is rolled back with undo, so it has to be recorded
+    undo_state = cmds.undoInfo(q=True, state=True)
+    if not undo_state:
+        cmds.undoInfo(stateWithoutFlush=True)
+    applied = []
+    bad_objs = {}
+    failed = None
+    cmds.undoInfo(openChunk=True, chunkName=LOAD_CHUNK)
+    try:
+        for done, (cache, plan) in enumerate(plans):
+            if progress and progress(done, len(plans), cache):
+                break
+            applied.append(cache)
+            try:
+                bad = cache.apply_load(plan)
+            except Exception as err:
+                traceback.print_exc()
+                failed = (cache, err)
+                break
+            if bad:
+                bad_objs[cache.namespace] = bad
+    finally:
+        cmds.undoInfo(closeChunk=True)
+        try:
+            if failed:
+                _rollback(applied)
+        finally:
+            if not undo_state:
+                cmds.undoInfo(stateWithoutFlush=False)
+
+    if failed:
+        errors.append(failed)
+        for cache in applied[:-1]:
+            errors.append((cache, Exception('rolled back, {} failed to load'.format(failed[0].namespace))))
+    elif bad_objs:
+        show_bad_objects(bad_objs)
+    if progress:
+        progress(len(plans), len(plans), None)
+    return errors
@@ -0,0 +1,89 @@
+"""
+Catalog of the caches in a shot's cache/alembic directory, so the importer
+doesn't list every scene, category and cache directory each time it opens.
+
+The tree is laid out as <scene>/<category>/<cache>/<name>_cache_v###.abc.
+The catalog keeps the sub-directories and .abc files of every directory in
+it, with the directory's mtime, and is saved as a JSON file at the top of
+the tree, see sva_tools.treecache. On the next look up only the directories
+whose mtime changed are listed again, and the rest of the tree costs one
+stat per directory.
+
+    >>> shot_catalog = catalog.get_catalog(cache_dir)
+    >>> for cache_path in shot_catalog.caches():
+    ...     print cache_path, shot_catalog.abcs(cache_path)
+"""
+import os
+import threading
+
+import sva_tools.treecache
+
+# name of the catalog file saved at the top of the tree
+CATALOG_FILE = '.catalog.json'
+
+# depth of the cache directories below the top of the tree
+CACHE_DEPTH = 3
+
+
+class Catalog(sva_tools.treecache.TreeCache):
+    """
+        the cache directories and .abc files of a shot's cache tree
+    """
+
+    def __init__(self, root):
+        """
+            args:
+            root = the shot's cache/alembic directory
+        """
+        sva_tools.treecache.TreeCache.__init__(self, root, CATALOG_FILE, ('.abc',))
+
+    def caches(self):
+        """
+            returns the paths of all cache directories in the tree, checking
+            each directory's mtime and listing the changed ones again
+        """
+        caches = [self.full_path(rel_path) for rel_path in self.walk(CACHE_DEPTH) if self.entry(rel_path)]
+        self.save()
+        return caches
+
+    def abcs(self, cache_path):
+        """
+            returns the full paths of the .abc files in a cache directory,
+            listing it again if its mtime changed
+
+            args:
+            cache_path = full path of a cache directory in the tree
+        """
+        entry = self.entry(os.path.relpath(cache_path, self.root))
+        if entry is None:
+            return []
+        return [os.path.join(cache_path, abc) for abc in entry['files']]
+
+
+# catalogs loaded in this session, by root directory
+_CATALOGS = {}
+_CATALOGS_LOCK = threading.Lock()
+
+
+def get_catalog(root):
+    """
+        returns the catalog of a cache tree, shared by everything that
+        looks at the same tree in this session
+
+        args:
+        root = the shot's cache/alembic directory
+    """
+    root = os.path.abspath(root)
+    with _CATALOGS_LOCK:
+        if root not in _CATALOGS:
+            _CATALOGS[root] = Catalog(root)
+        return _CATALOGS[root]
+
+
+def cache_root(cache_path):
+    """
+        returns the top of the cache tree a cache directory belongs to
+    """
+    for i in range(CACHE_DEPTH):
+        cache_path = os.path.dirname(cache_path)
+    return cache_path
@@ -0,0 +1,173 @@
+"""
+Table of the references in the scene, by namespace, shared by every cache
+in the importer.
+
+The table is built once with two referenceQuery calls per reference. After
+that, the importer updates the entries it changes itself, and scene
+callbacks mark the table dirty when references are created, removed or
+loaded some other way, or a new scene is opened, so the next look up
+builds it again. Edits no scene message covers, like changing a
+reference's namespace, are picked up when the importer is refreshed.
+
+    >>> refs = reftable.get_ref_table()
+    >>> with refs.editing():
+    ...     ref = cmds.file(path, r=True, namespace=namespace)
+    >>> refs.add(ref)
+"""
+import contextlib
+import os
+
+import maya.cmds as cmds
+import maya.OpenMaya as om
+
+# scene messages that mark the table dirty
+DIRTY_MESSAGES = (
+    om.MSceneMessage.kAfterNew,
+    om.MSceneMessage.kAfterOpen,
+    om.MSceneMessage.kAfterCreateReference,
+    om.MSceneMessage.kAfterRemoveReference,
+    om.MSceneMessage.kAfterLoadReference,
+    om.MSceneMessage.kAfterImportReference,
+)
+
+
+def ref_entry(ref):
+    """
+        queries a reference
+
+        args:
+        ref = reference file path, as returned by cmds.file
+
+        return:
+        (namespace, entry) = the reference's namespace and a dict with its
+                             path, clean_path and ref_node
+    """
+    ref_node = cmds.referenceQuery(ref, rfn=True)
+    namespace = cmds.referenceQuery(ref_node, namespace=True).lstrip(':')
+    entry = {
+        'path': ref.replace('/', os.sep),
+        'clean_path': ref.split('{')[0].replace('/', os.sep),
+        'ref_node': ref_node,
+    }
+    return namespace, entry
+
+
+class RefTable(object):
+    """
+        dict like table where the keys are namespaces in the scene and the
+        values are the references that correspond
+    """
+
+    def __init__(self):
+        self.refs = {}
+        self.dirty = True
+        self.callback_ids = []
+        self._editing = 0
+
+    def __repr__(self):
+        return '<RefTable {} references>'.format(len(self.table()))
+
+    def __contains__(self, namespace):
+        return namespace in self.table()
+
+    def __getitem__(self, namespace):
+        return self.table()[namespace]
+
+    def __iter__(self):
+        return iter(self.table())
+
+    def __len__(self):
+        return len(self.table())
+
+    def get(self, namespace, default=None):
+        return self.table().get(namespace, default)
+
+    def table(self):
+        """
+            returns the namespace to reference dict, building it if it's dirty
+        """
+        if self.dirty:
+            self.build()
+        return self.refs
+
+    def build(self):
+        """
+            queries every reference in the scene
+        """
+        self.refs = dict(ref_entry(ref) for ref in cmds.file(q=1, r=1))
+        self.dirty = False
+
+    def add(self, ref):
+        """
+            adds a reference created by the importer
+
+            args:
+            ref = reference file path, as returned by cmds.file
+        """
+        namespace, entry = ref_entry(ref)
+        self.refs[namespace] = entry
+
+    def update(self, ref_node):
+        """
+            updates a reference the importer loaded another file into
+
+            args:
+            ref_node = the reference node
+        """
+        for namespace, entry in self.refs.items():
+            if entry['ref_node'] == ref_node:
+                del self.refs[namespace]
+        self.add(cmds.referenceQuery(ref_node, filename=True))
+
+    def remove(self, namespace):
+        """
+            removes a reference the importer removed from the scene
+        """
+        self.refs.pop(namespace, None)
+
+    @contextlib.contextmanager
+    def editing(self):
+        """
+            context for the importer's own reference edits, which it updates
+            the table for, so they don't mark the table dirty
+        """
+        self._editing += 1
+        try:
+            yield self
+        finally:
+            self._editing -= 1
+
+    def scene_changed(self, *args):
+        """
+            scene callback, marks the table dirty unless the importer is
+            making the change
+        """
+        if not self._editing:
+            self.dirty = True
+
+    def add_callbacks(self):
+        """
+            registers the scene callbacks that keep the table current
+        """
+        if not self.callback_ids:
+            for message in DIRTY_MESSAGES:
+                self.callback_ids.append(om.MSceneMessage.addCallback(message, self.scene_changed))
+
+    def remove_callbacks(self):
+        for callback_id in self.callback_ids:
+            om.MMessage.removeCallback(callback_id)
+        self.callback_ids = []
+
+
+_TABLE = None
+
+
+def get_ref_table():
+    """
+        returns the scene's reference table, shared by every cache
+    """
+    global _TABLE
+    if _TABLE is None:
+        _TABLE = RefTable()
+        _TABLE.add_callbacks()
+    return _TABLE
@@ -2,7 +2,9 @@ import maya.cmds as cmds
 from functools import partial
 import os
 import utils
+import reftable
 import traceback
+from cache import load_caches, prefetch
 
 import sva_alembic.utils
 
@@ -129,6 +131,16 @@ class Show():
                                     (str(frame_layout), 'top', 0, str(frame_layouts[x-1])),
                                 ))
 
+        # the rows show placeholders until their cache is read in the background
+        prefetch([c for c in self.caches if c.gui], self.cache_prefetched)
+
+    def cache_prefetched(self, cache):
+        """
+            fills in the row of a cache once it's prefetched, unless the UI was rebuilt since
+        """
+        if cache in self.caches and cache.gui and cmds.rowLayout(cache.gui.row, ex=1):
+            cache.gui.refresh()
+
     def buildSceneLayouts(self, name):
         """
             creates the frame and column layouts for a given asset type
@@ -159,16 +171,35 @@ class Show():
 
     def import_callback(self, *args):
         # loop through the caches to access their checkboxes
+        items = []
         for cache in self.caches:
             # if they are enabled, import!
-            if cmds.checkBox(cache.gui.check, q=1, v=1):
-                try:
-                    # # import!
-                    cache.gui.load()
-                except Exception:
-                    traceback.print_exc()
+            if cache.gui and cmds.checkBox(cache.gui.check, q=1, v=1):
+                items.append((cache,) + cache.gui.load_args())
+        if not items:
+            return
+
+        cmds.progressWindow(title='ABC Importer', progress=0, maxValue=len(items), status='Loading caches...', isInterruptable=True)
+        try:
+            errors = load_caches(items, self.load_progress)
+        finally:
+            cmds.progressWindow(endProgress=True)
+        for cache, err in errors:
+            cmds.warning('Could not load {}: {}'.format(cache.namespace, err))
+        # every row is redrawn once, after all of the caches are loaded
         self.refresh()
 
+    def load_progress(self, done, total, cache):
+        """
+            updates the progress window while caches load
+
+            return:
+            True if the user cancelled
+        """
+        status = 'Loading {} ({}/{})'.format(cache.namespace, done + 1, total) if cache else 'Done'
+        cmds.progressWindow(e=1, progress=done, status=status)
+        return cmds.progressWindow(q=1, isCancelled=True)
+
     def remove_callback(self, *args):
         response = cmds.confirmDialog(title='You sure?', button=['Yes', 'No'], defaultButton='Yes', cancelButton='No',
                                       dismissString='No', message='You sure you want to remove the selected cache(s) from your scene?')
@@ -201,7 +232,10 @@ class Show():
 
         self.assets = utils.get_assets(self.op_proj_info['lib_path'])
         self.alembics = utils.get_scene_alembics(self.op_file_info['level2'])
-        self.refs = utils.get_refs()
+        # query the references again, the scene callbacks miss some edits,
+        # like namespace changes in the reference editor
+        self.refs = reftable.get_ref_table()
+        self.refs.build()
         self.caches = []
         # self.caches.clear()
         if os.path.isdir(self.cache_dir):
@@ -246,11 +280,24 @@ class Cache_GUI():
 
     def refresh(self):
         self.populate_versions()
+        if not self.cache.resolved:
+            self.populate_placeholders()
+            return
         self.populate_shds()
         self.populate_modes()
         self.mode_toggle_callback()
         self.display_status()
 
+    def populate_placeholders(self):
+        """
+            disables the shd and mode menus until the cache is resolved
+        """
+        for om in (self.shd_om, self.mode_om):
+            self.clear_om(om)
+            cmds.menuItem(p=om, label='...')
+            cmds.optionMenu(om, e=True, en=False)
+        self.display_status()
+
     def populate_versions(self):
         self.clear_om(self.v_om)
 
@@ -290,7 +337,7 @@ class Cache_GUI():
 
         # if there are shades, default to attach
         if self.cache.shds:
-            cmds.optionMenu(self.mode_om, e=True, v=modes[1])
+            cmds.optionMenu(self.mode_om, e=True, v=modes[1], en=True)
         # if not, select reference and disable option menu
         else:
             cmds.optionMenu(self.mode_om, e=True, v=modes[0], en=False)
@@ -318,7 +365,10 @@ class Cache_GUI():
         orange = [.5, .4, .2]
         yellow = [.6, .6, .2]
 
+        grey = [.4, .4, .4]
+
         color_dict = {
+            '': grey,
             'unloaded': red,
             'old': orange,
             'current': green,
@@ -329,15 +379,24 @@ class Cache_GUI():
         if self.cache.status == 'current':
             cmds.checkBox(self.check, e=1, v=0)
 
-    def load(self):
+    def load_args(self):
+        """
+            returns the (mode, shd, version) picked in the row, see Cache.load
+        """
+        # the menus only hold placeholders until the cache is resolved
+        if not self.cache.resolved:
+            self.cache.resolve()
+            self.refresh()
         mode = cmds.optionMenu(self.mode_om, q=True, v=True)
         version = cmds.optionMenu(self.v_om, q=True, v=True)
         if cmds.optionMenu(self.shd_om, q=True, ni=True):
             shd = cmds.optionMenu(self.shd_om, q=True, v=True)
         else:
             shd = None
+        return mode, shd, version
 
-        self.cache.load(mode, shd, version)
+    def load(self):
+        self.cache.load(*self.load_args())
         self.refresh()
 
     def remove(self):
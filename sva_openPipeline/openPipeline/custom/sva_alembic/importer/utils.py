@@ -1,10 +1,13 @@
 import maya.cmds as cmds
 import sva_alembic.utils
+import sva_tools.library
 
 import os
 import cask
 
 import cache
+import catalog
+import reftable
 # reload(cache)
 
 # reload(sva_alembic.utils)
@@ -14,13 +17,7 @@ def get_assets(lib_path):
     """
         returns a dictionary where the keys are all of the assets in a project and the values are their asset types
     """
-    asset_types = [x for x in os.listdir(lib_path) if os.path.isdir(os.path.join(lib_path, x))]
-    asset_dict = {}
-    for asset_type in asset_types:
-        assets = [x for x in os.listdir(os.path.join(lib_path, asset_type)) if os.path.isdir(os.path.join(lib_path, asset_type, x))]
-        for asset in assets:
-            asset_dict[asset] = asset_type
-    return asset_dict
+    return sva_tools.library.get_library(lib_path).assets()
 
 
 def get_subdirs(path):
@@ -32,18 +29,15 @@ def get_shot_caches(cache_dir):
     """
         Creates a cache object for every cache found for the scene
     """
-    cache_scenes = [os.path.join(cache_dir, c) for c in os.listdir(cache_dir) if os.path.isdir(os.path.join(cache_dir, c))]
+    # the catalog only lists the directories that changed since it was saved
+    cache_paths = catalog.get_catalog(cache_dir).caches()
     # we need the namespaces to make the cache object so we don't look it up for eeevery cache
     proj_context = sva_alembic.utils.get_op_proj_info()
-    refs = get_refs()
+    refs = reftable.get_ref_table()
     assets = get_assets(proj_context['lib_path'])
     caches = []
-    for cache_scene in cache_scenes:
-        categories = get_subdirs(cache_scene)
-        for category in categories:
-            cat_caches = get_subdirs(os.path.join(cache_scene, category))
-            for cat_cache in cat_caches:
-                caches.append(cache.Cache(os.path.join(cache_scene, category, cat_cache), refs, assets))
+    for cache_path in cache_paths:
+        caches.append(cache.Cache(cache_path, refs, assets))
     return caches
 
 
@@ -52,18 +46,7 @@ def get_refs():
             returns a dict where the keys are namespaces in the scene
             and the values are the references that correspond
     """
-    refs = cmds.file(q=1, r=1)
-    ref_dict = {}
-
-    for ref in refs:
-        ref_node = cmds.referenceQuery(ref, rfn=True)
-        namespace = cmds.referenceQuery(ref_node, namespace=True).lstrip(':')
-        ref_dict[namespace] = {
-            'path': ref.replace('/', os.sep),
-            'clean_path': ref.split('{')[0].replace('/', os.sep),
-            'ref_node': ref_node,
-        }
-    return ref_dict
+    return dict(reftable.get_ref_table().table())
 
 
 def get_namespaces():
@@ -120,26 +103,17 @@ def objs_from_abc(abc, children):
             return:
             abc_objs = the list of objects from the alembic file
     """
-    abc_objs = []
-    archive = cask.Archive(abc)
-
-    def get_objs(obj):
-        for child in obj.children.values():
-            abc_objs.append((child.name).split(':')[-1])
-            if children:
-                get_objs(child)
-
-    get_objs(archive.top)
+    index = cask.get_index(abc)
+    if children:
+        paths = index.descendants()
+    else:
+        paths = index.children()
+    abc_objs = [index.name(path).split(':')[-1] for path in paths]
     return abc_objs
 
 
 def namespace_from_abc(abc):
-    archive = cask.Archive(abc)
-
-    for child in archive.top.children.values():
-        if ':' in child.name:
-            namespace = (child.name).split(':')[0]
-            return namespace
+    return cask.get_index(abc).namespace
 
 
 def vis_from_abc(abc):
@@ -154,27 +128,22 @@ def vis_from_abc(abc):
             abc_objs = the list of objects from the alembic file
     """
     abc_objs = []
-    archive = cask.Archive(abc)
-
-    def set_vis(obj):
-        for child in obj.children.values():
-            try:
-                abc_objs.append(child.name)
+    index = cask.get_index(abc)
+
+    for path in index.descendants():
+        name = index.name(path)
+        try:
+            abc_objs.append(name)
+            vis = index.get_visibility(path)
+            if vis is None or vis == -1:
                 vis = 1
-                if 'visible' in child.properties:
-                    vis = child.properties['visible'].values[0]
-                    if vis == -1:
-                        vis = 1
-
-                if cmds.objExists(child.name):
-                    if cmds.attributeQuery('visibility', node=child.name, ex=1):
-                        if not cmds.listConnections(child.name+'.visibility'):
-                            cmds.setAttr(child.name+'.visibility', vis)
-            except:
-                print 'Could not update alembic vis on {}'.format(child.name)
-
-            set_vis(child)
-    set_vis(archive.top)
+
+            if cmds.objExists(name):
+                if cmds.attributeQuery('visibility', node=name, ex=1):
+                    if not cmds.listConnections(name+'.visibility'):
+                        cmds.setAttr(name+'.visibility', vis)
+        except:
+            print 'Could not update alembic vis on {}'.format(name)
 
 
 def swap_namespace(from_ns, to_ns):
@@ -0,0 +1,184 @@
+"""
+Scans a tree of Alembic caches in parallel and returns one table with the
+frame range, object count, deforming flag and file size of every archive.
+The scan only reads the tree, it never writes index sidecars into it.
+
+From the custom scripts directory:
+
+    python -m sva_alembic.scanner <shot>/cache/alembic -w 8 -t 60
+"""
+import Queue
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+import cask
+
+# columns of a scan table, in output order
+COLUMNS = ['path', 'size', 'start_frame', 'end_frame', 'objects', 'deforming', 'error']
+
+# seconds between checks on the workers
+POLL_INTERVAL = 0.1
+
+# queue workers report the files they start on, set in each worker process
+_STARTED = None
+
+
+def find_abcs(root):
+    """
+        returns a sorted list of every .abc file under root
+    """
+    abcs = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith('.abc'):
+                abcs.append(os.path.join(dirpath, filename))
+    return sorted(abcs)
+
+
+def scan_file(path):
+    """
+        returns a table row dict for a single alembic file
+
+        args:
+        path = path to the alembic file
+    """
+    row = dict.fromkeys(COLUMNS)
+    row['path'] = path
+    try:
+        row['size'] = os.path.getsize(path)
+        archive = cask.open_archive(path)
+        start, end = archive.frame_range()
+        row['start_frame'] = int(start)
+        row['end_frame'] = int(end)
+        row['objects'] = len(cask.get_index(path, save=False))
+        row['deforming'] = any(f.deforming for f in archive.summary().values())
+    except Exception:
+        row['error'] = traceback.format_exc().strip().splitlines()[-1]
+    finally:
+        cask.invalidate(path)
+    return row
+
+
+def _init_worker(started):
+    global _STARTED
+    _STARTED = started
+
+
+def _scan_task(path):
+    """
+        scans a file in a worker, reporting when it started so the timeout
+        counts from then
+    """
+    _STARTED.put((path, time.time()))
+    return scan_file(path)
+
+
+def _timed_out_row(path, timeout):
+    row = dict.fromkeys(COLUMNS)
+    row['path'] = path
+    row['error'] = 'Timed out after {} seconds'.format(timeout)
+    return row
+
+
+def scan(paths, workers=None, timeout=None):
+    """
+        scans alembic files in a pool of worker processes
+
+        args:
+        paths = a directory to search for .abc files, or a list of .abc files
+        workers = maximum number of worker processes, defaults to the cpu count
+        timeout = seconds a worker may spend on a file before it is reported
+                  as timed out
+
+        return:
+        rows = a list of row dicts sorted by path, see COLUMNS
+    """
+    if isinstance(paths, basestring):
+        paths = find_abcs(paths)
+    if not paths:
+        return []
+    workers = min(workers or multiprocessing.cpu_count(), len(paths))
+
+    rows = []
+    pending = list(paths)
+    while pending:
+        started = multiprocessing.Queue()
+        pool = multiprocessing.Pool(processes=min(workers, len(pending)),
+                                    initializer=_init_worker, initargs=(started,))
+        try:
+            results = [(path, pool.apply_async(_scan_task, (path,))) for path in pending]
+            pending = []
+            starts = {}
+            while results:
+                while True:
+                    try:
+                        path, start = started.get_nowait()
+                    except Queue.Empty:
+                        break
+                    starts[path] = start
+                now = time.time()
+                waiting = []
+                timed_out = []
+                for path, result in results:
+                    if result.ready():
+                        rows.append(result.get())
+                    elif timeout is not None and path in starts and now - starts[path] > timeout:
+                        timed_out.append(path)
+                    else:
+                        waiting.append((path, result))
+                results = waiting
+                if timed_out:
+                    rows.extend(_timed_out_row(path, timeout) for path in timed_out)
+                    # a stuck worker is only stopped by terminating its pool, the
+                    # files that weren't done are scanned again in a new one
+                    pending = [path for path, result in results]
+                    break
+                if results:
+                    time.sleep(POLL_INTERVAL)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+    return sorted(rows, key=lambda row: row['path'])
+
+
+def format_table(rows):
+    """
+        returns the rows as tab separated text with a header line
+    """
+    lines = ['\t'.join(COLUMNS)]
+    for row in rows:
+        lines.append('\t'.join('' if row[c] is None else str(row[c]) for c in COLUMNS))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scan Alembic caches for frame ranges, object counts and deformation.')
+    parser.add_argument('paths', nargs='+', help='.abc files or directories to search')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='maximum number of worker processes')
+    parser.add_argument('-t', '--timeout', type=float, default=None, help='seconds to wait for each file')
+    parser.add_argument('--json', action='store_true', help='write JSON instead of tab separated text')
+    args = parser.parse_args(argv)
+
+    paths = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            paths.extend(find_abcs(path))
+        else:
+            paths.append(path)
+
+    rows = scan(paths, workers=args.workers, timeout=args.timeout)
+    if args.json:
+        sys.stdout.write(json.dumps(rows, indent=2) + '\n')
+    else:
+        sys.stdout.write(format_table(rows) + '\n')
+    return 1 if any(row['error'] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
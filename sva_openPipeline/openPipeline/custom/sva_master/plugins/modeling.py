@@ -1,10 +1,11 @@
 import maya.cmds as cmds
 import maya.mel as mel
 import os
-from shutil import copyfile
 
 import sva_tools.abc
 reload(sva_tools.abc)
+import sva_tools.blobstore
+reload(sva_tools.blobstore)
 import sva_tools.sets
 reload(sva_tools.sets)
 
@@ -37,4 +38,6 @@ def export_abc_model():
         job = ("-frameRange " + frame + " " + frame + " -stripNamespaces -wuvs -uvWrite -worldSpace -writeVisibility -dataFormat ogawa " + root_cmd + " -file " + file.replace('\\','/'))
         mel.eval("AbcExport -j \"" + job + "\";")
 
-        copyfile(file, version)
+        # the master gets exported over, so it's copied into the store and only the version is linked
+        store = os.path.join(os.path.dirname(file), sva_tools.blobstore.STORE_DIR)
+        sva_tools.blobstore.copy_version(file, version, store)
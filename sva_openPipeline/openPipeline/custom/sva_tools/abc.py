@@ -33,10 +33,13 @@ def get_static_model_path():
         if file.endswith('.abc'):
             cache_files.append(file)
 
-    # build version filename
-    version = str(len(cache_files)+1).zfill(3)
-    version_filename = (level2 + '_cache_v' + version + ".abc")
-    version_cache_file = os.path.join(cache_version_dir,version_filename)
+    # build version filename, skipping versions that already exist, which
+    # are links to stored caches and must never be written over
+    version = len(cache_files) + 1
+    version_filename = (level2 + '_cache_v' + str(version).zfill(3) + ".abc")
+    while os.path.exists(os.path.join(cache_version_dir, version_filename)):
+        version += 1
+        version_filename = (level2 + '_cache_v' + str(version).zfill(3) + ".abc")
 
     # build master filename
     filename = (level2 + "_cache.abc")
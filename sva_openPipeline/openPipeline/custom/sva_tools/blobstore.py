@@ -0,0 +1,194 @@
+"""
+Content addressed storage for alembic caches. Each distinct cache is kept
+once in a hidden .store directory, named by the hash of its content, and
+version files are hardlinks to the stored copy. Exporting a cache that
+didn't change then costs a link instead of a copy and no extra disk space.
+
+Caches are hashed with cask.content_hash, which leaves out the archive info,
+so re-exports of the same geometry share a copy even though the export date
+inside the files differs. A version linked to an older copy shows that
+copy's export date.
+
+Stored copies must never be written to, so files that get overwritten in
+place, like an asset's master cache, are copied into the store, never linked.
+"""
+import ctypes
+import errno
+import hashlib
+import os
+import shutil
+
+import cask
+
+# name of the store directory created next to the caches
+STORE_DIR = '.store'
+
+# size of the chunks read when hashing files that aren't alembic archives
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(path):
+    """
+        returns the sha1 hex digest of a file's bytes
+    """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        chunk = f.read(CHUNK_SIZE)
+        while chunk:
+            sha1.update(chunk)
+            chunk = f.read(CHUNK_SIZE)
+    return sha1.hexdigest()
+
+
+def content_hash(path):
+    """
+        returns the content hash of an alembic file, or the hash of its bytes
+        if it can't be read as an archive
+    """
+    try:
+        with cask.Archive(path) as archive:
+            return archive.content_hash()
+    except Exception:
+        return file_hash(path)
+
+
+def blob_path(store, digest):
+    """
+        returns the path of the stored copy for a content hash
+    """
+    return os.path.join(store, digest[:2], digest + '.abc')
+
+
+def hardlink(src, dst):
+    """
+        creates dst as a hardlink to src
+
+        return:
+        True if the link was made, False if links aren't supported here
+    """
+    if hasattr(os, 'link'):
+        try:
+            os.link(src, dst)
+            return True
+        except OSError:
+            return False
+    if os.name == 'nt':
+        # python 2 has no os.link on windows
+        return bool(ctypes.windll.kernel32.CreateHardLinkW(unicode(dst), unicode(src), None))
+    return False
+
+
+def link_or_copy(src, dst):
+    """
+        creates dst as a hardlink to src, or as a copy when it can't be linked
+        (other volume, no hardlink support). dst must not exist yet, so an
+        existing file, which may itself be linked to a stored copy, is never
+        written to.
+    """
+    if os.path.lexists(dst):
+        raise OSError(errno.EEXIST, 'File exists', dst)
+    if not hardlink(src, dst):
+        shutil.copyfile(src, dst)
+
+
+def add(path, store, link=True):
+    """
+        adds a file to the store, unless a copy with the same content is already there
+
+        args:
+        path = file to add
+        store = store directory
+        link = hardlink the file into the store instead of copying it, only for
+               files that are never written to again
+
+        return:
+        blob = path of the stored copy
+    """
+    blob = blob_path(store, content_hash(path))
+    if os.path.isfile(blob):
+        return blob
+
+    blob_dir = os.path.dirname(blob)
+    if not os.path.isdir(blob_dir):
+        os.makedirs(blob_dir)
+
+    # add under a temporary name so a half written blob is never used
+    tmp = '{}.{}.tmp'.format(blob, os.getpid())
+    if link:
+        link_or_copy(path, tmp)
+    else:
+        shutil.copyfile(path, tmp)
+    try:
+        os.rename(tmp, blob)
+    except OSError:
+        # someone else stored the same content first
+        os.remove(tmp)
+    return blob
+
+
+def checkin(path, store):
+    """
+        adds a new version file to the store and makes the file a link to the
+        stored copy, freeing its space when the same content is already stored
+
+        args:
+        path = version file, which must never be written to again
+        store = store directory
+
+        return:
+        blob = path of the stored copy
+    """
+    blob = add(path, store)
+    if os.stat(blob).st_ino == os.stat(path).st_ino and os.stat(path).st_ino:
+        return blob
+
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    link_or_copy(blob, tmp)
+    try:
+        replace(tmp, path)
+    except OSError:
+        # e.g. the file is still open on windows, leave it as it is
+        os.remove(tmp)
+        raise
+    return blob
+
+
+def replace(src, dst):
+    """
+        renames src over dst. Windows can't rename over an existing file, so
+        there dst is moved aside first and put back if the rename fails,
+        which leaves dst in place whatever happens.
+    """
+    try:
+        os.rename(src, dst)
+        return
+    except OSError:
+        if os.name != 'nt' or not os.path.exists(dst):
+            raise
+    backup = '{}.{}.bak'.format(dst, os.getpid())
+    os.rename(dst, backup)
+    try:
+        os.rename(src, dst)
+    except OSError:
+        os.rename(backup, dst)
+        raise
+    os.remove(backup)
+
+
+def copy_version(src, dst, store):
+    """
+        creates a version file as a link to the stored copy of src. src itself
+        is copied into the store, never linked, so it can be overwritten later.
+        Raises OSError if the version file already exists.
+
+        args:
+        src = file to version, e.g. the master cache
+        dst = version file to create
+        store = store directory
+
+        return:
+        blob = path of the stored copy
+    """
+    blob = add(src, store, link=False)
+    link_or_copy(blob, dst)
+    return blob
@@ -0,0 +1,98 @@
+"""
+Index of the project library, so tools don't list every asset type, asset
+and component folder each time they need to find an asset.
+
+The library is laid out as <type>/<asset>/components/<component>/<master>.
+Listings are kept per directory with the directory's mtime and saved as a
+JSON file at the top of the library, see sva_tools.treecache. Each look up
+only validates the directories it needs, so a new asset shows up once its
+type folder changes and a new master once its component folder changes.
+assets() saves the index, other look ups leave that to the caller.
+
+    >>> library = sva_tools.library.get_library(lib_path)
+    >>> asset_type = library.assets()['charA']
+    >>> for component in library.components(asset_type, 'charA'):
+    ...     print component, library.masters(component, 'mb')
+"""
+import os
+import threading
+
+import sva_tools.treecache
+
+# name of the index file saved at the top of the library
+LIBRARY_FILE = '.library.json'
+
+# name of the components folder of an asset
+COMPONENTS_DIR = 'components'
+
+
+class Library(sva_tools.treecache.TreeCache):
+    """
+        asset types, assets, components and published masters of a library
+    """
+
+    def __init__(self, lib_path):
+        """
+            args:
+            lib_path = the project's library directory
+        """
+        sva_tools.treecache.TreeCache.__init__(self, lib_path, LIBRARY_FILE)
+
+    def assets(self):
+        """
+            returns a dictionary where the keys are all of the assets in the
+            library and the values are their asset types
+        """
+        asset_dict = {}
+        for rel_path in self.walk(2):
+            asset_type, asset = os.path.split(rel_path)
+            asset_dict[asset] = asset_type
+        self.save()
+        return asset_dict
+
+    def components(self, asset_type, asset):
+        """
+            returns the full paths of an asset's component folders
+
+            args:
+            asset_type = type of the asset, see assets()
+            asset = name of the asset
+        """
+        rel_path = os.path.join(asset_type, asset, COMPONENTS_DIR)
+        entry = self.entry(rel_path)
+        if entry is None:
+            return []
+        return [os.path.join(self.full_path(rel_path), d) for d in entry['dirs']]
+
+    def masters(self, component_path, master_ext):
+        """
+            returns the full paths of the published masters in a component folder
+
+            args:
+            component_path = full path of the component folder, see components()
+            master_ext = extension of master files, e.g. mb
+        """
+        entry = self.entry(os.path.relpath(component_path, self.root))
+        if entry is None:
+            return []
+        ext = '.' + master_ext
+        return [os.path.join(component_path, f) for f in entry['files'] if f.endswith(ext)]
+
+
+# libraries loaded in this session, by library directory
+_LIBRARIES = {}
+_LIBRARIES_LOCK = threading.Lock()
+
+
+def get_library(lib_path):
+    """
+        returns the index of a library, shared by every tool in this session
+
+        args:
+        lib_path = the project's library directory
+    """
+    lib_path = os.path.abspath(os.path.normpath(lib_path))
+    with _LIBRARIES_LOCK:
+        if lib_path not in _LIBRARIES:
+            _LIBRARIES[lib_path] = Library(lib_path)
+        return _LIBRARIES[lib_path]
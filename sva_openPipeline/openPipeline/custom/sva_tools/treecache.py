@@ -0,0 +1,221 @@
+"""
+Persistent listings of a directory tree, for tools that look up the same
+folders on the network over and over.
+
+A TreeCache keeps the sub-directories and files of each directory it was
+asked about, along with the directory's mtime, and saves them to a JSON
+file at the top of the tree. Adding, removing or renaming an entry changes
+its directory's mtime, so a cached listing only costs a stat to validate
+and only the directories that changed are listed again.
+
+Look ups only update the listings in memory. Call save() once a batch of
+look ups is done to write them, which keeps the file from being rewritten
+for every directory that changed. A TreeCache can be shared by threads,
+directories are listed and the file is written outside of its lock.
+"""
+import json
+import os
+import threading
+import time
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# version of the saved layout, bump when it changes
+VERSION = 1
+
+# directories modified less than this many seconds before they were listed
+# are listed again, in case more entries were added within the same mtime
+RACY_SECONDS = 2.0
+
+
+def list_dir(path, extensions=None):
+    """
+        lists a directory with scandir when it's available, which gets the
+        entry types without a stat per entry
+
+        args:
+        path = directory to list
+        extensions = tuple of file extensions to keep, defaults to all files
+
+        return:
+        (dirs, files) = sorted names of the sub-directories and files,
+                        skipping hidden entries
+    """
+    dirs = []
+    files = []
+    if scandir:
+        for entry in scandir(path):
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir():
+                dirs.append(entry.name)
+            elif not extensions or entry.name.endswith(extensions):
+                files.append(entry.name)
+    else:
+        for name in os.listdir(path):
+            if name.startswith('.'):
+                continue
+            if os.path.isdir(os.path.join(path, name)):
+                dirs.append(name)
+            elif not extensions or name.endswith(extensions):
+                files.append(name)
+    return sorted(dirs), sorted(files)
+
+
+class TreeCache():
+    """
+        listings of the directories in a tree, keyed by their path relative
+        to the top of the tree
+    """
+
+    def __init__(self, root, name, extensions=None):
+        """
+            args:
+            root = top of the tree
+            name = name of the file the listings are saved to, in root
+            extensions = tuple of file extensions to keep, defaults to all files
+        """
+        self.root = root
+        self.path = os.path.join(root, name)
+        self.extensions = extensions
+        self.dirs = {}
+        self.changed = False
+        self.lock = threading.RLock()
+        self.load()
+
+    def __repr__(self):
+        return '<{} "{}">'.format(self.__class__.__name__, self.root)
+
+    def load(self):
+        """
+            reads the saved listings, if there are any and they're readable
+        """
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if data.get('version') == VERSION and data.get('extensions') == list(self.extensions or []):
+            self.dirs = data['dirs']
+
+    def save(self):
+        """
+            writes the listings if anything changed since they were read
+
+            return:
+            False if they couldn't be written, e.g. on read-only storage
+        """
+        with self.lock:
+            if not self.changed:
+                return True
+            # entries are replaced, never edited, so a shallow copy is a snapshot
+            data = {
+                'version': VERSION,
+                'extensions': list(self.extensions or []),
+                'dirs': dict(self.dirs),
+            }
+            self.changed = False
+        tmp = '{}.{}.{}.tmp'.format(self.path, os.getpid(), threading.current_thread().ident)
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(tmp, self.path)
+        except (IOError, OSError):
+            with self.lock:
+                self.changed = True
+            return False
+        return True
+
+    def full_path(self, rel_path):
+        """
+            returns the full path of a directory in the tree
+        """
+        return os.path.join(self.root, rel_path) if rel_path else self.root
+
+    def entry(self, rel_path):
+        """
+            returns the listing of a directory, listing it again only when
+            its mtime changed
+
+            args:
+            rel_path = directory path relative to the root, '' for the root
+
+            return:
+            entry = dict with the directory's mtime, dirs and files, or None
+                    if the directory doesn't exist anymore
+        """
+        try:
+            mtime = os.stat(self.full_path(rel_path)).st_mtime
+        except OSError:
+            self.forget(rel_path)
+            return None
+
+        entry = self.dirs.get(rel_path)
+        if entry and entry['mtime'] == mtime and entry['listed'] - mtime >= RACY_SECONDS:
+            return entry
+
+        listed = time.time()
+        try:
+            dirs, files = list_dir(self.full_path(rel_path), self.extensions)
+        except OSError:
+            return None
+        # the same listing isn't worth saving again, e.g. a racy listing or the
+        # top of the tree, whose mtime changes each time the listings are saved
+        unchanged = entry and entry['dirs'] == dirs and entry['files'] == files
+        with self.lock:
+            if entry:
+                # forget the sub-trees of directories that were removed
+                for name in set(entry['dirs']) - set(dirs):
+                    self.forget(os.path.join(rel_path, name) if rel_path else name)
+            entry = {'mtime': mtime, 'listed': listed, 'dirs': dirs, 'files': files}
+            self.dirs[rel_path] = entry
+            if not unchanged:
+                self.changed = True
+        return entry
+
+    def cached(self, rel_path):
+        """
+            returns the listing of a directory without validating it, listing
+            it only if it was never listed
+        """
+        return self.dirs.get(rel_path) or self.entry(rel_path)
+
+    def forget(self, rel_path):
+        """
+            drops the listings of a directory and everything below it
+        """
+        prefix = os.path.join(rel_path, '') if rel_path else ''
+        with self.lock:
+            for path in list(self.dirs):
+                if path == rel_path or path.startswith(prefix):
+                    del self.dirs[path]
+                    self.changed = True
+
+    def walk(self, depth):
+        """
+            returns the paths of the directories depth levels below the root,
+            validating every directory above them on the way down
+
+            args:
+            depth = number of levels to go down
+
+            return:
+            rel_paths = directory paths relative to the root
+        """
+        level = ['']
+        for i in range(depth):
+            next_level = []
+            for rel_path in level:
+                entry = self.entry(rel_path)
+                if entry:
+                    next_level.extend(os.path.join(rel_path, d) if rel_path else d for d in entry['dirs'])
+            level = next_level
+        return level
@@ -0,0 +1,96 @@
+"""
+Checks for sva_tools.blobstore. Needs PyAlembic, run from the custom scripts
+directory:
+
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import alembic
+    import cask
+    import sva_tools.blobstore as blobstore
+except ImportError:
+    alembic = None
+
+
+def write_archive(path, description=''):
+    with cask.Writer(path, userDescription=description) as writer:
+        writer.add_object('/grp', 'Xform')
+        writer.write_frame({'/grp': alembic.AbcGeom.XformSample()})
+
+
+@unittest.skipIf(alembic is None, 'PyAlembic is not installed')
+class TestBlobStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='test_blobstore')
+        self.store = os.path.join(self.tmp_dir, blobstore.STORE_DIR)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.tmp_dir, name)
+
+    def same_file(self, path_a, path_b):
+        return os.stat(path_a).st_ino == os.stat(path_b).st_ino
+
+    def test_same_content_is_stored_once(self):
+        write_archive(self.path('v001.abc'), 'first export')
+        write_archive(self.path('v002.abc'), 'second export')
+        blob = blobstore.add(self.path('v001.abc'), self.store)
+        self.assertEqual(blobstore.add(self.path('v002.abc'), self.store), blob)
+        self.assertEqual(len(os.listdir(os.path.dirname(blob))), 1)
+
+    def test_other_files_are_hashed_by_bytes(self):
+        for name, text in (('a.abc', 'not an archive'), ('b.abc', 'not an archive'), ('c.abc', 'other')):
+            with open(self.path(name), 'w') as f:
+                f.write(text)
+        blob = blobstore.add(self.path('a.abc'), self.store)
+        self.assertEqual(blobstore.add(self.path('b.abc'), self.store), blob)
+        self.assertNotEqual(blobstore.add(self.path('c.abc'), self.store), blob)
+
+    def test_checkin_links_versions(self):
+        write_archive(self.path('v001.abc'))
+        write_archive(self.path('v002.abc'))
+        blob = blobstore.checkin(self.path('v001.abc'), self.store)
+        self.assertEqual(blobstore.checkin(self.path('v002.abc'), self.store), blob)
+        if not blobstore.hardlink(blob, self.path('probe.abc')):
+            self.skipTest('hardlinks are not supported here')
+        self.assertTrue(self.same_file(self.path('v001.abc'), blob))
+        self.assertTrue(self.same_file(self.path('v002.abc'), blob))
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), sorted([blobstore.STORE_DIR, 'probe.abc', 'v001.abc', 'v002.abc']))
+
+    def test_copy_version_copies_the_source(self):
+        write_archive(self.path('master.abc'))
+        blob = blobstore.copy_version(self.path('master.abc'), self.path('v001.abc'), self.store)
+        self.assertFalse(self.same_file(self.path('master.abc'), blob))
+        self.assertTrue(os.path.isfile(self.path('v001.abc')))
+        self.assertRaises(OSError, blobstore.copy_version, self.path('master.abc'), self.path('v001.abc'), self.store)
+
+    def test_existing_files_are_never_written_to(self):
+        with open(self.path('src'), 'w') as f:
+            f.write('new')
+        with open(self.path('dst'), 'w') as f:
+            f.write('old')
+        self.assertRaises(OSError, blobstore.link_or_copy, self.path('src'), self.path('dst'))
+        with open(self.path('dst')) as f:
+            self.assertEqual(f.read(), 'old')
+
+    def test_failed_replace_keeps_the_file(self):
+        with open(self.path('dst'), 'w') as f:
+            f.write('old')
+        self.assertRaises(OSError, blobstore.replace, self.path('missing'), self.path('dst'))
+        with open(self.path('dst')) as f:
+            self.assertEqual(f.read(), 'old')
+
+
+if __name__ == '__main__':
+    unittest.main()
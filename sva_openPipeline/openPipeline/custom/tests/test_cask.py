@@ -0,0 +1,325 @@
+"""
+Checks for cask.py. Needs PyAlembic, run from the custom scripts directory:
+
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import alembic
+    import cask
+except ImportError:
+    alembic = None
+
+
+@unittest.skipIf(alembic is None, 'PyAlembic is not installed')
+class TestSampleCache(unittest.TestCase):
+
+    def test_least_recently_used_is_evicted(self):
+        cache = cask.SampleCache(budget=30)
+        cache.put((0, 0), 'a', 10)
+        cache.put((0, 1), 'b', 10)
+        cache.put((0, 2), 'c', 10)
+        self.assertEqual(cache.get((0, 0)), 'a')
+        cache.put((0, 3), 'd', 10)
+        self.assertEqual(cache.get((0, 1)), None)
+        self.assertEqual(cache.get((0, 0)), 'a')
+        self.assertEqual(cache.nbytes, 30)
+
+    def test_budget(self):
+        cache = cask.SampleCache(budget=30)
+        cache.put((0, 0), 'too big', 40)
+        self.assertEqual(len(cache), 0)
+        for i in range(3):
+            cache.put((0, i), i, 10)
+        cache.set_budget(15)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get((0, 2)), 2)
+        self.assertEqual(cache.nbytes, 10)
+
+    def test_discard(self):
+        cache = cask.SampleCache(budget=100)
+        cache.put((0, 0), 'a', 10)
+        cache.put((1, 0), 'b', 10)
+        cache.discard(0)
+        self.assertEqual(cache.get((0, 0)), None)
+        self.assertEqual(cache.get((1, 0)), 'b')
+        self.assertEqual(cache.nbytes, 10)
+
+
+@unittest.skipIf(alembic is None, 'PyAlembic is not installed')
+class TestSamples(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = cask.SampleCache(budget=1000)
+        self.reads = []
+
+    def reader(self, index):
+        self.reads.append(index)
+        return 'sample%d' % index
+
+    def test_decoded_once(self):
+        samples = cask.Samples(self.reader, 5, itemsize=1, cache=self.cache)
+        self.assertEqual(len(samples), 5)
+        self.assertEqual(samples[3], 'sample3')
+        self.assertEqual(samples[-2], 'sample3')
+        self.assertEqual(self.reads, [3])
+        self.assertEqual(samples[1:3], ['sample1', 'sample2'])
+        self.assertRaises(IndexError, samples.__getitem__, 5)
+
+    def test_edits(self):
+        samples = cask.Samples(self.reader, 2, itemsize=1, cache=self.cache)
+        samples[0] = 'edited'
+        samples.append('appended')
+        self.assertEqual(list(samples), ['edited', 'sample1', 'appended'])
+
+    def test_stream_is_not_cached(self):
+        samples = cask.Samples(self.reader, 3, itemsize=1, cache=self.cache)
+        self.assertEqual(list(samples.stream()), ['sample0', 'sample1', 'sample2'])
+        self.assertEqual(len(self.cache), 0)
+
+    def test_view_release_keeps_source_samples(self):
+        samples = cask.Samples(self.reader, 3, itemsize=1, cache=self.cache)
+        samples[0]
+        view = samples.view()
+        view[1] = 'edited'
+        self.assertEqual(samples[1], 'sample1')
+        view.release()
+        samples[0]
+        self.assertEqual(self.reads, [0])
+        samples.release()
+        self.assertEqual(len(self.cache), 0)
+
+
+@unittest.skipIf(alembic is None, 'PyAlembic is not installed')
+class TestFrameTable(unittest.TestCase):
+
+    def setUp(self):
+        # 24 fps starting at frame 1001
+        self.ts = alembic.AbcCoreAbstract.TimeSampling(1 / 24.0, 1001 / 24.0)
+        self.table = cask.FrameTable(self.ts, 10)
+
+    def test_index_matches_get_near_index(self):
+        # offset from the midpoints, where rounding decides the tie
+        for i in range(-20, 260):
+            time = 1000 / 24.0 + i / 240.0 + 0.0001
+            self.assertEqual(self.table.index(time), self.ts.getNearIndex(time, 10), time)
+
+    def test_frame_index(self):
+        self.assertEqual(self.table.frame_index(1001), 0)
+        self.assertEqual(self.table.frame_index(1005.4), 4)
+        self.assertEqual(self.table.frame_index(900), 0)
+        self.assertEqual(self.table.frame_index(2000), 9)
+
+    def test_indices_match_frame_index(self):
+        frames = [990, 1001, 1003.6, 1010, 1020]
+        self.assertEqual(list(self.table.indices(frames)),
+                         [self.table.frame_index(frame) for frame in frames])
+
+    def test_single_sample(self):
+        table = cask.FrameTable(self.ts, 1)
+        self.assertEqual(table.frame_index(1050), 0)
+        self.assertEqual(list(table.indices([1001, 1050])), [0, 0])
+
+    def test_tables_are_shared(self):
+        tables = {}
+        table = cask.frame_table(self.ts, 10, tables)
+        self.assertTrue(cask.frame_table(self.ts, 10, tables) is table)
+        self.assertFalse(cask.frame_table(self.ts, 5, tables) is table)
+
+
+@unittest.skipIf(alembic is None or cask.numpy is None, 'PyAlembic or NumPy is not installed')
+class TestBoundsIndex(unittest.TestCase):
+
+    def setUp(self):
+        # ten unit cubes along x, the last one empty
+        self.paths = ['/box%d' % i for i in range(10)]
+        boxes = [(i, 0, 0, i + 1, 1, 1) for i in range(9)] + [cask.EMPTY_BOX]
+        self.boxes = cask.numpy.array(boxes, dtype='float64')
+
+    def test_query_box(self):
+        index = cask.BoundsIndex(self.paths, self.boxes)
+        self.assertEqual(index.query_box((2.5, 0.5, 0.5), (3.5, 0.6, 0.6)), ['/box2', '/box3'])
+        self.assertEqual(index.query_box((-5, -5, -5), (-4, -4, -4)), [])
+        self.assertEqual(index.query_box((-100,) * 3, (100,) * 3), self.paths[:9])
+
+    def test_query_frustum(self):
+        index = cask.BoundsIndex(self.paths, self.boxes)
+        # the half space x <= 2
+        planes = [(-1, 0, 0, 2)]
+        self.assertEqual(index.query_frustum(planes), ['/box0', '/box1', '/box2'])
+
+    def test_per_frame(self):
+        # every box moves one unit along x per frame
+        frames = [1001, 1002]
+        boxes = cask.numpy.array([self.boxes[:9], self.boxes[:9] + [1, 0, 0, 1, 0, 0]])
+        index = cask.BoundsIndex(self.paths[:9], boxes, frames)
+        self.assertEqual(index.query_box((0.2, 0.2, 0.2), (0.4, 0.4, 0.4), frame=1001), ['/box0'])
+        self.assertEqual(index.query_box((0.2, 0.2, 0.2), (0.4, 0.4, 0.4), frame=1002), [])
+        self.assertRaises(ValueError, index.query_box, (0, 0, 0), (1, 1, 1))
+        self.assertRaises(KeyError, index.query_box, (0, 0, 0), (1, 1, 1), 1003)
+
+    def test_empty(self):
+        index = cask.BoundsIndex([], cask.numpy.zeros((0, 6)))
+        self.assertEqual(index.query_box((0, 0, 0), (1, 1, 1)), [])
+
+
+@unittest.skipIf(alembic is None, 'PyAlembic is not installed')
+class TestArchivePool(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='test_cask')
+        self.paths = []
+        for name in ('a.abc', 'b.abc', 'c.abc'):
+            path = os.path.join(self.tmp_dir, name)
+            with cask.Writer(path) as writer:
+                writer.add_object('/grp', 'Xform')
+                writer.write_frame({'/grp': alembic.AbcGeom.XformSample()})
+            self.paths.append(path)
+        self.pool = cask.ArchivePool(max_open=1)
+
+    def tearDown(self):
+        self.pool.invalidate()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def is_open(self, archive):
+        return archive._iobject is not None
+
+    def test_shared_and_evicted(self):
+        a = self.pool.get(self.paths[0])
+        a.top
+        self.assertTrue(self.pool.get(self.paths[0]) is a)
+        b = self.pool.get(self.paths[1])
+        self.assertTrue(self.is_open(b))
+        self.assertFalse(self.is_open(a))
+        self.assertEqual(len(self.pool), 1)
+
+    def test_max_open_is_at_least_one(self):
+        self.pool.set_max_open(0)
+        self.assertEqual(self.pool.max_open, 1)
+        a = self.pool.get(self.paths[0])
+        a.top
+        self.assertTrue(self.is_open(a))
+
+    def test_pinned_archives_stay_open(self):
+        with self.pool.pinned(self.paths[0]) as a:
+            a.top
+            b = self.pool.get(self.paths[1])
+            c = self.pool.get(self.paths[2])
+            self.assertTrue(self.is_open(a))
+            self.assertFalse(self.is_open(b))
+            self.assertTrue(self.is_open(c))
+        # unpinning evicts down to max_open again
+        self.assertEqual(len(self.pool), 1)
+        self.assertFalse(self.is_open(a))
+
+    def test_invalidated_while_pinned(self):
+        a = self.pool.pin(self.paths[0])
+        a.top
+        self.pool.invalidate(self.paths[0])
+        self.assertTrue(self.is_open(a))
+        self.assertFalse(self.paths[0] in self.pool)
+        self.pool.unpin(a)
+        self.assertFalse(self.is_open(a))
+
+
+def glob_match(pattern, path):
+    """returns True if a path glob matches a path, segment by segment like
+    cask.query"""
+    pattern = cask._split_glob(pattern)
+    states = cask._glob_closure(pattern, [0])
+    for name in cask._split_glob(path):
+        states = cask._glob_advance(pattern, states, name)
+        if not states:
+            return False
+    return len(pattern) in states
+
+
+@unittest.skipIf(alembic is None, 'PyAlembic is not installed')
+class TestGlob(unittest.TestCase):
+
+    def test_split(self):
+        self.assertEqual(cask._split_glob('/a//b/'), ['a', 'b'])
+
+    def test_star_matches_one_level(self):
+        self.assertTrue(glob_match('a/*', 'a/b'))
+        self.assertFalse(glob_match('a/*', 'a/b/c'))
+        self.assertFalse(glob_match('a/*', 'a'))
+        self.assertTrue(glob_match('a/*Shape', 'a/bodyShape'))
+        self.assertFalse(glob_match('a/*Shape', 'a/body'))
+
+    def test_double_star_matches_any_levels(self):
+        self.assertTrue(glob_match('a/**/c', 'a/c'))
+        self.assertTrue(glob_match('a/**/c', 'a/b/c'))
+        self.assertTrue(glob_match('a/**/c', 'a/b/b/c'))
+        self.assertFalse(glob_match('a/**/c', 'a/b/d'))
+        self.assertTrue(glob_match('**', 'a/b'))
+
+    def test_dead_branches_are_pruned(self):
+        pattern = cask._split_glob('a/b/*')
+        states = cask._glob_closure(pattern, [0])
+        self.assertEqual(cask._glob_advance(pattern, states, 'x'), set())
+
+
+@unittest.skipIf(alembic is None, 'PyAlembic is not installed')
+class TestFind(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='test_cask')
+        self.path = os.path.join(self.tmp_dir, 'in.abc')
+        with cask.Writer(self.path) as writer:
+            for path in ('/grp', '/grp/child', '/other'):
+                writer.add_object(path, 'Xform')
+            writer.write_frame(dict((path, alembic.AbcGeom.XformSample())
+                                    for path in ('/grp', '/grp/child', '/other')))
+
+    def tearDown(self):
+        cask.invalidate()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_find_results_are_children(self):
+        archive = cask.Archive(self.path)
+        found = cask.find(archive.top, 'child')
+        self.assertEqual(len(found), 1)
+        self.assertTrue(archive.top.children['grp/child'] is found[0])
+        self.assertEqual(sorted(archive.top.children['grp'].children), ['child'])
+        self.assertEqual(sorted(archive.top.children), ['grp', 'other'])
+        archive.close()
+
+    def test_query_path_glob(self):
+        archive = cask.Archive(self.path)
+        paths = [obj.path() for obj in cask.query(archive.top, path='grp/*')]
+        self.assertEqual(paths, ['/grp/child'])
+        paths = sorted(obj.path() for obj in cask.query(archive.top, path='**'))
+        self.assertEqual(paths, ['/grp', '/grp/child', '/other'])
+        self.assertEqual(list(cask.query(archive.top, path='missing/**')), [])
+        archive.close()
+
+    def test_query_name_types_and_limit(self):
+        archive = cask.Archive(self.path)
+        paths = [obj.path() for obj in cask.query(archive.top, name='child')]
+        self.assertEqual(paths, ['/grp/child'])
+        self.assertEqual(list(cask.query(archive.top, types=['PolyMesh'])), [])
+        self.assertEqual(len(list(cask.query(archive.top, types=['Xform'], limit=2))), 2)
+        archive.close()
+
+    def test_edit_through_find_is_written(self):
+        out_path = os.path.join(self.tmp_dir, 'out.abc')
+        archive = cask.Archive(self.path)
+        child = cask.find(archive.top, 'child')[0]
+        child.children['added'] = cask.Xform()
+        archive.write_to_file(out_path)
+
+        with cask.Archive(out_path) as result:
+            self.assertTrue('added' in result.top.children['grp/child'].children)
+            self.assertTrue('other' in result.top.children)
+
+
+if __name__ == '__main__':
+    unittest.main()
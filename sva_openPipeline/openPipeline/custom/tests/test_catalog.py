@@ -0,0 +1,87 @@
+"""
+Checks for sva_alembic.importer.catalog, run from the custom scripts
+directory:
+
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+custom_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, custom_dir)
+# the importer package needs Maya, its modules import each other by name
+sys.path.insert(0, os.path.join(custom_dir, 'sva_alembic', 'importer'))
+
+import catalog
+from test_treecache import age, make_dirs
+
+
+class TestCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='test_catalog')
+        make_dirs(self.root, [
+            'sc01/anim/charA/charA_cache_v001.abc',
+            'sc01/anim/charA/charA_cache_v002.abc',
+            'sc01/anim/charA/notes.txt',
+            'sc01/cam/cam/cam_cache_v001.abc',
+            'sc02/anim/',
+        ])
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            age(dirpath)
+        self.catalog = catalog.Catalog(self.root)
+
+    def tearDown(self):
+        catalog._CATALOGS.pop(self.root, None)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def cache_path(self, *names):
+        return os.path.join(self.root, *names)
+
+    def test_caches(self):
+        self.assertEqual(sorted(self.catalog.caches()), [self.cache_path('sc01', 'anim', 'charA'),
+                                                         self.cache_path('sc01', 'cam', 'cam')])
+        self.assertTrue(os.path.isfile(self.catalog.path))
+
+    def test_abcs(self):
+        self.catalog.caches()
+        cache_path = self.cache_path('sc01', 'anim', 'charA')
+        self.assertEqual(self.catalog.abcs(cache_path), [os.path.join(cache_path, 'charA_cache_v001.abc'),
+                                                         os.path.join(cache_path, 'charA_cache_v002.abc')])
+        self.assertEqual(self.catalog.abcs(self.cache_path('sc01', 'anim', 'missing')), [])
+
+    def test_new_versions_show_up(self):
+        cache_path = self.cache_path('sc01', 'anim', 'charA')
+        self.catalog.caches()
+        make_dirs(self.root, ['sc01/anim/charA/charA_cache_v003.abc'])
+        age(cache_path, 50)
+        self.assertEqual(os.path.basename(self.catalog.abcs(cache_path)[-1]), 'charA_cache_v003.abc')
+
+    def test_saved_catalog_is_reused(self):
+        self.catalog.caches()
+        other = catalog.Catalog(self.root)
+        self.assertEqual(other.dirs, self.catalog.dirs)
+        other.caches()
+        self.assertFalse(other.changed)
+
+    def test_cache_root(self):
+        self.assertEqual(catalog.cache_root(self.cache_path('sc01', 'anim', 'charA')), self.root)
+
+    def test_get_catalog_is_shared_by_threads(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(catalog.get_catalog(self.root)))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result is results[0] for result in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Checks for the sva_alembic.geocache reader. Needs PyAlembic and NumPy, run
+from the custom scripts directory:
+
+    python -m unittest discover tests
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import alembic
+    import numpy
+    import sva_alembic.geocache as geocache
+except ImportError:
+    geocache = None
+
+
+def write_geo(path, blocks, frames, objects):
+    """
+        writes a geocache by hand, blocks are (offset, array) pairs
+    """
+    with open(path, 'wb') as f:
+        for offset, array in blocks:
+            f.seek(offset)
+            f.write(array.tobytes())
+    with open(path + geocache.INDEX_EXT, 'w') as f:
+        json.dump({'version': geocache.VERSION, 'source': path, 'key': [], 'fps': 24.0,
+                   'frames': frames, 'objects': objects}, f)
+
+
+@unittest.skipIf(geocache is None, 'PyAlembic or NumPy is not installed')
+class TestGeoCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='test_geocache')
+        self.path = os.path.join(self.dir, 'test.geo')
+
+        self.points = numpy.arange(3 * 2 * 3, dtype=geocache.POINTS_DTYPE).reshape(3, 2, 3)
+        self.static_points = numpy.ones((1, 4, 3), dtype=geocache.POINTS_DTYPE)
+        self.matrices = numpy.array([numpy.eye(4) * (i + 1) for i in range(3)], dtype=geocache.MATRIX_DTYPE)
+        self.varying = [numpy.zeros((count, 3), dtype=geocache.POINTS_DTYPE) + count for count in (1, 2, 3)]
+        blocks = [(0, self.points), (80, self.static_points), (128, self.matrices),
+                  (512, self.varying[0]), (528, self.varying[1]), (560, self.varying[2])]
+        objects = {
+            '/root/mesh': {'points': {'offset': 0, 'shape': [3, 2, 3], 'static': False},
+                           'matrix': {'offset': 128, 'shape': [3, 4, 4], 'static': False}},
+            '/root/static': {'points': {'offset': 80, 'shape': [1, 4, 3], 'static': True}},
+            '/root/varying': {'points': {'offsets': [512, 528, 560], 'counts': [1, 2, 3], 'static': False}},
+        }
+        write_geo(self.path, blocks, [1001, 1002, 1003], objects)
+        self.geo = geocache.GeoCache(self.path)
+
+    def tearDown(self):
+        del self.geo
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_paths(self):
+        self.assertEqual(self.geo.paths(), ['/root/mesh', '/root/static', '/root/varying'])
+
+    def test_points(self):
+        self.assertTrue(numpy.array_equal(self.geo.points('/root/mesh'), self.points))
+        self.assertTrue(numpy.array_equal(self.geo.points('/root/mesh', 1002), self.points[1]))
+        self.assertFalse(self.geo.points('/root/mesh', 1002).flags.writeable)
+
+    def test_static_points(self):
+        self.assertEqual(self.geo.points('/root/static').shape, (1, 4, 3))
+        self.assertTrue(numpy.array_equal(self.geo.points('/root/static', 1003), self.static_points[0]))
+
+    def test_matrix(self):
+        self.assertTrue(numpy.array_equal(self.geo.matrix('/root/mesh', 1003), self.matrices[2]))
+        self.assertEqual(self.geo.matrix('/root/mesh').shape, (3, 4, 4))
+
+    def test_varying_point_count(self):
+        self.assertEqual(self.geo.points('/root/varying', 1003).shape, (3, 3))
+        self.assertTrue(numpy.array_equal(self.geo.points('/root/varying', 1002), self.varying[1]))
+        self.assertRaises(ValueError, self.geo.points, '/root/varying')
+
+    def test_nearest_frame(self):
+        self.assertEqual(self.geo.frame_index(1002), 1)
+        self.assertEqual(self.geo.frame_index(1002.4), 1)
+        self.assertEqual(self.geo.frame_index(900), 0)
+        self.assertEqual(self.geo.frame_index(2000), 2)
+
+    def test_missing_entries(self):
+        self.assertRaises(KeyError, self.geo.points, '/root/missing')
+        self.assertRaises(KeyError, self.geo.matrix, '/root/static')
+
+    def test_empty_cache(self):
+        path = os.path.join(self.dir, 'empty.geo')
+        write_geo(path, [], [], {})
+        geo = geocache.GeoCache(path)
+        self.assertEqual(geo.paths(), [])
+        self.assertRaises(KeyError, geo.frame_index, 1001)
+
+    def test_unsupported_version(self):
+        with open(self.path + geocache.INDEX_EXT, 'w') as f:
+            json.dump({'version': geocache.VERSION + 1}, f)
+        self.assertRaises(ValueError, geocache.GeoCache, self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
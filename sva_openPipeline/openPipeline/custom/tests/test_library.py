@@ -0,0 +1,82 @@
+"""
+Checks for sva_tools.library, run from the custom scripts directory:
+
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sva_tools.library as library
+from test_treecache import age, make_dirs
+
+
+class TestLibrary(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='test_library')
+        make_dirs(self.root, [
+            'char/charA/components/charA_MDL/charA_MDL.mb',
+            'char/charA/components/charA_SHD/charA_SHD.mb',
+            'char/charA/components/charA_SHD/charA_SHD.ma',
+            'prop/propB/components/',
+        ])
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            age(dirpath)
+        self.library = library.Library(self.root)
+
+    def tearDown(self):
+        library._LIBRARIES.pop(self.root, None)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def component(self, name):
+        return os.path.join(self.root, 'char', 'charA', 'components', name)
+
+    def test_assets(self):
+        self.assertEqual(self.library.assets(), {'charA': 'char', 'propB': 'prop'})
+        self.assertTrue(os.path.isfile(self.library.path))
+
+    def test_components(self):
+        self.assertEqual(self.library.components('char', 'charA'),
+                         [self.component('charA_MDL'), self.component('charA_SHD')])
+        self.assertEqual(self.library.components('prop', 'propB'), [])
+        self.assertEqual(self.library.components('prop', 'missing'), [])
+
+    def test_masters(self):
+        self.assertEqual(self.library.masters(self.component('charA_SHD'), 'mb'),
+                         [os.path.join(self.component('charA_SHD'), 'charA_SHD.mb')])
+        self.assertEqual(self.library.masters(self.component('missing'), 'mb'), [])
+
+    def test_new_assets_show_up(self):
+        self.library.assets()
+        make_dirs(self.root, ['char/charC/'])
+        age(os.path.join(self.root, 'char'), 50)
+        self.assertEqual(self.library.assets()['charC'], 'char')
+
+    def test_index_is_reused(self):
+        self.library.assets()
+        self.library.components('char', 'charA')
+        self.library.save()
+        other = library.Library(self.root)
+        self.assertEqual(other.dirs, self.library.dirs)
+
+    def test_get_library_is_shared_by_threads(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(library.get_library(self.root)))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertTrue(library.get_library(self.root + os.sep) is results[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Checks for sva_tools.treecache, run from the custom scripts directory:
+
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sva_tools.treecache as treecache
+
+
+def make_dirs(root, paths):
+    """
+        creates files, or directories for paths ending in /, below root
+    """
+    for path in paths:
+        full_path = os.path.join(root, path)
+        if path.endswith('/'):
+            os.makedirs(full_path)
+            continue
+        if not os.path.isdir(os.path.dirname(full_path)):
+            os.makedirs(os.path.dirname(full_path))
+        open(full_path, 'w').close()
+
+
+def age(path, seconds=100):
+    """
+        sets a directory's mtime in the past, so its listing isn't racy, in whole
+        seconds so it reads back exactly
+    """
+    mtime = int(time.time() - seconds)
+    os.utime(path, (mtime, mtime))
+
+
+class TestListDir(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='test_treecache')
+        make_dirs(self.root, ['b/', 'a/', '.hidden/', 'x.abc', 'y.txt', '.z.abc'])
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_list_dir(self):
+        self.assertEqual(treecache.list_dir(self.root), (['a', 'b'], ['x.abc', 'y.txt']))
+        self.assertEqual(treecache.list_dir(self.root, ('.abc',)), (['a', 'b'], ['x.abc']))
+
+
+class TestTreeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='test_treecache')
+        make_dirs(self.root, ['a/1/x.abc', 'a/2/', 'b/1/y.abc'])
+        for path in ('a/1', 'a/2', 'b/1', 'a', 'b', ''):
+            age(os.path.join(self.root, path))
+        self.tree = treecache.TreeCache(self.root, '.tree.json', ('.abc',))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_walk(self):
+        self.assertEqual(sorted(self.tree.walk(1)), ['a', 'b'])
+        self.assertEqual(sorted(self.tree.walk(2)), [os.path.join('a', '1'), os.path.join('a', '2'),
+                                                     os.path.join('b', '1')])
+
+    def test_unchanged_directories_are_not_listed_again(self):
+        self.assertEqual(self.tree.entry('a')['dirs'], ['1', '2'])
+        # a new entry that leaves the mtime as it was isn't seen
+        mtime = os.stat(os.path.join(self.root, 'a')).st_mtime
+        os.makedirs(os.path.join(self.root, 'a', '3'))
+        os.utime(os.path.join(self.root, 'a'), (mtime, mtime))
+        self.assertEqual(self.tree.entry('a')['dirs'], ['1', '2'])
+
+    def test_changed_directories_are_listed_again(self):
+        self.assertEqual(self.tree.entry('a')['dirs'], ['1', '2'])
+        os.makedirs(os.path.join(self.root, 'a', '3'))
+        age(os.path.join(self.root, 'a'), 50)
+        self.assertEqual(self.tree.entry('a')['dirs'], ['1', '2', '3'])
+
+    def test_racy_listings_are_checked_again(self):
+        make_dirs(self.root, ['c/'])
+        self.assertEqual(self.tree.entry('c')['files'], [])
+        # modified within RACY_SECONDS of the listing, same mtime
+        open(os.path.join(self.root, 'c', 'z.abc'), 'w').close()
+        self.assertEqual(self.tree.entry('c')['files'], ['z.abc'])
+
+    def test_removed_directories_are_forgotten(self):
+        self.tree.walk(2)
+        shutil.rmtree(os.path.join(self.root, 'a', '1'))
+        age(os.path.join(self.root, 'a'), 50)
+        self.tree.entry('a')
+        self.assertFalse(os.path.join('a', '1') in self.tree.dirs)
+        shutil.rmtree(os.path.join(self.root, 'b'))
+        self.assertEqual(self.tree.entry('b'), None)
+        self.assertFalse(os.path.join('b', '1') in self.tree.dirs)
+
+    def test_cached_does_not_validate(self):
+        self.tree.entry('b')
+        os.makedirs(os.path.join(self.root, 'b', '2'))
+        age(os.path.join(self.root, 'b'), 50)
+        self.assertEqual(self.tree.cached('b')['dirs'], ['1'])
+        self.assertEqual(self.tree.cached('a')['dirs'], ['1', '2'])
+
+    def test_save_and_load(self):
+        self.tree.walk(2)
+        self.assertTrue(self.tree.changed)
+        self.assertTrue(self.tree.save())
+        self.assertFalse(self.tree.changed)
+        self.assertEqual([name for name in os.listdir(self.root) if name.endswith('.tmp')], [])
+
+        tree = treecache.TreeCache(self.root, '.tree.json', ('.abc',))
+        self.assertEqual(tree.dirs, self.tree.dirs)
+        tree.walk(2)
+        self.assertFalse(tree.changed)
+
+    def test_saved_listings_of_other_extensions_are_ignored(self):
+        self.tree.walk(2)
+        self.tree.save()
+        tree = treecache.TreeCache(self.root, '.tree.json', ('.txt',))
+        self.assertEqual(tree.dirs, {})
+
+    def test_lookups_do_not_save(self):
+        self.tree.walk(2)
+        self.assertFalse(os.path.exists(self.tree.path))
+
+
+if __name__ == '__main__':
+    unittest.main()